@@ -1,24 +1,26 @@
-from typing import List, Callable
+from typing import List, Optional
 from numpy import double
-from scipy.spatial import distance
 from .CompareLSOutput import CompareLSOutput
 from .LSVector import LSVector
+from .get_metric import Metric
+from .ls_store import get_store
+from .ls_distances import family_distance
 
 
 class CompareLS:
     vectors: List[LSVector]
-    metric: Callable
+    metric: Metric
     p_norm: int
     result: CompareLSOutput
 
-    def __init__(self, vectors: List[LSVector], metric: Callable, p_norm: int):
+    def __init__(self, vectors: List[LSVector], metric: Metric, p_norm: int):
         """
 
         Parameters
         ----------
         vectors : List[LSVector]
             Two latent spaces
-        metric : function
+        metric : Metric
             Distance function
         p_norm : int
             The p-norm to apply for Minkowski
@@ -36,11 +38,13 @@ class CompareLS:
         CompareLSOutput
             Result of the comparison
         """
-        # find distance between the vectors
-        if self.metric == distance.minkowski:
-            distance_result: double = self.metric(self.vectors[0].ls_data, self.vectors[1].ls_data, self.p_norm)
-        else:
-            distance_result = self.metric(self.vectors[0].ls_data, self.vectors[1].ls_data)
+        # known protein families are looked up in the saved distance matrix
+        distance_result: Optional[double] = family_distance(
+            get_store(), self.vectors[0].ls_name, self.vectors[1].ls_name, self.metric, self.p_norm)
+
+        # otherwise find distance between the vectors
+        if distance_result is None:
+            distance_result = self.metric(self.vectors[0].ls_data, self.vectors[1].ls_data, self.p_norm)
 
         # create CompareLSOutput object
         return CompareLSOutput(
@@ -0,0 +1,126 @@
+from pathlib import Path
+from typing import List, Iterator, Tuple, TextIO
+import numpy as np
+from .CompareLSMatrixOutput import CompareLSMatrixOutput
+from .LSVector import load_vectors
+from .get_metric import Metric
+from .SearchLS import family_distances
+
+hdf5_suffixes: List[str] = ['.h5', '.hdf5']
+
+
+class CompareLSMatrix:
+    rows_file: str
+    cols_file: str
+    rows: List[str]
+    cols: List[str]
+    metric: Metric
+    p_norm: int
+    matrix_file: str
+    tile_size: int
+    result: CompareLSMatrixOutput
+
+    def __init__(self, rows_file: str, rows: List[str], cols_file: str, cols: List[str], metric: Metric, p_norm: int,
+                 matrix_file: str, tile_size: int = 1024):
+        """
+
+        Parameters
+        ----------
+        rows_file : str
+            Name of the file listing the rows
+        rows : List[str]
+            Protein family names or latent space filenames, one per row
+        cols_file : str
+            Name of the file listing the columns
+        cols : List[str]
+            Protein family names or latent space filenames, one per column
+        metric : Metric
+            Distance function
+        p_norm : int
+            The p-norm to apply for Minkowski
+        matrix_file : str
+            File to write the distance matrix to, HDF5 for .h5 and .hdf5, otherwise .npy
+        tile_size : int
+            Number of rows and columns computed at once
+        """
+        self.rows_file = rows_file
+        self.cols_file = cols_file
+        self.rows = rows
+        self.cols = cols
+        self.metric = metric
+        self.p_norm = p_norm
+        self.matrix_file = matrix_file
+        self.tile_size = tile_size
+        self.result = self.do_compare()
+
+    def tiles(self) -> Iterator[Tuple[slice, slice, np.ndarray]]:
+        """ Compute the distance matrix one tile at a time
+
+        Only the latent spaces of the columns and of the current rows are held in memory
+
+        Returns
+        -------
+        Iterator[Tuple[slice, slice, numpy.ndarray]]
+            Row range, column range and distances of each tile
+        """
+        col_data: np.ndarray = load_vectors(self.cols)
+        r: int
+        for r in range(0, len(self.rows), self.tile_size):
+            row_slice: slice = slice(r, min(r + self.tile_size, len(self.rows)))
+            row_data: np.ndarray = load_vectors(self.rows[row_slice])
+            c: int
+            for c in range(0, len(self.cols), self.tile_size):
+                col_slice: slice = slice(c, min(c + self.tile_size, len(self.cols)))
+                yield row_slice, col_slice, family_distances(row_data, self.metric, self.p_norm, col_data[col_slice])
+
+    def write_npy(self):
+        """ Stream the tiles into a memory-mapped .npy file, with the row and column names in text files next to it
+
+        """
+        matrix: np.memmap = np.lib.format.open_memmap(self.matrix_file, mode='w+', dtype=np.float64,
+                                                      shape=(len(self.rows), len(self.cols)))
+        for row_slice, col_slice, tile in self.tiles():
+            matrix[row_slice, col_slice] = tile
+            if col_slice.stop == len(self.cols):
+                # write each finished band of rows back to disk
+                matrix.flush()
+        del matrix
+
+        stem: Path = Path(self.matrix_file).with_suffix('')
+        names: List[str]
+        for suffix, names in (('_rows.txt', self.rows), ('_cols.txt', self.cols)):
+            outf: TextIO
+            with open(str(stem) + suffix, 'w') as outf:
+                outf.write('\n'.join(names) + '\n')
+
+    def write_hdf5(self):
+        """ Stream the tiles into a chunked HDF5 dataset, with the row and column names stored alongside
+
+        """
+        import h5py
+        h5: h5py.File
+        with h5py.File(self.matrix_file, 'w') as h5:
+            dset = h5.create_dataset('distances', shape=(len(self.rows), len(self.cols)), dtype='f8',
+                                     chunks=(min(self.tile_size, len(self.rows)), min(self.tile_size, len(self.cols))))
+            dset.attrs['metric'] = self.metric.__name__
+            dset.attrs['p_norm'] = self.p_norm
+            str_type = h5py.special_dtype(vlen=str)
+            h5.create_dataset('rows', data=np.array(self.rows, dtype=object), dtype=str_type)
+            h5.create_dataset('cols', data=np.array(self.cols, dtype=object), dtype=str_type)
+            for row_slice, col_slice, tile in self.tiles():
+                dset[row_slice, col_slice] = tile
+
+    def do_compare(self) -> CompareLSMatrixOutput:
+        """ Compute the distance between every row and every column
+
+        Returns
+        -------
+        CompareLSMatrixOutput
+            Description of the distance matrix
+        """
+        if Path(self.matrix_file).suffix.lower() in hdf5_suffixes:
+            self.write_hdf5()
+        else:
+            self.write_npy()
+        return CompareLSMatrixOutput(self.rows_file, self.cols_file, self.metric.__name__,
+                                     len(self.rows), len(self.cols), self.matrix_file)
@@ -0,0 +1,54 @@
+import json
+from typing import List
+
+
+class CompareLSMatrixOutput:
+
+    rows: str
+    cols: str
+    distance_metric: str
+    n_rows: int
+    n_cols: int
+    matrix_file: str
+
+    def __init__(self, rows: str, cols: str, distance_metric: str, n_rows: int, n_cols: int, matrix_file: str):
+        """
+
+        Parameters
+        ----------
+        rows : str
+            Name of the file listing the rows
+        cols : str
+            Name of the file listing the columns
+        distance_metric : str
+            Name of distance function
+        n_rows : int
+            Number of rows
+        n_cols : int
+            Number of columns
+        matrix_file : str
+            File the distance matrix was written to
+        """
+        self.rows = rows
+        self.cols = cols
+        self.distance_metric = distance_metric
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.matrix_file = matrix_file
+
+    def to_stdout(self):
+        print(self.distance_metric + ' distances between ' + str(self.n_rows) + ' latent spaces from ' + self.rows + ' and ' +
+              str(self.n_cols) + ' latent spaces from ' + self.cols + ' written to ' + self.matrix_file)
+
+    def to_lines(self, ftype: str) -> List[str]:
+        if ftype == "text":
+            return [self.distance_metric + ' distances between ' + str(self.n_rows) + ' latent spaces from ' + self.rows + ' and ' +
+                    str(self.n_cols) + ' latent spaces from ' + self.cols + ' written to ' + self.matrix_file]
+        if ftype == "jsonl":
+            return [json.dumps(self.to_records()[0])]
+        return [self.rows + ',' + self.cols + ',' + self.distance_metric + ',' + str(self.n_rows) + ',' +
+                str(self.n_cols) + ',' + self.matrix_file]
+
+    def to_records(self) -> List[dict]:
+        return [{'rows': self.rows, 'cols': self.cols, 'distance_metric': self.distance_metric,
+                 'n_rows': self.n_rows, 'n_cols': self.n_cols, 'matrix_file': self.matrix_file}]
@@ -1,4 +1,6 @@
-from typing import TextIO
+import json
+from typing import List
+from .SearchLSOutput import json_distance
 
 
 class CompareLSOutput:
@@ -30,21 +32,13 @@ class CompareLSOutput:
     def to_stdout(self):
         print(self.distance_metric + ' distance between ' + self.a1 + ' and ' + self.a2 + ': ' + self.result)
 
-    def to_file(self, fname: str, ftype: str, mode: str):
-        """
+    def to_lines(self, ftype: str) -> List[str]:
+        if ftype == "text":
+            return [self.distance_metric + ' distance between ' + self.a1 + ' and ' + self.a2 + ': ' + self.result]
+        if ftype == "jsonl":
+            return [json.dumps({'a1': self.a1, 'a2': self.a2, 'distance_metric': self.distance_metric,
+                                'distance': json_distance(self.result)}, allow_nan=False)]
+        return [self.a1 + ',' + self.a2 + ',' + self.distance_metric + ',' + self.result]
 
-        Parameters
-        ----------
-        fname : str
-            Output filename
-        ftype : str
-            Output format
-        mode : str
-            Output mode
-        """
-        outf: TextIO
-        with open(fname, mode) as outf:
-            if ftype == "text":
-                outf.write(self.distance_metric + ' distance between ' + self.a1 + ' and ' + self.a2 + ': ' + self.result + '\n')
-            else:
-                outf.write(self.a1 + ',' + self.a2 + ',' + self.distance_metric + ',' + self.result + '\n')
+    def to_records(self) -> List[dict]:
+        return [{'a1': self.a1, 'a2': self.a2, 'distance_metric': self.distance_metric, 'distance': float(self.result)}]
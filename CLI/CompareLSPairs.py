@@ -0,0 +1,58 @@
+from typing import List, Dict, Tuple
+import numpy as np
+from .CompareLSPairsOutput import CompareLSPairsOutput
+from .LSVector import load_vectors
+from .get_metric import Metric
+
+# number of pairs computed at once, bounds the size of the gathered latent spaces
+chunk_size: int = 65536
+
+
+class CompareLSPairs:
+    pairs: List[Tuple[str, str]]
+    metric: Metric
+    p_norm: int
+    result: CompareLSPairsOutput
+
+    def __init__(self, pairs: List[Tuple[str, str]], metric: Metric, p_norm: int):
+        """
+
+        Parameters
+        ----------
+        pairs : List[Tuple[str, str]]
+            Pairs of protein family names or latent space filenames
+        metric : Metric
+            Distance function
+        p_norm : int
+            The p-norm to apply for Minkowski
+        """
+        self.pairs = pairs
+        self.metric = metric
+        self.p_norm = p_norm
+        self.result = self.do_compare()
+
+    def do_compare(self) -> CompareLSPairsOutput:
+        """ Compare the latent spaces of every pair
+
+        Every distinct name is loaded once, then the distances of all pairs are computed a chunk of pairs at a time
+
+        Returns
+        -------
+        CompareLSPairsOutput
+            Result of the comparisons, in the order of the pairs
+        """
+        a1: List[str] = [a for a, _ in self.pairs]
+        a2: List[str] = [b for _, b in self.pairs]
+        names: List[str] = list(dict.fromkeys(a1 + a2))
+        position: Dict[str, int] = {name: i for i, name in enumerate(names)}
+        data: np.ndarray = load_vectors(names)
+        i1: np.ndarray = np.array([position[a] for a in a1], dtype=np.intp)
+        i2: np.ndarray = np.array([position[b] for b in a2], dtype=np.intp)
+
+        results: List[str] = []
+        start: int
+        for start in range(0, len(self.pairs), chunk_size):
+            dists: np.ndarray = self.metric.paired_distances(data[i1[start:start + chunk_size]],
+                                                             data[i2[start:start + chunk_size]], self.p_norm)
+            results.extend(str(d) for d in dists)
+        return CompareLSPairsOutput(a1, a2, self.metric.__name__, results)
@@ -0,0 +1,46 @@
+import json
+from typing import List
+from .SearchLSOutput import json_distance
+
+
+class CompareLSPairsOutput:
+
+    a1: List[str]
+    a2: List[str]
+    distance_metric: str
+    results: List[str]
+
+    def __init__(self, a1: List[str], a2: List[str], distance_metric: str, results: List[str]):
+        """
+
+        Parameters
+        ----------
+        a1 : List[str]
+            Name of first latent space of each pair
+        a2 : List[str]
+            Name of second latent space of each pair
+        distance_metric : str
+            Name of distance function
+        results : List[str]
+            Distance of each pair
+        """
+        self.a1 = a1
+        self.a2 = a2
+        self.distance_metric = distance_metric
+        self.results = results
+
+    def to_stdout(self):
+        print('\n'.join(self.to_lines("text")))
+
+    def to_lines(self, ftype: str) -> List[str]:
+        if ftype == "text":
+            return [self.distance_metric + ' distance between ' + a1 + ' and ' + a2 + ': ' + result
+                    for a1, a2, result in zip(self.a1, self.a2, self.results)]
+        if ftype == "jsonl":
+            return [json.dumps({'a1': a1, 'a2': a2, 'distance_metric': self.distance_metric, 'distance': json_distance(result)},
+                               allow_nan=False) for a1, a2, result in zip(self.a1, self.a2, self.results)]
+        return [a1 + ',' + a2 + ',' + self.distance_metric + ',' + result for a1, a2, result in zip(self.a1, self.a2, self.results)]
+
+    def to_records(self) -> List[dict]:
+        return [{'a1': a1, 'a2': a2, 'distance_metric': self.distance_metric, 'distance': float(result)}
+                for a1, a2, result in zip(self.a1, self.a2, self.results)]
@@ -1,5 +1,7 @@
+from typing import Dict, List
 import numpy as np
-from .load_files import load_family, load_ls_file, is_pf
+from .load_files import load_ls_file
+from .ls_store import LSStore, get_store
 
 
 class LSVector:
@@ -31,7 +33,42 @@ class LSVector:
         -------
         numpy.ndarray
         """
-        if is_pf(self.ls_name):
-            return load_family(self.ls_name + '.txt')
+        store: LSStore = get_store()
+        if self.ls_name in store:
+            return store.get(self.ls_name)
         else:
             return load_ls_file(self.ls_name)
+
+
+def load_vectors(names: List[str]) -> np.ndarray:
+    """ Load the data of many latent spaces at once
+
+    Protein families are read from the latent space store in one step, other names are treated as
+    filenames. Each distinct name is only loaded once
+
+    Parameters
+    ----------
+    names : List[str]
+        Names of protein families or latent space files
+
+    Returns
+    -------
+    numpy.ndarray
+        Latent space data, one row per name
+    """
+    store: LSStore = get_store()
+    data: np.ndarray = np.empty((len(names), store.vectors.shape[1]))
+    in_store: np.ndarray = np.array([name in store for name in names], dtype=bool)
+    if in_store.any():
+        data[in_store] = store.vectors[[store.index[name] for name, known in zip(names, in_store) if known]]
+    files: Dict[str, np.ndarray] = {}
+    i: int
+    for i in np.flatnonzero(~in_store):
+        if names[i] not in files:
+            files[names[i]] = load_ls_file(names[i])
+            if files[names[i]].shape != data.shape[1:]:
+                print("Invalid file: " + names[i])
+                print("Files should contain " + str(data.shape[1]) + " floats, each float in a separate line.")
+                exit(2)
+        data[i] = files[names[i]]
+    return data
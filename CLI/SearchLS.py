@@ -1,26 +1,198 @@
-from typing import Callable
+from typing import List, Optional, Tuple, Union
 import numpy as np
-from scipy.spatial import distance
 from .LSVector import LSVector
 from .SearchLSOutput import SearchLSOutput
-from .load_files import latent_space_list, load_family
+from .get_metric import Metric, cdist_metrics
+from .ls_store import LSStore, get_store
+
+# number of queries scored against the store at once, and number of distances, bound the size of the distance matrix
+chunk_size: int = 1024
+chunk_elements: int = 1 << 24
+
+# below this many families scipy's cdist scores the whole store as fast as the NumPy kernels, and without scoring the
+# closest families again: on the 1126 bundled families cdist is as fast for 2000 queries and faster for fewer,
+# the kernels are faster from about 10000. Metrics without a cdist path always use their kernels
+kernel_min_families: int = 10000
+
+
+def family_distances(queries: np.ndarray, metric: Metric, p_norm: int, families: np.ndarray = None) -> np.ndarray:
+    """ Distances from each query to every protein family
+
+    Parameters
+    ----------
+    queries : numpy.ndarray
+        Latent space data, one row per query
+    metric : Metric
+        Distance function
+    p_norm : int
+        The p-norm to apply for Minkowski
+    families : numpy.ndarray
+        Latent space data of the families to compare with. Default: the whole latent space store
+
+    Returns
+    -------
+    numpy.ndarray
+        Q x N matrix of distances, in the order of the families
+    """
+    if families is None:
+        families = get_store().vectors
+    return metric.exact_distances(queries, families, p_norm)
+
+
+def prepared_families(store: LSStore, metric: Metric) -> tuple:
+    """ What the metric's one-vs-many kernel needs from the latent space store, computed once per store
+
+    Parameters
+    ----------
+    store : LSStore
+        Latent space store
+    metric : Metric
+        Distance function
+
+    Returns
+    -------
+    tuple
+    """
+    if metric.__name__ not in store.prepared:
+        store.prepared[metric.__name__] = metric.prepare(store.vectors)
+    return store.prepared[metric.__name__]
+
+
+def near_families(dists: np.ndarray, k: Optional[int], radius: Optional[float], slack: np.ndarray) -> List[np.ndarray]:
+    """ Families that may be among the closest to each query, given distances that are only accurate within slack
+
+    Parameters
+    ----------
+    dists : numpy.ndarray
+        Approximate distances from each query to every protein family, overwritten
+    k : int
+        Maximum number of families to return per query
+    radius : float
+        Maximum distance of the families to return
+    slack : numpy.ndarray
+        Bound on the error of the distances, per query or per distance
+
+    Returns
+    -------
+    List[numpy.ndarray]
+        Indices of the candidate families of each query, in store order
+    """
+    dists[np.isnan(dists)] = np.inf
+    bound: Union[float, np.ndarray] = np.inf if radius is None else radius
+    if k is not None and k < dists.shape[1]:
+        # no family can be closer than its lower bound, so only those below the k-th smallest upper bound can be among the k closest
+        upper: np.ndarray = dists + slack
+        kth: np.ndarray = upper.min(axis=1, keepdims=True) if k == 1 else np.partition(upper, k - 1, axis=1)[:, k - 1:k]
+        bound = np.minimum(kth, bound)
+    dists -= slack
+    rows, cols = np.nonzero(dists <= bound)
+    return np.split(cols, np.searchsorted(rows, np.arange(1, len(dists))))
+
+
+def rank_families(dists: np.ndarray, k: Optional[int] = None, radius: Optional[float] = None) -> np.ndarray:
+    """ Rank the protein families closest to one query
+
+    The k-th smallest distance is found by partial selection, so only the families up to it are sorted
+
+    Parameters
+    ----------
+    dists : numpy.ndarray
+        Distances from the query to every protein family
+    k : int
+        Maximum number of families to return
+    radius : float
+        Maximum distance of the families to return
+
+    Returns
+    -------
+    numpy.ndarray
+        Indices of the families, closest first. Ties keep the order of the latent space store
+    """
+    candidates: np.ndarray = np.flatnonzero(dists <= radius) if radius is not None else np.arange(len(dists))
+    if k is not None and k < len(candidates):
+        # keep every family tied with the k-th closest so ties are broken by store order below
+        kth: np.double = np.partition(dists[candidates], k - 1)[k - 1]
+        candidates = candidates[dists[candidates] <= kth]
+    return candidates[np.lexsort((candidates, dists[candidates]))][:k]
+
+
+def closest_families(vectors: List[LSVector], metric: Metric, p_norm: int,
+                     k: Optional[int] = None, radius: Optional[float] = None) -> List[SearchLSOutput]:
+    """ Find the closest protein family to each latent space
+
+    Parameters
+    ----------
+    vectors : List[LSVector]
+        Latent spaces
+    metric : Metric
+        Distance function
+    p_norm : int
+        The p-norm to apply for Minkowski
+    k : int
+        Return a ranked list of the k closest families
+    radius : float
+        Return a ranked list of the families within this distance
+
+    Returns
+    -------
+    List[SearchLSOutput]
+        One result per latent space, in the same order
+    """
+    store: LSStore = get_store()
+    kernel: bool = metric.has_kernel(p_norm) and (metric.__name__ not in cdist_metrics or len(store) >= kernel_min_families)
+    data: Optional[tuple] = prepared_families(store, metric) if kernel else None
+    top: Optional[int] = 1 if k is None and radius is None else k
+    results: List[SearchLSOutput] = []
+    n_chunk: int = max(1, min(chunk_size, chunk_elements // max(1, len(store))))
+    start: int
+    for start in range(0, len(vectors), n_chunk):
+        chunk: List[LSVector] = vectors[start:start + n_chunk]
+        queries: np.ndarray = np.stack([v.ls_data for v in chunk])
+        candidates: Optional[List[np.ndarray]] = None
+        if not kernel:
+            dists: np.ndarray = family_distances(queries, metric, p_norm)
+        else:
+            dists = metric.distances(queries, data, p_norm)
+            slack: Optional[np.ndarray] = metric.error_bound(queries, data, dists, p_norm)
+            if slack is not None:
+                # the kernel may misorder families within its rounding error of the closest ones
+                candidates = near_families(dists, top, radius, slack)
+        i: int
+        for i, v in enumerate(chunk):
+            idx: np.ndarray
+            row: np.ndarray
+            if candidates is not None:
+                # the candidates are scored again with the exact distance, which is also the one shown
+                idx = candidates[i]
+                row = family_distances(queries[i:i + 1], metric, p_norm, store.vectors[idx])[0]
+            else:
+                idx = np.arange(len(store))
+                row = dists[i]
+            # distances that can't be compared are never the closest
+            row[np.isnan(row)] = np.inf
+            ranked: np.ndarray = rank_families(row, top, radius)
+            neighbors: List[Tuple[str, str]] = [(store.names[idx[j]], str(row[j])) for j in ranked if row[j] < np.inf]
+            closest: Tuple[str, str] = neighbors[0] if neighbors else ("none", "inf")
+            results.append(SearchLSOutput(v.ls_name, metric.__name__, closest[0], closest[1],
+                                          None if k is None and radius is None else neighbors))
+    return results
 
 
 class SearchLS:
     ls_name: str
     ls_data: np.ndarray
-    metric: Callable
+    metric: Metric
     p_norm: int
     result: SearchLSOutput
 
-    def __init__(self, ls: LSVector, metric: Callable, p_norm: int):
+    def __init__(self, ls: LSVector, metric: Metric, p_norm: int):
         """
 
         Parameters
         ----------
         ls : LSVector
             Latent space
-        metric : function
+        metric : Metric
             Distance function
         p_norm : int
             The p-norm to apply for Minkowski
@@ -38,16 +210,4 @@ class SearchLS:
         -------
         SearchLSOutput
         """
-        closest_family: str = "none"
-        min_dist: float = float("inf")
-        i: int
-        for i in range(len(latent_space_list)):
-            if self.metric == distance.minkowski:
-                distance_result: np.double = self.metric(self.ls_data, load_family(latent_space_list[i]), self.p_norm)
-            else:
-                distance_result = self.metric(self.ls_data, load_family(latent_space_list[i]))
-
-            if distance_result < min_dist:
-                min_dist = distance_result
-                closest_family = latent_space_list[i]
-        return SearchLSOutput(self.ls_name, self.metric.__name__, closest_family[:-4], str(min_dist))
+        return closest_families([LSVector(self.ls_name, self.ls_data)], self.metric, self.p_norm)[0]
@@ -1,4 +1,6 @@
-from typing import TextIO
+import json
+import math
+from typing import List, Tuple, Optional
 
 
 class SearchLSOutput:
@@ -7,8 +9,10 @@ class SearchLSOutput:
     distance_metric: str
     closest: str
     distance: str
+    neighbors: Optional[List[Tuple[str, str]]]
 
-    def __init__(self, ls: str, distance_metric: str, closest: str, distance: str):
+    def __init__(self, ls: str, distance_metric: str, closest: str, distance: str,
+                 neighbors: Optional[List[Tuple[str, str]]] = None):
         """
 
         Parameters
@@ -21,30 +25,70 @@ class SearchLSOutput:
             Name of closest protein family
         distance : str
             Distance from closest protein family
+        neighbors : List[Tuple[str, str]]
+            Ranked (protein family, distance) pairs, closest first, for top-k and radius searches
         """
         self.ls = ls
         self.distance_metric = distance_metric
         self.closest = closest
         self.distance = distance
+        self.neighbors = neighbors
 
-    def to_stdout(self):
-        print('The closest protein family to ' + self.ls + ' is ' + self.closest + ' with ' + self.distance_metric + ' distance: ' + self.distance)
+    def to_text(self) -> str:
+        if self.neighbors is None:
+            return 'The closest protein family to ' + self.ls + ' is ' + self.closest + ' with ' + self.distance_metric + ' distance: ' + self.distance
+        if not self.neighbors:
+            return 'No protein families found for ' + self.ls + ' with ' + self.distance_metric + ' distance'
+        return 'The closest protein families to ' + self.ls + ' with ' + self.distance_metric + ' distance are:\n' + \
+            '\n'.join('  ' + str(rank) + '. ' + family + ': ' + dist for rank, (family, dist) in enumerate(self.neighbors, 1))
 
-    def to_file(self, fname: str, ftype: str, mode: str):
-        """
+    def to_csv(self) -> str:
+        if self.neighbors is None:
+            return self.ls + ',' + self.distance_metric + ',' + self.closest + ',' + self.distance
+        # one row per neighbor, closest first
+        return '\n'.join(self.ls + ',' + self.distance_metric + ',' + family + ',' + dist for family, dist in self.neighbors)
 
-        Parameters
-        ----------
-        fname : str
-            Output filename
-        ftype : str
-            Output format
-        mode : str
-            Output mode
+    def to_json(self) -> str:
+        record: dict = {'ls': self.ls, 'distance_metric': self.distance_metric, 'closest': self.closest,
+                        'distance': json_distance(self.distance)}
+        if self.neighbors is not None:
+            record['neighbors'] = [{'family': family, 'distance': json_distance(dist)} for family, dist in self.neighbors]
+        return json.dumps(record, allow_nan=False)
+
+    def to_lines(self, ftype: str) -> List[str]:
+        if ftype == "text":
+            return [self.to_text()]
+        if ftype == "jsonl":
+            return [self.to_json()]
+        return [self.to_csv()] if self.neighbors != [] else []
+
+    def to_records(self) -> List[dict]:
+        """ One record per neighbor, closest first, or one for the closest family in single mode
+
+        Returns
+        -------
+        List[dict]
         """
-        outf: TextIO
-        with open(fname, mode) as outf:
-            if ftype == "text":
-                outf.write('The closest protein family to ' + self.ls + ' is ' + self.closest + ' with ' + self.distance_metric + ' distance: ' + self.distance + '\n')
-            else:
-                outf.write(self.ls + ',' + self.distance_metric + ',' + self.closest + ',' + self.distance + '\n')
+        neighbors: List[Tuple[str, str]] = self.neighbors if self.neighbors is not None else [(self.closest, self.distance)]
+        return [{'ls': self.ls, 'distance_metric': self.distance_metric, 'rank': rank, 'family': family, 'distance': float(dist)}
+                for rank, (family, dist) in enumerate(neighbors, 1)]
+
+    def to_stdout(self):
+        print(self.to_text())
+
+
+def json_distance(distance: str) -> Optional[float]:
+    """
+
+    Parameters
+    ----------
+    distance : str
+        Distance as written to text and csv output
+
+    Returns
+    -------
+    float
+        None when no protein family was found or the distance is undefined, which JSON has no number for
+    """
+    value: float = float(distance)
+    return value if math.isfinite(value) else None
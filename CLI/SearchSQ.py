@@ -1,36 +1,56 @@
+import multiprocessing.pool
 import os
+import sys
 import urllib.request
 from pathlib import Path
-from typing import TextIO, List
-from zipfile import ZipFile
+from functools import lru_cache
+from typing import TextIO, List, Tuple, Dict, Optional, Collection
 import keras
 import numpy as np
-import pandas as pd
-from .utils import aa_letters
-from .utils.data_loaders import to_one_hot
-from .load_files import s_length, load_sequence
+from .utils.data_loaders import to_indices, indices_to_one_hot, InvalidSequenceError
+from .utils.metrics import reconstruction_acc, merge_scores
+from .load_files import load_sequence
+from .family_catalog import get_catalog
 from .SearchSQOutput import SearchSQOutput
+from .SearchLSOutput import SearchLSOutput
+from .get_metric import Metric, get_distance_function
+from .model_cache import ModelCache, SharedModels
+from .network_store import NetworkStore, get_store as get_network_store, network_files, index_filename, canonical_json, architecture_digest
+from .network_archive import NetworkArchive, get_archive, source_url, expected_sha256, sha256_matches, record_sha256, sha256_env, sha256_suffix
 from tqdm import tqdm
 import silence_tensorflow.auto
 
 networks_path_name: str = 'Trained_networks/'
 networks_path: Path = Path(networks_path_name)
 networks_url: str = 'https://github.com/cfogel/Trained_networks/releases/download/Trained_networks/Trained_networks.zip'
-downloaded_filename: str = 'downloaded_file.zip'
+# SHA-256 of the archive at networks_url, checked after it is downloaded and recorded next to it, see network_archive.
+# It is None because the release doesn't publish a checksum, and no copy of the archive known to be good was available
+# to hash when this check was added: pinning the hash of whatever the URL serves would only vouch for that download.
+# Until it is set here, or with $COMPBIOLAB_NETWORKS_SHA256, the first download is NOT verified: its SHA-256 is recorded
+# with a warning, and later runs only refuse an archive that changed since
+networks_sha256: Optional[str] = None
+# the networks are read from the archive until it is fully extracted to networks_path with python -m CLI.network_archive
+networks_archive: Path = Path('Trained_networks.zip')
+
+# weights files extracted from the archive as their families are used, the least recently used are deleted past cache size
+networks_cache_path: Path = Path('Trained_networks_cache/')
+networks_cache_mb: int = 256
 
 # Flag to disable progress bars
 no_pbar: bool = False
 
-# get the sequence length for each protein family that we have
-seq_lengths: pd.DataFrame = pd.read_csv(s_length, usecols=['name', 'size'])
-aa_key: dict = {l: i for i, l in enumerate(aa_letters)}
+# network mapping a sequence to a latent space, used by --shortlist: <name>.json and <name>_weights.h5
+encoder_name: str = 'encoder'
 
+# default budget of the model cache, set with --model-cache and --model-cache-mb
+cache_models: int = None
+cache_mb: int = 1024
 
-def get_AA(n):
-    """ Get Amino Acid letter from the one hot encoded version of it
+# most sequences reconstructed by a network in one call
+batch_size: int = 256
 
-    """
-    return list(aa_key.keys())[list(aa_key.values()).index(n)]
+# families scored per sequence before checking --stop-at again
+prefilter_round: int = 8
 
 
 class DownloadProgressBar(tqdm):
@@ -63,20 +83,111 @@ def download_url(url: str, output_path: str):
         urllib.request.urlretrieve(url, filename=output_path, reporthook=t.update_to)
 
 
+def archive_path() -> Path:
+    """
+
+    Returns
+    -------
+    pathlib.Path
+        The local archive given by $COMPBIOLAB_NETWORKS_URL, or where the archive is downloaded to
+    """
+    url: str = source_url(networks_url)
+    return Path(url) if '://' not in url else networks_archive
+
+
+@lru_cache(maxsize=1)
+def networks_extracted() -> bool:
+    """ Check if the trained networks are extracted to networks_path, not only other files such as the k-mer index
+
+    Returns
+    -------
+    bool
+    """
+    return networks_path.is_dir() and any(entry.name.endswith('_weights.h5') for entry in os.scandir(str(networks_path)))
+
+
 def check_files():
-    """ If the trained network files don't already exist, download them
+    """ If the trained networks aren't extracted and their archive isn't already there, download it
 
+    The archive isn't extracted: the files of each family are read from it when the family is first used
+
+    """
+    if networks_extracted():
+        return
+    url: str = source_url(networks_url)
+    archive: Path = archive_path()
+    if '://' not in url:
+        if not archive.exists():
+            exit("No trained network archive at " + url)
+        # a local archive is checked once per process, when it is opened
+        get_archive(archive, networks_cache_path, networks_cache_mb * 2 ** 20, expected_sha256(networks_sha256))
+    elif not archive.exists():
+        # only moved into place once it is complete and checked
+        partial: Path = Path(str(archive) + '.part')
+        expected: Optional[str] = expected_sha256(networks_sha256)
+        download_url(url, str(partial))
+        if expected is None and url == networks_url:
+            sys.stderr.write("WARNING: no SHA-256 is known for the trained network archive, so the download from " + url +
+                             " can't be verified. Set " + sha256_env + " to the published SHA-256 to check it. "
+                             "Its SHA-256 is recorded in " + str(archive) + sha256_suffix + " and checked from now on\n")
+        elif not sha256_matches(partial, expected):
+            os.remove(str(partial))
+            exit("The trained network archive downloaded from " + url + " doesn't have the expected SHA-256, try again")
+        os.replace(str(partial), str(archive))
+        record_sha256(archive, expected)
+
+
+def open_archive() -> Optional[NetworkArchive]:
+    """
+
+    Returns
+    -------
+    NetworkArchive
+        The archive the networks are read from, None once they are extracted to networks_path
+    """
+    if networks_extracted():
+        return None
+    return get_archive(archive_path(), networks_cache_path, networks_cache_mb * 2 ** 20, expected_sha256(networks_sha256))
+
+
+def network_source() -> str:
+    """
+
+    Returns
+    -------
+    str
+        Location and modification time of the packed store, archive or directory the networks are read from
+    """
+    store: Optional[NetworkStore] = get_network_store(networks_path)
+    path: Path
+    if store is not None:
+        path = store.directory / index_filename
+    elif not networks_extracted():
+        path = archive_path()
+    else:
+        # adding or removing a family updates the mtime of the directory
+        path = networks_path
+    return str(path.resolve()) + ' ' + str(os.stat(str(path)).st_mtime_ns)
+
+
+def network_names() -> Collection[str]:
+    """
+
+    Returns
+    -------
+    Collection[str]
+        Names of the families with a trained network
     """
-    if not networks_path.exists():
-        download_url(networks_url, downloaded_filename)
-        zf: ZipFile
-        with ZipFile(downloaded_filename) as zf:
-            for member in tqdm(zf.infolist(), desc='Extracting', leave=False, disable=no_pbar):
-                zf.extract(member, networks_path)
-        os.remove(downloaded_filename)
+    store: Optional[NetworkStore] = get_network_store(networks_path)
+    archive: Optional[NetworkArchive] = open_archive()
+    if store is not None:
+        return store.families.keys()
+    if archive is not None:
+        return set(archive.families())
+    return set(network_files(networks_path))
 
 
-def find_networks(slen: int) -> pd.DataFrame:
+def find_networks(slen: int) -> List[Tuple[str, int]]:
     """
 
     Parameters
@@ -86,20 +197,437 @@ def find_networks(slen: int) -> pd.DataFrame:
 
     Returns
     -------
-    pandas.core.frame.DataFrame
-        Families longer than slen with trained network data
+    List[Tuple[str, int]]
+        Name and size of the families at least slen long with a trained network, in search order
+    """
+    return get_catalog(network_source(), network_names).fitting(slen)
+
+
+def load_model_files(prefix: Path) -> keras.Model:
+    """ Build a network from its architecture and weights files
+
+    Parameters
+    ----------
+    prefix : pathlib.Path
+        Path of the files without the .json and _weights.h5 endings
+
+    Returns
+    -------
+    keras.Model
+    """
+    jfile: TextIO
+    with open(str(prefix) + '.json') as jfile:
+        model_json = jfile.read()
+    loaded_model: keras.Model = keras.models.model_from_json(model_json)
+    loaded_model.load_weights(str(prefix) + '_weights.h5')
+    return loaded_model
+
+
+@lru_cache(maxsize=None)
+def family_architecture(family: str) -> Tuple[str, str]:
+    """ Architecture of the trained network of a protein family
+
+    Parameters
+    ----------
+    family : str
+        Name of protein family
+
+    Returns
+    -------
+    Tuple[str, str]
+        Hash and canonical Keras JSON config of the network
+    """
+    store: Optional[NetworkStore] = get_network_store(networks_path)
+    archive: Optional[NetworkArchive] = open_archive()
+    model_json: str
+    if store is not None and family in store:
+        model_json = store.architecture(family)
+    elif archive is not None:
+        model_json = canonical_json(archive.read(family + '.json').decode())
+    else:
+        jfile: TextIO
+        with open(networks_path / (family + '.json')) as jfile:
+            model_json = canonical_json(jfile.read())
+    return architecture_digest(model_json), model_json
+
+
+def load_weights(family: str) -> List[np.ndarray]:
+    """ Read the weights of the trained network of a protein family
+
+    Parameters
+    ----------
+    family : str
+        Name of protein family
+
+    Returns
+    -------
+    List[numpy.ndarray]
+        Weights in keras.Model.get_weights order
+    """
+    store: Optional[NetworkStore] = get_network_store(networks_path)
+    if store is not None and family in store:
+        # views of the memory-mapped blob
+        return store.weights(family)
+    digest, model_json = family_architecture(family)
+    # the model of the family's architecture parses the HDF5 file, and keeps the weights
+    loaded_model: keras.Model = shared_models.model(digest, model_json)
+    archive: Optional[NetworkArchive] = open_archive()
+    weights_file: Path = archive.extract(family + '_weights.h5') if archive is not None else networks_path / (family + '_weights.h5')
+    loaded_model.load_weights(str(weights_file))
+    shared_models.loaded[digest] = family
+    return loaded_model.get_weights()
+
+
+def load_network(family: str) -> keras.Model:
+    """ Get the trained network of a protein family
+
+    Parameters
+    ----------
+    family : str
+        Name of protein family
+
+    Returns
+    -------
+    keras.Model
+        The model of the family's architecture with the family's weights, until the next family with the same architecture is loaded
+    """
+    weights: List[np.ndarray] = model_cache.get(family)
+    digest, model_json = family_architecture(family)
+    return shared_models.get(family, digest, model_json, weights)
+
+
+# the networks loaded by this process, reused by every sequence: one model per distinct architecture,
+# and the weights of the families used last
+shared_models: SharedModels = SharedModels(keras.models.model_from_json)
+model_cache: ModelCache = ModelCache(load_weights, cache_models, cache_mb * 2 ** 20)
+
+
+def centered_indices(encoded: List[np.ndarray], width: int) -> np.ndarray:
+    """ Center encoded sequences between gaps, as str.center(width, '-') does
+
+    Parameters
+    ----------
+    encoded : List[numpy.ndarray]
+        Letter indices of the sequences, none longer than width
+    width : int
+        Length of the centered sequences
+
+    Returns
+    -------
+    numpy.ndarray
+        len(encoded) x width array of letter indices
+    """
+    batch: np.ndarray = np.zeros((len(encoded), width), dtype=np.uint8)
+    k: int
+    for k, enc in enumerate(encoded):
+        margin: int = width - len(enc)
+        # str.center puts the odd gap on the left when width is odd
+        left: int = margin // 2 + (margin & width & 1)
+        batch[k, left:left + len(enc)] = enc
+    return batch
+
+
+def score_families(families: List[Tuple[int, str, int]], encoded: List[np.ndarray], ignore_gaps: bool = False,
+                   allowed: np.ndarray = None, pbar: tqdm = None) -> Tuple[np.ndarray, np.ndarray]:
+    """ Best reconstruction accuracy of every sequence over some protein families
+
+    Parameters
+    ----------
+    families : List[Tuple[int, str, int]]
+        Position in the search order, name and size of each family, in search order
+    encoded : List[numpy.ndarray]
+        Letter indices of the sequences
+    ignore_gaps : bool
+        Score the reconstructions on the positions that aren't gaps only
+    allowed : numpy.ndarray
+        Family x sequence mask of the families each sequence is scored against, one row per entry of families. Default: all of them
+    pbar : tqdm
+        Progress bar advanced once per family
+
+    Returns
+    -------
+    Tuple[numpy.ndarray, numpy.ndarray]
+        Best accuracy of each sequence, and search order position of the first family that reached it, -1 if none did
+    """
+    lengths: np.ndarray = np.array([len(enc) for enc in encoded])
+    max_acc: np.ndarray = np.zeros(len(encoded))
+    chosen_family: np.ndarray = np.full(len(encoded), -1)
+
+    row: int
+    order: int
+    name: str
+    seq_length: int
+    for row, (order, name, seq_length) in enumerate(families):
+        eligible: np.ndarray = np.flatnonzero((lengths <= seq_length) & (True if allowed is None else allowed[row]))
+        if pbar is not None:
+            pbar.update()
+        if len(eligible) == 0:
+            continue
+        loaded_model: keras.Model = load_network(name)
+
+        start: int
+        for start in range(0, len(eligible), batch_size):
+            batch: np.ndarray = eligible[start:start + batch_size]
+            msa_seqs: np.ndarray = centered_indices([encoded[i] for i in batch], seq_length)
+
+            # use the one hot encoded version of the protein sequences, in the network's float32
+            x_test: np.ndarray = indices_to_one_hot(msa_seqs, dtype=np.float32)
+            x_test = x_test.reshape((len(x_test), np.prod(x_test.shape[1:])))
+
+            # reconstruct the new protein sequences with the network
+            a = np.asarray(loaded_model.predict_on_batch(x_test))
+            a = a.reshape(len(msa_seqs), seq_length, 21)
+
+            # find the reconstruction accuracy, only a strictly better family replaces an earlier one
+            acc: np.ndarray = reconstruction_acc(msa_seqs, a, ignore_gaps)
+            better: np.ndarray = acc > max_acc[batch]
+            max_acc[batch[better]] = acc[better]
+            chosen_family[batch[better]] = order
+
+    return max_acc, chosen_family
+
+
+def prefilter_rankings(families: List[Tuple[int, str, int]], lseqs: List[str], index_file: Path = None, top: int = None) -> List[np.ndarray]:
+    """ Order the families by the similarity of their k-mer composition to each sequence
+
+    Parameters
+    ----------
+    families : List[Tuple[int, str, int]]
+        Position in the search order, name and size of each family, in search order
+    lseqs : List[str]
+        Sequences
+    index_file : pathlib.Path
+        k-mer index built by kmer_index. Default: Trained_networks/kmer_index.npz
+    top : int
+        Keep the top most similar families of each sequence. Default: all of them
+
+    Returns
+    -------
+    List[numpy.ndarray]
+        Search order positions of the families each sequence fits in, most similar first.
+        Families missing from the index come last, in search order
+    """
+    from .kmer_index import KmerIndex, get_index, index_filename
+    index: KmerIndex = get_index(index_file if index_file is not None else networks_path / index_filename)
+    known: List[Tuple[int, str, int]] = [family for family in families if family[1] in index.index]
+    known_orders: np.ndarray = np.array([family[0] for family in known], dtype=int)
+    known_sizes: np.ndarray = np.array([family[2] for family in known], dtype=int)
+    unknown_orders: np.ndarray = np.array([family[0] for family in families if family[1] not in index.index], dtype=int)
+    unknown_sizes: np.ndarray = np.array([family[2] for family in families if family[1] not in index.index], dtype=int)
+    similarity: np.ndarray = index.similarity(lseqs)[:, [index.index[family[1]] for family in known]]
+    rankings: List[np.ndarray] = []
+    i: int
+    for i, lseq in enumerate(lseqs):
+        # ties keep the search order
+        ranked: np.ndarray = np.argsort(-similarity[i], kind='stable')
+        ranking: np.ndarray = np.concatenate([known_orders[ranked][known_sizes[ranked] >= len(lseq)], unknown_orders[unknown_sizes >= len(lseq)]])
+        rankings.append(ranking[:top])
+    return rankings
+
+
+def encode_latent(encoded: List[np.ndarray], encoder: keras.Model) -> Tuple[np.ndarray, np.ndarray]:
+    """ Map sequences to latent spaces with an encoder network
+
+    Parameters
+    ----------
+    encoded : List[numpy.ndarray]
+        Letter indices of the sequences
+    encoder : keras.Model
+        Network taking a one hot encoded sequence, centered to its input length like the family networks take them
+
+    Returns
+    -------
+    Tuple[numpy.ndarray, numpy.ndarray]
+        Positions of the sequences that fit in the encoder's input, and their latent spaces, one row each
     """
-    filteredseq: pd.DataFrame = seq_lengths.query('size >= @slen')
-    havefile: pd.Series = filteredseq['name'].map(lambda x: (networks_path / (x + '.json')).exists())
-    networks: pd.DataFrame = filteredseq[havefile]
-    return networks
+    width: int = int(np.prod(encoder.input_shape[1:])) // 21
+    fits: np.ndarray = np.flatnonzero([len(enc) <= width for enc in encoded])
+    latents: List[np.ndarray] = []
+    start: int
+    for start in range(0, len(fits), batch_size):
+        x_test: np.ndarray = indices_to_one_hot(centered_indices([encoded[i] for i in fits[start:start + batch_size]], width), dtype=np.float32)
+        z = encoder.predict_on_batch(x_test.reshape((len(x_test), -1)))
+        if isinstance(z, list):
+            # a variational encoder gives the mean first
+            z = z[0]
+        latents.append(np.asarray(z, dtype=np.float64).reshape((len(x_test), -1)))
+    return fits, np.concatenate(latents) if latents else np.empty((0, 0))
+
+
+def shortlist_families(families: List[Tuple[int, str, int]], encoded: List[np.ndarray], k: int, metric: Metric, p_norm: int = 2,
+                       encoder: Path = None) -> np.ndarray:
+    """ Pick the families each sequence is scored against by the distance between latent spaces
+
+    Parameters
+    ----------
+    families : List[Tuple[int, str, int]]
+        Position in the search order, name and size of each family, in search order
+    encoded : List[numpy.ndarray]
+        Letter indices of the sequences
+    k : int
+        Number of closest families scored per sequence
+    metric : Metric
+        Distance function
+    p_norm : int
+        The p-norm to apply for Minkowski
+    encoder : pathlib.Path
+        Path of the encoder network files without the .json and _weights.h5 endings. Default: Trained_networks/encoder
+
+    Returns
+    -------
+    numpy.ndarray
+        Family x sequence mask for score_families, one row per entry of families. Sequences too long for the encoder are scored against every family
+    """
+    from .SearchLS import closest_families
+    from .LSVector import LSVector
+    from .ls_store import get_store
+    prefix: Path = encoder if encoder is not None else networks_path / encoder_name
+    archive: Optional[NetworkArchive] = open_archive() if encoder is None else None
+    encoder_model: keras.Model
+    if archive is not None and encoder_name + '.json' in archive and encoder_name + '_weights.h5' in archive:
+        encoder_model = keras.models.model_from_json(archive.read(encoder_name + '.json').decode())
+        encoder_model.load_weights(str(archive.extract(encoder_name + '_weights.h5')))
+    elif not Path(str(prefix) + '.json').exists() or not Path(str(prefix) + '_weights.h5').exists():
+        exit("--shortlist needs an encoder network: " + str(prefix) + ".json and " + str(prefix) + "_weights.h5")
+    else:
+        encoder_model = load_model_files(prefix)
+    fits, latents = encode_latent(encoded, encoder_model)
+    allowed: np.ndarray = np.ones((len(families), len(encoded)), dtype=bool)
+    if len(fits) == 0:
+        return allowed
+    if latents.shape[1] != get_store().vectors.shape[1]:
+        exit("The encoder gives latent spaces of " + str(latents.shape[1]) + " floats, the protein families have " +
+             str(get_store().vectors.shape[1]))
+    allowed[:, fits] = False
+    row_of: Dict[str, int] = {family[1]: row for row, family in enumerate(families)}
+    # families without a network that fits the sequence use up places on the shortlist
+    results: List[SearchLSOutput] = closest_families([LSVector('', z) for z in latents], metric, p_norm, k)
+    i: int
+    for i, res in zip(fits, results):
+        name: str
+        for name, _ in res.neighbors:
+            if name in row_of:
+                allowed[row_of[name], i] = True
+    return allowed
+
+
+def search_sequences(seqs: List[str], ignore_gaps: bool = False, jobs: int = 1, shortlist: int = None,
+                     metric: Metric = None, p_norm: int = 2, encoder: Path = None,
+                     prefilter_top: int = None, stop_at: float = None, kmer_index: Path = None,
+                     lseqs: List[str] = None, skip_invalid: bool = False, pool: multiprocessing.pool.Pool = None) -> List[SearchSQOutput]:
+    """ Find the best matching protein family of many sequences, one family at a time
+
+    Every family's network is loaded once and reconstructs all the sequences that fit in it in batches
+
+    Parameters
+    ----------
+    seqs : List[str]
+        Filenames of sequences, or names of the sequences in lseqs
+    ignore_gaps : bool
+        Score the reconstructions on the positions that aren't gaps only
+    jobs : int
+        Number of worker processes scoring the families, 1 to score them in this process
+    shortlist : int
+        Only score each sequence against the families with the closest latent spaces to its own. Default: score every family
+    metric : Metric
+        Distance function of the shortlist. Default: euclidean
+    p_norm : int
+        The p-norm to apply for Minkowski
+    encoder : pathlib.Path
+        Encoder network of the shortlist, see shortlist_families
+    prefilter_top : int
+        Only score each sequence against the families with the most similar k-mer composition
+    stop_at : float
+        Score the families in order of k-mer similarity, prefilter_round at a time, until a sequence reaches this accuracy
+    kmer_index : pathlib.Path
+        k-mer index of prefilter_top and stop_at, see prefilter_rankings
+    lseqs : List[str]
+        Sequences. Default: read from the files in seqs
+    skip_invalid : bool
+        Warn about sequences with invalid letters and give them no family, instead of exiting
+    pool : multiprocessing.pool.Pool
+        The jobs worker processes, see seq_pool.open_pool. Default: started for this call and stopped at its end
+
+    Returns
+    -------
+    List[SearchSQOutput]
+        One result per sequence, in the same order
+    """
+    check_files()
+    if lseqs is None:
+        lseqs = [load_sequence(seq) for seq in seqs]
+    # each sequence is encoded once and centered for every family
+    encoded: List[np.ndarray] = []
+    valid: List[int] = []
+    i: int
+    seq: str
+    for i, (seq, lseq) in enumerate(zip(seqs, lseqs)):
+        try:
+            encoded.append(to_indices(lseq))
+            valid.append(i)
+        except InvalidSequenceError as err:
+            if not skip_invalid:
+                exit(seq + ": " + str(err))
+            sys.stderr.write(seq + ": " + str(err) + ", skipped\n")
+    results: List[SearchSQOutput] = [SearchSQOutput(seq, 'none', '0') for seq in seqs]
+    if not encoded:
+        return results
+    families: List[Tuple[int, str, int]] = [(order, name, size) for order, (name, size) in enumerate(find_networks(min(len(enc) for enc in encoded)))]
+
+    allowed: Optional[np.ndarray] = None
+    rankings: Optional[List[np.ndarray]] = None
+    round_size: int = 0
+    if shortlist is not None:
+        allowed = shortlist_families(families, encoded, shortlist, metric if metric is not None else get_distance_function('euclidean'),
+                                     p_norm, encoder)
+    elif prefilter_top is not None or stop_at is not None:
+        rankings = prefilter_rankings(families, [lseqs[i] for i in valid], kmer_index, prefilter_top)
+        round_size = prefilter_round if stop_at is not None else max(len(ranking) for ranking in rankings)
+
+    max_acc: np.ndarray = np.zeros(len(encoded))
+    chosen_family: np.ndarray = np.full(len(encoded), -1)
+    own_pool: bool = pool is None and jobs > 1
+    if jobs > 1:
+        from .seq_pool import open_pool, pool_scores
+        if own_pool:
+            pool = open_pool(jobs)
+    try:
+        pbar: tqdm
+        with tqdm(total=0, disable=no_pbar) as pbar:
+            start: int = 0
+            while True:
+                if rankings is not None:
+                    # the next families of every sequence that is still below stop_at
+                    allowed = np.zeros((len(families), len(encoded)), dtype=bool)
+                    for i, ranking in enumerate(rankings):
+                        if stop_at is None or max_acc[i] < stop_at:
+                            allowed[ranking[start:start + round_size], i] = True
+                rows: np.ndarray = np.arange(len(families)) if allowed is None else np.flatnonzero(allowed.any(axis=1))
+                round_families: List[Tuple[int, str, int]] = [families[row] for row in rows]
+                round_allowed: Optional[np.ndarray] = None if allowed is None else allowed[rows]
+                pbar.total += len(round_families)
+                pbar.refresh()
+                if jobs > 1 and len(round_families) > 1:
+                    acc, order = pool_scores(pool, jobs, round_families, encoded, ignore_gaps, round_allowed, pbar)
+                else:
+                    acc, order = score_families(round_families, encoded, ignore_gaps, round_allowed, pbar)
+                merge_scores(max_acc, chosen_family, acc, order)
+                start += round_size
+                if rankings is None or len(rows) == 0:
+                    break
+    finally:
+        if own_pool:
+            pool.terminate()
+
+    for i, acc, order in zip(valid, max_acc, chosen_family):
+        if order >= 0:
+            results[i] = SearchSQOutput(seqs[i], families[order][1], str(float(acc)))
+    return results
 
 
 class SearchSQ:
 
     seq: str
-    lseq: str
-    sequence_length: int
     result: SearchSQOutput
 
     def __init__(self, seq: str):
@@ -110,61 +638,5 @@ class SearchSQ:
         seq : str
             Filename of sequence
         """
-        check_files()
         self.seq = seq
-        self.lseq = load_sequence(self.seq)
-        self.sequence_length = len(self.lseq)
-        self.result = self.do_search()
-
-    def do_search(self) -> SearchSQOutput:
-        """ Find best matching protein family
-
-        Returns
-        -------
-        SearchSQOutput
-        """
-        network_list = find_networks(self.sequence_length)
-        max_acc: float = 0
-        chosen_family: str = 'none'
-
-        for family in tqdm(network_list.itertuples(), total=network_list.shape[0], disable=no_pbar):
-            test_seq: str = self.lseq
-            jfile: TextIO
-            with open(networks_path / (family.name + '.json')) as jfile:
-                model_json = jfile.read()
-            loaded_model: keras.Model = keras.models.model_from_json(model_json)
-            loaded_model.load_weights(networks_path / (family.name + '_weights.h5'))
-
-            test_seq = test_seq.center(int(family.size), '-')
-            seq_length: int = len(test_seq)
-
-            # use the one hot encoded version of the protein sequence
-            single_msa_seq: List[str] = [test_seq]
-            x_test: np.ndarray = to_one_hot(single_msa_seq)
-            x_test = x_test.reshape((len(x_test), np.prod(x_test.shape[1:])))
-
-            # reconstruct the new protein sequence with the network
-            a = loaded_model.predict(x_test, steps=1)
-            a = a.reshape(len(single_msa_seq), seq_length, 21)
-
-            # x is the reconstructed sequence
-            x: np.ndarray = np.vectorize(get_AA)(np.argmax(a, axis=-1))
-            x: list = np.array(x).tolist()
-            k: int
-            for k in range(0, len(x)):
-                x[k] = ''.join(x[k])
-            count: int = 0
-
-            # find the reconstruction accuracy
-            j: int
-            xlen = len(x[0])
-            for j in range(0, xlen):
-                if x[0][j] == single_msa_seq[0][j]:
-                    count = count + 1
-            acc: float = count / xlen
-
-            if acc > max_acc:
-                max_acc = acc
-                chosen_family = family.name
-
-        return SearchSQOutput(self.seq, chosen_family, str(max_acc))
+        self.result = search_sequences([seq])[0]
@@ -1,4 +1,5 @@
-from typing import TextIO
+import json
+from typing import List
 
 
 class SearchSQOutput:
@@ -25,21 +26,12 @@ class SearchSQOutput:
     def to_stdout(self):
         print('The closest protein family to ' + self.seq + ' is ' + self.closest + ' with average accuracy: ' + self.accuracy)
 
-    def to_file(self, fname: str, ftype: str, mode: str):
-        """
+    def to_lines(self, ftype: str) -> List[str]:
+        if ftype == "text":
+            return ['The closest protein family to ' + self.seq + ' is ' + self.closest + ' with average accuracy: ' + self.accuracy]
+        if ftype == "jsonl":
+            return [json.dumps({'seq': self.seq, 'closest': self.closest, 'accuracy': float(self.accuracy)})]
+        return [self.seq + ',' + self.closest + ',' + self.accuracy]
 
-        Parameters
-        ----------
-        fname : str
-            Output filename
-        ftype : str
-            Output format
-        mode : str
-            Output mode
-        """
-        outf: TextIO
-        with open(fname, mode) as outf:
-            if ftype == "text":
-                outf.write('The closest protein family to ' + self.seq + ' is ' + self.closest + ' with average accuracy: ' + self.accuracy + '\n')
-            else:
-                outf.write(self.seq + ',' + self.closest + ',' + self.accuracy + '\n')
+    def to_records(self) -> List[dict]:
+        return [{'seq': self.seq, 'closest': self.closest, 'accuracy': float(self.accuracy)}]
@@ -1,10 +1,11 @@
 import argparse
-from typing import List
+import importlib
+from typing import List, Callable
 
 output_opt_parser: argparse.ArgumentParser = argparse.ArgumentParser(add_help=False)
 output_opt_group = output_opt_parser.add_argument_group("output options")
 output_opt_group.add_argument("-out", help="Output filename", dest="output_file", type=str, default="")
-output_opt_group.add_argument("-of", help="Output format. Default: %(default)s", dest="output_format", type=str, choices=["text", "csv"], default="text")
+output_opt_group.add_argument("-of", help="Output format. Default: %(default)s", dest="output_format", type=str, choices=["text", "csv", "jsonl", "npz", "hdf5"], default="text")
 output_opt_group.add_argument("-om", help="Output mode. Default: %(default)s", dest="output_mode", type=str, choices=['a', 'w'], default='a')
 
 metrics: List[str] = ['euclidean', 'minkowski', 'cityblock', 'sqeuclidean', 'cosine',
@@ -20,3 +21,22 @@ dist_opt_group.add_argument("-p", help="Scalar. The p-norm to apply for Minkowsk
 metrics_epilog: str = '''Available distance metrics: 
    euclidean, minkowski, cityblock, sqeuclidean, cosine, correlation, hamming, jaccard, chebyshev, canberra, braycurtis, yule, dice, kulsinski, rogerstanimoto, russellrao, sokalmichener, sokalsneath
 '''
+
+
+def lazy_command(module: str, name: str) -> Callable[[argparse.Namespace], None]:
+    """ Subcommand handler that only imports its module when the subcommand runs
+
+    Parameters
+    ----------
+    module : str
+        Module of the handler, relative to this package
+    name : str
+        Name of the handler function
+
+    Returns
+    -------
+    function
+    """
+    def run(args: argparse.Namespace):
+        getattr(importlib.import_module(module, __name__), name)(args)
+    return run
@@ -0,0 +1,148 @@
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# set to skip the search server and always run in this process
+no_server_env: str = 'COMPBIOLAB_NO_SERVER'
+socket_env: str = 'COMPBIOLAB_SOCKET'
+
+# environment variables sent with each request and set in the server while it runs: network_archive.url_env and
+# sha256_env, not imported so the client stays quick to start
+forwarded_env: List[str] = ['COMPBIOLAB_NETWORKS_URL', 'COMPBIOLAB_NETWORKS_SHA256']
+
+
+def socket_path() -> Path:
+    """ Unix domain socket of the search server
+
+    Returns
+    -------
+    pathlib.Path
+        $COMPBIOLAB_SOCKET, or serve.sock in the user cache directory
+    """
+    if os.environ.get(socket_env):
+        return Path(os.environ[socket_env])
+    return Path.home() / '.cache' / 'compbiolab-CLI' / 'serve.sock'
+
+
+def connect() -> Optional[socket.socket]:
+    """ Connect to the search server
+
+    Returns
+    -------
+    socket.socket
+        None if the server isn't running
+    """
+    path: Path = socket_path()
+    if not hasattr(socket, 'AF_UNIX') or not path.exists():
+        return None
+    sock: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+    except OSError:
+        # left behind by a server that is no longer running
+        sock.close()
+        return None
+    return sock
+
+
+def send_request(sock: socket.socket, request: dict, output: Callable[[dict], None] = None) -> dict:
+    """ Send one request to the search server and wait for the response
+
+    The server sends the output of a command as it is written, one line of JSON per write, and then the response
+
+    Parameters
+    ----------
+    sock : socket.socket
+        Connection to the server
+    request : dict
+        Request, sent as one line of JSON
+    output : function
+        Called with each output message, {'stdout': text} or {'stderr': text}. Default: output is dropped
+
+    Returns
+    -------
+    dict
+        Response, with the exit status
+    """
+    with sock:
+        sock.sendall(json.dumps(request).encode() + b'\n')
+        f = sock.makefile('rb')
+        line: bytes
+        for line in f:
+            message: dict = json.loads(line.decode())
+            if 'status' in message:
+                return message
+            if output is not None:
+                output(message)
+    raise ConnectionError('the search server closed the connection')
+
+
+def write_output(message: dict):
+    """ Print an output message of the search server as soon as it arrives
+
+    Parameters
+    ----------
+    message : dict
+        {'stdout': text} or {'stderr': text}
+    """
+    stream = sys.stdout if 'stdout' in message else sys.stderr
+    stream.write(message.get('stdout', message.get('stderr', '')))
+    stream.flush()
+
+
+def forward(command: str, argv: List[str]) -> Optional[int]:
+    """ Run a command in the search server if it is running
+
+    Parameters
+    ----------
+    command : str
+        compare or search
+    argv : List[str]
+        Command line arguments
+
+    Returns
+    -------
+    int
+        Exit status of the command, None if it wasn't forwarded
+    """
+    if os.environ.get(no_server_env):
+        return None
+    sock: Optional[socket.socket] = connect()
+    if sock is None:
+        return None
+    try:
+        env: Dict[str, str] = {name: os.environ[name] for name in forwarded_env if name in os.environ}
+        response: dict = send_request(sock, {'command': command, 'argv': argv, 'cwd': os.getcwd(), 'env': env}, write_output)
+    except (OSError, ValueError) as err:
+        # the request may already have run, so don't run it again here
+        sys.stderr.write('Search server error: ' + str(err) + '\n')
+        return 1
+    # stats, stop and errors before the command ran come whole with the response
+    sys.stdout.write(response.get('stdout', ''))
+    sys.stderr.write(response.get('stderr', ''))
+    return response.get('status', 1)
+
+
+def compare_main():
+    """ compare entry point, forwarded to the search server when it is running
+
+    """
+    status: Optional[int] = forward('compare', sys.argv[1:])
+    if status is not None:
+        sys.exit(status)
+    from .compare import main
+    main()
+
+
+def search_main():
+    """ search entry point, forwarded to the search server when it is running
+
+    """
+    status: Optional[int] = forward('search', sys.argv[1:])
+    if status is not None:
+        sys.exit(status)
+    from .search import main
+    main()
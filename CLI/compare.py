@@ -1,19 +1,22 @@
 import argparse
-from typing import List, Callable
+from typing import List
 from argparse_formatter import FlexiFormatter
 from .CompareLSOutput import CompareLSOutput
-from .get_metric import get_distance_function
-from .family_list import print_families
-from .LSVector import LSVector
-from .CompareLS import CompareLS
+from .CompareLSMatrixOutput import CompareLSMatrixOutput
+from .CompareLSPairsOutput import CompareLSPairsOutput
 from . import output_opt_parser, dist_opt_parser, metrics_epilog
 from .output_results import output_result
 
 family_help: str = "Protein family's name. Provide an existing protein family's name or the file name of a new latent space. Files should contain 30 floats, each float in a separate line."
 
 compare_usage: str = '''%(prog)s [-h] <protein_family> <protein_family> [output_options] [distance_options]
+                    --rows <list> [--cols <list>] --matrix-out <file> [--tile N] [output_options] [distance_options]
+                    --pairs <pairs.tsv> [output_options] [distance_options]
                     list names'''
 
+pairs_help: str = "Tab-separated file with two protein family names or latent space file names per line. Compute the distance of every pair."
+rows_help: str = "File listing protein family names or latent space file names, one per line. Compute the distance matrix between these and --cols."
+
 
 def run(args: argparse.Namespace):
     """
@@ -29,8 +32,9 @@ def run(args: argparse.Namespace):
     family_list: List[str] = args.family_name
 
     # Set the distance metric
+    from .get_metric import Metric, get_distance_function
     distance_metric: str = args.distance_metric
-    distance_function: Callable = get_distance_function(distance_metric)
+    distance_function: Metric = get_distance_function(distance_metric)
 
     # The p-norm to apply for Minkowski
     p_norm: int = args.p_norm  # default is 2
@@ -42,26 +46,67 @@ def run(args: argparse.Namespace):
 
     # List protein family names
     if family_list == ['list', 'names']:
+        from .family_list import print_families
         print_families(None)  # argument required in search but never used
         return
 
-    else:
-        # turn names into objects containing data
-        v: List[LSVector] = [LSVector(family_list[0]), LSVector(family_list[1])]
+    # Distance of every listed pair, computed together
+    if args.pairs is not None:
+        from .CompareLSPairs import CompareLSPairs
+        from .load_files import load_pair_list
+        pairs: CompareLSPairsOutput = CompareLSPairs(load_pair_list(args.pairs), distance_function, p_norm).result
+        output_result(pairs, output_filename, out_format, out_mode)
+        return
+
+    # Distance matrix between two lists, written to the matrix file tile by tile
+    if args.rows is not None:
+        from .CompareLSMatrix import CompareLSMatrix
+        from .load_files import load_name_list
+        cols_file: str = args.cols if args.cols is not None else args.rows
+        matrix: CompareLSMatrixOutput = CompareLSMatrix(args.rows, load_name_list(args.rows), cols_file, load_name_list(cols_file),
+                                                        distance_function, p_norm, args.matrix_out, args.tile).result
+        output_result(matrix, output_filename, out_format, out_mode)
+        return
+
+    from .LSVector import LSVector
+    from .CompareLS import CompareLS
+    # turn names into objects containing data
+    v: List[LSVector] = [LSVector(family_list[0]), LSVector(family_list[1])]
 
     # find distance between the vectors, create CompareOutput object
     res: CompareLSOutput = CompareLS(v, distance_function, p_norm).result
     output_result(res, output_filename, out_format, out_mode)
 
 
-def main():
+def main(argv: List[str] = None):
+    """
+
+    Parameters
+    ----------
+    argv : List[str]
+        Command line arguments. Default: sys.argv
+    """
     parser: argparse.ArgumentParser = argparse.ArgumentParser(usage=compare_usage, description='Find the distance between fingerprints of two protein families.',
                                                               formatter_class=FlexiFormatter, parents=[output_opt_parser, dist_opt_parser], epilog=metrics_epilog)
-    parser.add_argument("family_name", help=family_help, metavar="protein_family", nargs=2, type=str)
+    parser.add_argument("family_name", help=family_help, metavar="protein_family", nargs='*', type=str)
     parser.add_argument("ln", metavar='list names', nargs=argparse.SUPPRESS, help="Show available protein family names")
+    parser.add_argument("--pairs", help=pairs_help, metavar="PAIRS", type=str, default=None)
+    matrix_group = parser.add_argument_group("matrix options")
+    matrix_group.add_argument("--rows", help=rows_help, metavar="LIST", type=str, default=None)
+    matrix_group.add_argument("--cols", help="File listing the columns of the distance matrix. Default: the --rows list", metavar="LIST", type=str, default=None)
+    matrix_group.add_argument("--matrix-out", help="Distance matrix filename, HDF5 for .h5/.hdf5, otherwise .npy", dest="matrix_out", type=str, default=None)
+    matrix_group.add_argument("--tile", help="Rows and columns computed at once, bounds memory use. Default: %(default)s", type=int, default=1024)
 
     parser.set_defaults(func=run)
-    args: argparse.Namespace = parser.parse_args()
+    args: argparse.Namespace = parser.parse_args(argv)
+    if args.pairs is not None and (args.family_name or args.rows is not None):
+        parser.error("--pairs can't be combined with protein families or --rows")
+    if args.pairs is None and args.rows is None and len(args.family_name) != 2:
+        parser.error("two protein families are required")
+    if args.rows is not None and (args.family_name or args.matrix_out is None):
+        parser.error("--rows requires --matrix-out and no protein families")
+    if args.tile < 1:
+        parser.error("--tile must be at least 1")
     args.func(args)
 
 
@@ -0,0 +1,287 @@
+import csv
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import List, Dict, Tuple, Optional, Callable, Collection, TextIO, BinaryIO
+import numpy as np
+from .load_files import lspath, s_length
+from . import ls_store
+from .ls_store import racy_ns, racy
+
+catalog_filename: str = 'family_catalog.npz'
+catalog_version: int = 2
+
+# the catalog loaded by this process, shared by every entry point
+_catalog: Optional['FamilyCatalog'] = None
+
+
+class FamilyCatalog:
+    """ Every protein family with its padded sequence length, and whether it has a latent space and a trained network
+
+    The families are sorted by size, so the families a sequence fits in are found with a binary search
+    """
+    names: np.ndarray
+    sizes: np.ndarray
+    order: np.ndarray
+    has_latent: np.ndarray
+    has_network: np.ndarray
+    sources: str
+    network_source: str
+    directory_sources: str
+    index: Dict[str, int]
+
+    def __init__(self, names: np.ndarray, sizes: np.ndarray, order: np.ndarray, has_latent: np.ndarray, has_network: np.ndarray,
+                 sources: str, network_source: str = '', directory_sources: str = ''):
+        """
+
+        Parameters
+        ----------
+        names : numpy.ndarray
+            Names of the protein families, sorted by size
+        sizes : numpy.ndarray
+            Padded sequence length of each family, 0 if it isn't in seq_lengths.csv
+        order : numpy.ndarray
+            Position of each family in seq_lengths.csv, the order sequence searches score the families in
+        has_latent : numpy.ndarray
+            Whether each family has a latent space in Latent_spaces/
+        has_network : numpy.ndarray
+            Whether each family has a trained network
+        sources : str
+            source_signature() of the files the catalog was built from
+        network_source : str
+            Location and modification time of the trained networks has_network was set from, empty if it never was
+        directory_sources : str
+            directory_signature() of the files the catalog was built from, empty if unknown
+        """
+        self.names = names
+        self.sizes = sizes
+        self.order = order
+        self.has_latent = has_latent
+        self.has_network = has_network
+        self.sources = sources
+        self.network_source = network_source
+        self.directory_sources = directory_sources
+        self.index = {name: i for i, name in enumerate(names.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def latent_names(self) -> List[str]:
+        """
+
+        Returns
+        -------
+        List[str]
+            Names of the families with a latent space, sorted
+        """
+        return sorted(self.names[self.has_latent].tolist())
+
+    def csv_names(self) -> List[str]:
+        """
+
+        Returns
+        -------
+        List[str]
+            Names of the families in seq_lengths.csv, in its order
+        """
+        rows: np.ndarray = np.flatnonzero(self.order >= 0)
+        return self.names[rows[np.argsort(self.order[rows])]].tolist()
+
+    def fitting(self, slen: int) -> List[Tuple[str, int]]:
+        """ Families with a trained network that a sequence fits in
+
+        Parameters
+        ----------
+        slen : int
+            The minimum sequence length
+
+        Returns
+        -------
+        List[Tuple[str, int]]
+            Name and size of the families at least slen long, in seq_lengths.csv order
+        """
+        start: int = int(np.searchsorted(self.sizes, slen, side='left'))
+        # families missing from seq_lengths.csv have no size to center the sequence to
+        rows: np.ndarray = start + np.flatnonzero(self.has_network[start:] & (self.order[start:] >= 0))
+        rows = rows[np.argsort(self.order[rows], kind='stable')]
+        return list(zip(self.names[rows].tolist(), self.sizes[rows].tolist()))
+
+    def set_networks(self, network_source: str, networks: Collection[str]):
+        """ Record which families have a trained network
+
+        Parameters
+        ----------
+        network_source : str
+            Location and modification time of the trained networks
+        networks : Collection[str]
+            Names of the families with a trained network
+        """
+        self.has_network = np.array([name in networks for name in self.names.tolist()], dtype=bool)
+        self.network_source = network_source
+
+    def save(self, fname: Path):
+        """ Write the catalog to a temporary file and move it into place
+
+        Parameters
+        ----------
+        fname : pathlib.Path
+            npz file
+        """
+        fname.parent.mkdir(parents=True, exist_ok=True)
+        tmp: Path = fname.parent / (fname.name + '.' + str(os.getpid()))
+        outf: BinaryIO
+        # a file object keeps numpy from adding .npz to the name
+        with open(tmp, 'wb') as outf:
+            np.savez(outf, version=catalog_version, names=self.names, sizes=self.sizes, order=self.order, has_latent=self.has_latent,
+                     has_network=self.has_network, sources=self.sources, network_source=self.network_source,
+                     directory_sources=self.directory_sources)
+        os.replace(str(tmp), str(fname))
+
+
+def directory_signature() -> str:
+    """
+
+    Returns
+    -------
+    str
+        Modification times of seq_lengths.csv and Latent_spaces/, which change when a family is added or removed.
+        'racy' if either is too recent to tell later changes apart
+    """
+    mtimes: List[int] = [os.stat(str(s_length)).st_mtime_ns, os.stat(str(lspath)).st_mtime_ns]
+    now: int = time.time_ns()
+    if any(now - mtime <= racy_ns for mtime in mtimes):
+        return racy
+    return ' '.join(str(mtime) for mtime in mtimes)
+
+
+def source_signature() -> str:
+    """ Hash of the size and modification time of seq_lengths.csv and of every latent space file in Latent_spaces/
+
+    Returns
+    -------
+    str
+        Changes when a family is added, removed or edited, even if the directory's own mtime doesn't
+    """
+    stat: os.stat_result = os.stat(str(s_length))
+    h = hashlib.sha1()
+    h.update((s_length.name + ' ' + str(stat.st_size) + ' ' + str(stat.st_mtime_ns) + '\n').encode())
+    h.update(ls_store.source_signature(lspath).encode())
+    return h.hexdigest()
+
+
+def is_current(catalog: FamilyCatalog) -> bool:
+    """ Check if a catalog was built from the current seq_lengths.csv and Latent_spaces/
+
+    Only the mtimes are checked while they are unchanged, every file is checked when they changed
+
+    Parameters
+    ----------
+    catalog : FamilyCatalog
+
+    Returns
+    -------
+    bool
+    """
+    if catalog.directory_sources not in ('', racy) and catalog.directory_sources == directory_signature():
+        return True
+    return catalog.sources == source_signature()
+
+
+def build_catalog() -> FamilyCatalog:
+    """ Read seq_lengths.csv and list Latent_spaces/
+
+    Returns
+    -------
+    FamilyCatalog
+        Catalog with no trained networks recorded
+    """
+    # taken before the files are read, so files changed while building make the catalog stale
+    directory_sources: str = directory_signature()
+    sources: str = source_signature()
+    sizes: Dict[str, int] = {}
+    csv_file: TextIO
+    with s_length.open('r') as csv_file:
+        row: dict
+        for row in csv.DictReader(csv_file):
+            sizes[row['name']] = int(float(row['size']))
+    order: Dict[str, int] = {name: i for i, name in enumerate(sizes)}
+    latent: set = {fname[:-4] for fname in os.listdir(str(lspath)) if fname.endswith('.txt')}
+    # families in seq_lengths.csv order, then the ones with only a latent space
+    all_names: List[str] = list(sizes) + sorted(latent.difference(sizes))
+    rows: List[int] = sorted(range(len(all_names)), key=lambda i: sizes.get(all_names[i], 0))
+    names: List[str] = [all_names[i] for i in rows]
+    return FamilyCatalog(np.array(names, dtype=str), np.array([sizes.get(name, 0) for name in names], dtype=np.int64),
+                         np.array([order.get(name, -1) for name in names], dtype=np.int64), np.array([name in latent for name in names], dtype=bool),
+                         np.zeros(len(names), dtype=bool), sources, '', directory_sources)
+
+
+def load_catalog(fname: Path) -> FamilyCatalog:
+    """
+
+    Parameters
+    ----------
+    fname : pathlib.Path
+        npz file written by FamilyCatalog.save
+
+    Returns
+    -------
+    FamilyCatalog
+    """
+    with np.load(str(fname)) as data:
+        if int(data['version']) != catalog_version:
+            raise ValueError("Family catalog " + str(fname) + " has an unknown version")
+        return FamilyCatalog(data['names'], data['sizes'], data['order'], data['has_latent'], data['has_network'],
+                             str(data['sources']), str(data['network_source']), str(data['directory_sources']))
+
+
+def catalog_file() -> Path:
+    """
+
+    Returns
+    -------
+    pathlib.Path
+        Next to the packed latent space store
+    """
+    return ls_store.store_dir() / catalog_filename
+
+
+def get_catalog(network_source: str = None, networks: Callable[[], Collection[str]] = None) -> FamilyCatalog:
+    """ Get the family catalog, building it on first use
+
+    Parameters
+    ----------
+    network_source : str
+        Location and modification time of the trained networks. Default: don't check which families have one
+    networks : function
+        Gives the names of the families with a trained network, only called if network_source changed
+
+    Returns
+    -------
+    FamilyCatalog
+    """
+    global _catalog
+    changed: bool = False
+    if _catalog is None:
+        fname: Path = catalog_file()
+        try:
+            _catalog = load_catalog(fname)
+        except (OSError, ValueError, KeyError):
+            # missing, written by an older version, or being replaced by another process
+            _catalog = None
+        if _catalog is None or not is_current(_catalog):
+            _catalog = build_catalog()
+            changed = True
+    if network_source is not None and network_source != _catalog.network_source:
+        _catalog.set_networks(network_source, networks())
+        changed = True
+    if changed:
+        try:
+            _catalog.save(catalog_file())
+        except OSError:
+            # nowhere to write the catalog, so it is rebuilt by every process
+            pass
+    return _catalog
@@ -1,22 +1,12 @@
-import pandas as pd
-import sys
-
-if sys.version_info < (3, 9):
-    # importlib.resources either doesn't exist or lacks the files()
-    # function, so use the PyPI version:
-    import importlib_resources
-else:
-    # importlib.resources has files(), so use that:
-    import importlib.resources as importlib_resources
+from typing import List
 
 
 def print_families(a):
     """ Print the list of protein family names
 
     """
+    from .family_catalog import get_catalog
     print('Here is a list of protein families\' names:\n')
-    pkg = importlib_resources.files("CLI")
-    f = pkg / "seq_lengths.csv"
-    family_list: pd.Series = pd.read_csv(f, usecols=['name']).squeeze("columns")
+    family_list: List[str] = get_catalog().csv_names()
 
     print(*family_list, sep=', ')
@@ -1,8 +1,225 @@
-from typing import Callable
-from scipy.spatial import distance
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from . import metric_kernels
 
+# metrics computed with scipy's cdist and scalar functions.
+# jaccard and the boolean metrics always use the NumPy kernels: recent scipy versions cast their inputs to bool
+cdist_metrics: List[str] = ['euclidean', 'minkowski', 'cityblock', 'sqeuclidean', 'cosine', 'correlation',
+                            'hamming', 'chebyshev', 'canberra', 'braycurtis']
 
-def get_distance_function(distance_metric: str) -> Callable:
+# pairs computed per cdist call by Metric.paired_distances, which keeps the diagonal of each block.
+# minkowski with p other than 1 and 2 spends its time in pow rather than in the call, so it takes smaller blocks
+paired_block: int = 16
+paired_pow_block: int = 4
+
+
+class Metric:
+    """ A distance metric offered by the CLI
+
+    Called with two latent spaces it computes their distance like exact_distances(): with scipy's cdist, or with the
+    scipy 1.4 formula for jaccard and the boolean metrics, so a pair gets the same value whichever command computes it.
+    distances() computes many queries against many rows at once with the NumPy kernels of metric_kernels, within
+    error_bound() of exact_distances(), which gives the values shown
+    """
+    __name__: str
+    prepare: Callable
+    many: Optional[Callable]
+    error: Optional[Callable]
+
+    def __init__(self, name: str, prepare: Callable, many: Callable = None, error: Callable = None):
+        """
+
+        Parameters
+        ----------
+        name : str
+            Name of the metric, and of the function in scipy.spatial.distance
+        prepare : function
+            Computes what the one-vs-many kernel needs from the rows, once per set of rows. The rows come first
+        many : function
+            One-vs-many kernel. Default: scipy's cdist, for the element-wise metrics its C loop computes faster than NumPy
+        error : function
+            Bound on the rounding error of the one-vs-many kernel, for kernels that don't compute the exact distances
+        """
+        self.__name__ = name
+        self.prepare = prepare
+        self.many = many
+        self.error = error
+
+    def __call__(self, u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.double:
+        """ Distance between two latent spaces
+
+        Parameters
+        ----------
+        u : numpy.ndarray
+            Latent space data
+        v : numpy.ndarray
+            Latent space data
+        p_norm : int
+            The p-norm to apply for Minkowski
+
+        Returns
+        -------
+        numpy.double
+        """
+        # the scalar functions of scipy.spatial.distance, and NumPy sums over 1-D arrays, round differently
+        return self.exact_distances(np.reshape(u, (1, -1)), np.reshape(v, (1, -1)), p_norm)[0, 0]
+
+    def __eq__(self, other) -> bool:
+        return getattr(other, '__name__', None) == self.__name__
+
+    def __hash__(self) -> int:
+        return hash(self.__name__)
+
+    def has_kernel(self, p_norm: int = 2) -> bool:
+        """ Check if distances() uses a NumPy kernel rather than scipy's cdist
+
+        Parameters
+        ----------
+        p_norm : int
+            The p-norm to apply for Minkowski
+
+        Returns
+        -------
+        bool
+        """
+        return self.many is not None and (self.__name__ != 'minkowski' or p_norm == 2)
+
+    def distances(self, queries: np.ndarray, data: tuple, p_norm: int = 2) -> np.ndarray:
+        """ Distances from each query to every row
+
+        Parameters
+        ----------
+        queries : numpy.ndarray
+            Latent space data, one row per query
+        data : tuple
+            Output of prepare for the rows
+        p_norm : int
+            The p-norm to apply for Minkowski
+
+        Returns
+        -------
+        numpy.ndarray
+            Q x N matrix of distances
+        """
+        if not self.has_kernel(p_norm):
+            return self.exact_distances(queries, data[0], p_norm)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.many(np.asarray(queries, dtype=np.float64), data, p_norm)
+
+    def exact_distances(self, queries: np.ndarray, rows: np.ndarray, p_norm: int = 2) -> np.ndarray:
+        """ Distances from each query to every row, the same as the scalar function computes
+
+        Parameters
+        ----------
+        queries : numpy.ndarray
+            Latent space data, one row per query
+        rows : numpy.ndarray
+            Latent space data, one row per protein family
+        p_norm : int
+            The p-norm to apply for Minkowski
+
+        Returns
+        -------
+        numpy.ndarray
+            Q x N matrix of distances
+        """
+        if self.__name__ in cdist_metrics:
+            from scipy.spatial import distance
+            queries = np.asarray(queries, dtype=np.float64)
+            rows = np.asarray(rows, dtype=np.float64)
+            if self.__name__ == 'minkowski':
+                return distance.cdist(queries, rows, 'minkowski', p=p_norm)
+            return distance.cdist(queries, rows, self.__name__)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return metric_kernels.broadcast_distances(metric_kernels.paired_kernels[self.__name__], np.asarray(queries, dtype=np.float64),
+                                                      np.asarray(rows, dtype=np.float64), p_norm)
+
+    def paired_distances(self, u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+        """ Distance between each row of u and the same row of v, the same as the scalar function computes
+
+        The NumPy kernels compute the pairs row-wise. cdist has no row-wise mode, and NumPy sums in a different order
+        than its C loops, so its metrics take the diagonal of small blocks of pairs: the exact distances,
+        at a small multiple of the row-wise cost instead of one call per pair
+
+        Parameters
+        ----------
+        u : numpy.ndarray
+            Latent space data, one row per pair
+        v : numpy.ndarray
+            Latent space data, one row per pair
+        p_norm : int
+            The p-norm to apply for Minkowski
+
+        Returns
+        -------
+        numpy.ndarray
+            One distance per pair
+        """
+        if self.__name__ not in cdist_metrics:
+            return metric_kernels.paired_distances(u, v, self.__name__, p_norm)
+        u = np.asarray(u, dtype=np.float64)
+        v = np.asarray(v, dtype=np.float64)
+        block: int = paired_pow_block if self.__name__ == 'minkowski' and p_norm not in (1, 2) else paired_block
+        out: np.ndarray = np.empty(len(u))
+        start: int
+        for start in range(0, len(u), block):
+            out[start:start + block] = np.diagonal(self.exact_distances(u[start:start + block], v[start:start + block], p_norm))
+        return out
+
+    def error_bound(self, queries: np.ndarray, data: tuple, dists: np.ndarray, p_norm: int = 2) -> Optional[np.ndarray]:
+        """ Bound on the rounding error of distances()
+
+        Parameters
+        ----------
+        queries : numpy.ndarray
+            Latent space data, one row per query
+        data : tuple
+            Output of prepare for the rows
+        dists : numpy.ndarray
+            Output of distances()
+        p_norm : int
+            The p-norm to apply for Minkowski
+
+        Returns
+        -------
+        numpy.ndarray
+            Absolute error bound that broadcasts against dists, None if distances() computes the exact distances
+        """
+        if self.error is None:
+            return None
+        with np.errstate(invalid='ignore'):
+            return self.error(np.asarray(queries, dtype=np.float64), data, dists, p_norm)
+
+
+# cityblock, hamming, chebyshev, canberra, braycurtis, and minkowski with p other than 2 have no NumPy kernel:
+# they are element-wise, with no matrix product to rewrite them as, and scipy's cdist loops over them in C about 6x
+# faster than broadcasting them in NumPy, so distances() calls cdist for them at every size. The metrics that have a
+# kernel only use it from SearchLS.kernel_min_families families on, except jaccard and the boolean metrics,
+# which have no cdist path
+metric_registry: Dict[str, Metric] = {
+    'euclidean': Metric('euclidean', metric_kernels.prepare_norms, metric_kernels.euclidean_many, metric_kernels.euclidean_error),
+    'minkowski': Metric('minkowski', metric_kernels.prepare_norms, metric_kernels.minkowski_many, metric_kernels.minkowski_error),
+    'cityblock': Metric('cityblock', metric_kernels.prepare_rows),
+    'sqeuclidean': Metric('sqeuclidean', metric_kernels.prepare_norms, metric_kernels.sqeuclidean_many, metric_kernels.sqeuclidean_error),
+    'cosine': Metric('cosine', metric_kernels.prepare_norms, metric_kernels.cosine_many, metric_kernels.cosine_error),
+    'correlation': Metric('correlation', metric_kernels.prepare_centered, metric_kernels.correlation_many, metric_kernels.correlation_error),
+    'hamming': Metric('hamming', metric_kernels.prepare_rows),
+    'jaccard': Metric('jaccard', metric_kernels.prepare_rows, metric_kernels.broadcast_many(metric_kernels.jaccard)),
+    'chebyshev': Metric('chebyshev', metric_kernels.prepare_rows),
+    'canberra': Metric('canberra', metric_kernels.prepare_rows),
+    'braycurtis': Metric('braycurtis', metric_kernels.prepare_rows),
+    'yule': Metric('yule', metric_kernels.prepare_sums, metric_kernels.yule_many, metric_kernels.boolean_error),
+    'dice': Metric('dice', metric_kernels.prepare_sums, metric_kernels.dice_many, metric_kernels.boolean_error),
+    'kulsinski': Metric('kulsinski', metric_kernels.prepare_sums, metric_kernels.kulsinski_many, metric_kernels.boolean_error),
+    'rogerstanimoto': Metric('rogerstanimoto', metric_kernels.prepare_sums, metric_kernels.rogerstanimoto_many, metric_kernels.boolean_error),
+    'russellrao': Metric('russellrao', metric_kernels.prepare_rows, metric_kernels.russellrao_many, metric_kernels.boolean_error),
+    # sokalmichener has the same formula as rogerstanimoto
+    'sokalmichener': Metric('sokalmichener', metric_kernels.prepare_sums, metric_kernels.rogerstanimoto_many, metric_kernels.boolean_error),
+    'sokalsneath': Metric('sokalsneath', metric_kernels.prepare_sums, metric_kernels.sokalsneath_many, metric_kernels.boolean_error),
+}
+
+
+def get_distance_function(distance_metric: str) -> Metric:
     """ Turn the name of distance function into a function object
 
     Parameters
@@ -12,43 +229,7 @@ def get_distance_function(distance_metric: str) -> Callable:
 
     Returns
     -------
-    function
-        The distance function
+    Metric
+        The distance function. Default: euclidean
     """
-    if distance_metric == 'minkowski':
-        distance_function = distance.minkowski
-    elif distance_metric == 'cityblock':
-        distance_function = distance.cityblock
-    elif distance_metric == 'sqeuclidean':
-        distance_function = distance.sqeuclidean
-    elif distance_metric == 'cosine':
-        distance_function = distance.cosine
-    elif distance_metric == 'correlation':
-        distance_function = distance.correlation
-    elif distance_metric == 'hamming':
-        distance_function = distance.hamming
-    elif distance_metric == 'jaccard':
-        distance_function = distance.jaccard
-    elif distance_metric == 'chebyshev':
-        distance_function = distance.chebyshev
-    elif distance_metric == 'canberra':
-        distance_function = distance.canberra
-    elif distance_metric == 'braycurtis':
-        distance_function = distance.braycurtis
-    elif distance_metric == 'yule':
-        distance_function = distance.yule
-    elif distance_metric == 'dice':
-        distance_function = distance.dice
-    elif distance_metric == 'kulsinski':
-        distance_function = distance.kulsinski
-    elif distance_metric == 'rogerstanimoto':
-        distance_function = distance.rogerstanimoto
-    elif distance_metric == 'russellrao':
-        distance_function = distance.russellrao
-    elif distance_metric == 'sokalmichener':
-        distance_function = distance.sokalmichener
-    elif distance_metric == 'sokalsneath':
-        distance_function = distance.sokalsneath
-    else:
-        distance_function = distance.euclidean
-    return distance_function
+    return metric_registry.get(distance_metric, metric_registry['euclidean'])
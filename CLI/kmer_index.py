@@ -0,0 +1,245 @@
+import argparse
+import os
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple, BinaryIO
+import numpy as np
+from .utils import aa_letters
+from .utils.data_loaders import lookup_table
+
+index_filename: str = 'kmer_index.npz'
+
+# default k-mer length: 20^3 = 8000 counts per family
+default_k: int = 3
+
+# endings of the family FASTA files, the family name is the rest of the filename
+fasta_suffixes: List[str] = ['.fasta.gz', '.fa.gz', '.fasta', '.fa']
+
+# the index loaded by this process, and the absolute path, mtime and size of its file
+_index: Optional['KmerIndex'] = None
+_index_key: Optional[Tuple[str, int, int]] = None
+
+
+class KmerIndex:
+    """ Normalized k-mer composition profile of every protein family, to rank families by their similarity to a sequence
+
+    """
+    names: List[str]
+    k: int
+    profiles: np.ndarray
+    index: Dict[str, int]
+
+    def __init__(self, names: List[str], k: int, profiles: np.ndarray):
+        """
+
+        Parameters
+        ----------
+        names : List[str]
+            Names of the protein families
+        k : int
+            k-mer length
+        profiles : numpy.ndarray
+            float32 k-mer counts of each family divided by their norm, one row per family
+        """
+        self.names = names
+        self.k = k
+        self.profiles = profiles
+        self.index = {name: i for i, name in enumerate(names)}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def similarity(self, seqs: List[str]) -> np.ndarray:
+        """ Cosine similarity between the k-mer composition of each sequence and of every family
+
+        Parameters
+        ----------
+        seqs : List[str]
+            Sequences
+
+        Returns
+        -------
+        numpy.ndarray
+            Sequence x family matrix
+        """
+        queries: np.ndarray = np.stack([normalize(kmer_counts(seq, self.k)) for seq in seqs])
+        return queries @ self.profiles.T
+
+    def save(self, fname: Path):
+        """
+
+        Parameters
+        ----------
+        fname : pathlib.Path
+            npz file
+        """
+        outf: BinaryIO
+        # a file object keeps numpy from adding .npz to the name
+        with open(fname, 'wb') as outf:
+            np.savez(outf, names=np.array(self.names), k=self.k, profiles=self.profiles)
+
+
+def kmer_counts(seq: str, k: int) -> np.ndarray:
+    """ Count the k-mers of a sequence
+
+    Gaps are removed first, k-mers with letters outside the 20 amino acids aren't counted
+
+    Parameters
+    ----------
+    seq : str
+        Sequence, aligned or not
+    k : int
+        k-mer length
+
+    Returns
+    -------
+    numpy.ndarray
+        20^k counts, k-mers in lexicographic order of aa_letters
+    """
+    indices: np.ndarray = lookup_table(tuple(aa_letters))[np.frombuffer(seq.upper().encode('latin-1', 'replace'), dtype=np.uint8)]
+    # letters are 1 to 20, the gap is 0 and anything else 255
+    indices = indices[indices != 0].astype(np.int64) - 1
+    n: int = len(indices) - k + 1
+    if n <= 0:
+        return np.zeros(20 ** k, dtype=np.int64)
+    invalid: np.ndarray = np.concatenate([[0], np.cumsum(indices > 19)])
+    codes: np.ndarray = np.zeros(n, dtype=np.int64)
+    j: int
+    for j in range(k):
+        codes = codes * 20 + np.minimum(indices[j:j + n], 19)
+    valid: np.ndarray = invalid[k:] == invalid[:n]
+    return np.bincount(codes[valid], minlength=20 ** k)
+
+
+def normalize(counts: np.ndarray) -> np.ndarray:
+    """
+
+    Parameters
+    ----------
+    counts : numpy.ndarray
+        k-mer counts
+
+    Returns
+    -------
+    numpy.ndarray
+        float32 counts of unit length, zeros if there are none
+    """
+    norm: float = float(np.sqrt(np.dot(counts.astype(np.float64), counts)))
+    return (counts / norm if norm > 0 else counts).astype(np.float32)
+
+
+def family_name(fname: str) -> Optional[str]:
+    """
+
+    Parameters
+    ----------
+    fname : str
+        Filename
+
+    Returns
+    -------
+    str
+        Name of the family, None if it isn't a FASTA file
+    """
+    suffix: str
+    for suffix in fasta_suffixes:
+        if fname.endswith(suffix):
+            return fname[:-len(suffix)]
+    return None
+
+
+def build_index(fasta_dir: Path, k: int = default_k) -> KmerIndex:
+    """ Add up the k-mers of the sequences of each family FASTA file in a directory
+
+    Parameters
+    ----------
+    fasta_dir : pathlib.Path
+        Directory with one <family>.fasta, .fa, .fasta.gz or .fa.gz file per protein family
+    k : int
+        k-mer length
+
+    Returns
+    -------
+    KmerIndex
+    """
+    from .utils.io import iter_fasta
+    names: List[str] = []
+    profiles: List[np.ndarray] = []
+    fname: str
+    for fname in sorted(os.listdir(str(fasta_dir))):
+        name: Optional[str] = family_name(fname)
+        if name is None:
+            continue
+        counts: np.ndarray = np.zeros(20 ** k, dtype=np.int64)
+        seq: str
+        # one record at a time, large families aren't held in memory
+        for _, seq in iter_fasta(fasta_dir / fname):
+            counts += kmer_counts(seq, k)
+        names.append(name)
+        profiles.append(normalize(counts))
+    if not names:
+        exit("No FASTA files in " + str(fasta_dir))
+    return KmerIndex(names, k, np.stack(profiles))
+
+
+def load_index(fname: Path) -> KmerIndex:
+    """
+
+    Parameters
+    ----------
+    fname : pathlib.Path
+        npz file written by KmerIndex.save
+
+    Returns
+    -------
+    KmerIndex
+    """
+    with np.load(str(fname)) as data:
+        return KmerIndex([str(name) for name in data['names']], int(data['k']), data['profiles'])
+
+
+def get_index(fname: Path) -> KmerIndex:
+    """ Get a k-mer index, loading it on first use and again when the file is replaced, or relative to another directory
+
+    Parameters
+    ----------
+    fname : pathlib.Path
+        npz file written by KmerIndex.save
+
+    Returns
+    -------
+    KmerIndex
+    """
+    global _index, _index_key
+    if not fname.exists():
+        exit("No k-mer index at " + str(fname) + ", build one with: python -m CLI.kmer_index <family FASTA directory>")
+    stat: os.stat_result = fname.stat()
+    key: Tuple[str, int, int] = (str(fname.resolve()), stat.st_mtime_ns, stat.st_size)
+    if _index is None or _index_key != key:
+        _index = load_index(fname)
+        _index_key = key
+    return _index
+
+
+def main(argv: List[str] = None):
+    """
+
+    Parameters
+    ----------
+    argv : List[str]
+        Command line arguments. Default: sys.argv
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Build the k-mer composition index that search seq --prefilter-top and --stop-at rank the protein families with.')
+    parser.add_argument('fasta_dir', metavar="directory", help="Directory with one <family>.fasta, .fa, .fasta.gz or .fa.gz file per protein family", type=str)
+    parser.add_argument('-k', help="k-mer length. Default: %(default)s", dest="k", type=int, choices=[1, 2, 3, 4], default=default_k)
+    parser.add_argument('-o', help="Index file. Default: Trained_networks/" + index_filename, dest="output", type=str, default=None)
+    args: argparse.Namespace = parser.parse_args(argv)
+    # next to the trained networks, without loading TensorFlow for SearchSQ.networks_path
+    output: Path = Path(args.output) if args.output is not None else Path('Trained_networks') / index_filename
+    index: KmerIndex = build_index(Path(args.fasta_dir), args.k)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    index.save(output)
+    print(str(len(index)) + " protein families written to " + str(output))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from typing import List, TextIO
+from typing import List, TextIO, Tuple
 import numpy as np
 import sys
 
@@ -82,6 +82,62 @@ def load_sequence(fname: str) -> str:
         exit(err)
 
 
+def load_name_list(fname: str) -> List[str]:
+    """ Load a list of protein family names or latent space filenames
+
+    Parameters
+    ----------
+    fname : str
+        Name of a file with one name per line
+
+    Returns
+    -------
+    List[str]
+        Names, without blank lines
+    """
+    try:
+        list_file: TextIO
+        with open(fname, "r") as list_file:
+            return [line.strip() for line in list_file if line.strip()]
+    # if the file doesn't exist or can't be read
+    except IOError as err:
+        exit(err)
+
+
+def load_pair_list(fname: str) -> List[Tuple[str, str]]:
+    """ Load pairs of protein family names or latent space filenames
+
+    Parameters
+    ----------
+    fname : str
+        Name of a tab-separated file with one pair per line. Blank lines and lines starting with # are skipped
+
+    Returns
+    -------
+    List[Tuple[str, str]]
+        Pairs of names
+    """
+    pairs: List[Tuple[str, str]] = []
+    try:
+        pair_file: TextIO
+        with open(fname, "r") as pair_file:
+            line: str
+            for line in pair_file:
+                line = line.strip()
+                if not line or line[0] == '#':
+                    continue
+                fields: List[str] = line.split('\t') if '\t' in line else line.split()
+                if len(fields) != 2:
+                    print("Invalid line in " + fname + ": " + line)
+                    print("Each line should contain two names separated by a tab.")
+                    exit(2)
+                pairs.append((fields[0].strip(), fields[1].strip()))
+    # if the file doesn't exist or can't be read
+    except IOError as err:
+        exit(err)
+    return pairs
+
+
 def get_ls_list() -> List[str]:
     """
 
@@ -90,10 +146,8 @@ def get_ls_list() -> List[str]:
     List[str]
         List of protein family filenames
     """
-    ls_list: List[str] = []
-    for f in lspath.iterdir():
-        ls_list.append(f.name)
-    return ls_list
+    from .family_catalog import get_catalog
+    return [name + '.txt' for name in get_catalog().latent_names()]
 
 
 def is_pf(fname: str) -> bool:
@@ -108,9 +162,15 @@ def is_pf(fname: str) -> bool:
     -------
     bool
     """
-    if (lspath / (fname + '.txt')).is_file():
-        return True
-    return False
-
-
-latent_space_list: List[str] = get_ls_list()
+    from .family_catalog import FamilyCatalog, get_catalog
+    catalog: FamilyCatalog = get_catalog()
+    return fname in catalog and bool(catalog.has_latent[catalog.index[fname]])
+
+
+def __getattr__(name: str):
+    # latent_space_list is only built from the family catalog when it is first used
+    if name == 'latent_space_list':
+        global latent_space_list
+        latent_space_list = get_ls_list()
+        return latent_space_list
+    raise AttributeError("module " + __name__ + " has no attribute " + name)
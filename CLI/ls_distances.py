@@ -0,0 +1,235 @@
+import argparse
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from .get_metric import Metric, cdist_metrics
+from .ls_store import LSStore
+
+distances_dirname: str = 'Latent_spaces_distances'
+
+# the condensed matrix grows with the square of the number of families
+max_families: int = 20000
+
+# rows of the full matrix computed at once for the metrics scipy's pdist can't compute
+block_rows: int = 256
+
+# scipy's formula rounds differently when the two latent spaces are swapped,
+# so the matrix, which holds each pair in store order, only answers in that order
+ordered_metrics: List[str] = ['dice']
+
+# matrices opened by this process, by file name
+_matrices: Dict[str, np.ndarray] = {}
+
+
+def matrix_filename(store: LSStore, metric_name: str, p_norm: int) -> str:
+    """ Name of the file holding the distances of one metric, keyed by the content hash of the store
+
+    Parameters
+    ----------
+    store : LSStore
+        Latent space store
+    metric_name : str
+        Name of distance function
+    p_norm : int
+        The p-norm to apply for Minkowski
+
+    Returns
+    -------
+    str
+    """
+    metric_key: str = metric_name + '_p' + str(p_norm) if metric_name == 'minkowski' else metric_name
+    if metric_name not in cdist_metrics:
+        # computed with the NumPy kernels, which don't cast the latent spaces to bool like recent scipy versions
+        metric_key += '_np'
+    return metric_key + '_' + store.digest + '.npy'
+
+
+def condensed_index(n: int, i: int, j: int) -> int:
+    """ Position of the distance between families i and j in a condensed distance matrix
+
+    Parameters
+    ----------
+    n : int
+        Number of families
+    i : int
+        Index of first family
+    j : int
+        Index of second family, different from i
+
+    Returns
+    -------
+    int
+    """
+    if i > j:
+        i, j = j, i
+    return n * i - i * (i + 1) // 2 + j - i - 1
+
+
+def build_distance_matrix(store: LSStore, metric: Metric, p_norm: int) -> np.ndarray:
+    """ Distances between all pairs of protein families, as a condensed matrix like scipy's pdist
+
+    Parameters
+    ----------
+    store : LSStore
+        Latent space store
+    metric : Metric
+        Distance function
+    p_norm : int
+        The p-norm to apply for Minkowski
+
+    Returns
+    -------
+    numpy.ndarray
+    """
+    vectors: np.ndarray = np.asarray(store.vectors)
+    if metric.__name__ in cdist_metrics:
+        from scipy.spatial import distance
+        if metric.__name__ == 'minkowski':
+            return distance.pdist(vectors, 'minkowski', p=p_norm)
+        return distance.pdist(vectors, metric.__name__)
+    # the other metrics are computed with NumPy, a block of rows at a time
+    n: int = len(vectors)
+    condensed: List[np.ndarray] = []
+    start: int
+    for start in range(0, n, block_rows):
+        block: np.ndarray = metric.exact_distances(vectors[start:start + block_rows], vectors[start:], p_norm)
+        i: int
+        for i in range(len(block)):
+            condensed.append(block[i, i + 1:])
+    return np.concatenate(condensed) if condensed else np.empty(0)
+
+
+def get_distance_matrix(store: LSStore, metric: Metric, p_norm: int) -> Optional[np.ndarray]:
+    """ Load the saved distance matrix for a metric, built by build_and_save
+
+    Parameters
+    ----------
+    store : LSStore
+        Latent space store
+    metric : Metric
+        Distance function
+    p_norm : int
+        The p-norm to apply for Minkowski
+
+    Returns
+    -------
+    numpy.ndarray
+        Memory-mapped condensed distance matrix, None if it wasn't built for this metric and store
+    """
+    fname: str = matrix_filename(store, metric.__name__, p_norm)
+    if fname in _matrices:
+        return _matrices[fname]
+    if store.directory is None or not (store.directory / distances_dirname / fname).exists():
+        return None
+    _matrices[fname] = np.load(str(store.directory / distances_dirname / fname), mmap_mode='r')
+    return _matrices[fname]
+
+
+def build_and_save(store: LSStore, metric: Metric, p_norm: int) -> Path:
+    """ Compute the distance matrix for a metric and save it next to the store
+
+    Parameters
+    ----------
+    store : LSStore
+        Latent space store
+    metric : Metric
+        Distance function
+    p_norm : int
+        The p-norm to apply for Minkowski
+
+    Returns
+    -------
+    pathlib.Path
+        The saved matrix
+    """
+    fname: str = matrix_filename(store, metric.__name__, p_norm)
+    matrix: np.ndarray = build_distance_matrix(store, metric, p_norm)
+    save_distance_matrix(matrix, store.directory / distances_dirname, fname)
+    _matrices.pop(fname, None)
+    return store.directory / distances_dirname / fname
+
+
+def save_distance_matrix(matrix: np.ndarray, directory: Path, fname: str):
+    """ Save a distance matrix and remove the ones built from older versions of the store
+
+    Parameters
+    ----------
+    matrix : numpy.ndarray
+        Condensed distance matrix
+    directory : pathlib.Path
+        Directory holding the distance matrices
+    fname : str
+        Filename
+    """
+    metric_key: str = fname.rsplit('_', 1)[0]
+    tmp_file: Path = directory / ('.' + str(os.getpid()) + '.' + fname)
+    try:
+        directory.mkdir(exist_ok=True)
+        np.save(str(tmp_file), matrix)
+        os.replace(str(tmp_file), str(directory / fname))
+        old: Path
+        for old in directory.glob(metric_key + '_*.npy'):
+            if old.name != fname and old.name.rsplit('_', 1)[0] == metric_key:
+                old.unlink()
+    except OSError as err:
+        exit("Can't save the distance matrix to " + str(directory) + ": " + str(err))
+
+
+def family_distance(store: LSStore, a: str, b: str, metric: Metric, p_norm: int) -> Optional[np.double]:
+    """ Look up the distance between two known protein families
+
+    Parameters
+    ----------
+    store : LSStore
+        Latent space store
+    a : str
+        Name of first protein family
+    b : str
+        Name of second protein family
+    metric : Metric
+        Distance function
+    p_norm : int
+        The p-norm to apply for Minkowski
+
+    Returns
+    -------
+    numpy.double
+        None if the distance isn't in a saved matrix, then it is computed from the latent spaces
+    """
+    if a not in store or b not in store or a == b or len(store) > max_families:
+        return None
+    matrix: Optional[np.ndarray] = get_distance_matrix(store, metric, p_norm)
+    i: int = store.index[a]
+    j: int = store.index[b]
+    if matrix is None or (i > j and metric.__name__ in ordered_metrics):
+        return None
+    return matrix[condensed_index(len(store), i, j)]
+
+
+def main(argv: List[str] = None):
+    """
+
+    Parameters
+    ----------
+    argv : List[str]
+        Command line arguments. Default: sys.argv
+    """
+    from . import dist_opt_parser
+    from .get_metric import get_distance_function
+    from .ls_store import get_store
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description='Compute the distances between every pair of protein families for a metric, which compare then reads instead of '
+                    'computing them.', parents=[dist_opt_parser])
+    args: argparse.Namespace = parser.parse_args(argv)
+    store: LSStore = get_store()
+    if len(store) > max_families:
+        exit(str(len(store)) + " protein families, distance matrices are only built for up to " + str(max_families))
+    if store.directory is None:
+        exit("The latent space store is only held in memory, there is nowhere to save the distance matrix")
+    path: Path = build_and_save(store, get_distance_function(args.distance_metric), args.p_norm)
+    print(str(len(store)) + " protein families, distance matrix written to " + str(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import List, Dict, Optional, TextIO
+import numpy as np
+from .load_files import pkg, lspath
+
+store_filename: str = 'Latent_spaces.npy'
+names_filename: str = 'Latent_spaces_names.txt'
+
+# a change within the same clock tick leaves a directory's mtime as it was, so mtimes this recent aren't trusted yet
+racy_ns: int = 2 * 10 ** 9
+racy: str = 'racy'
+
+# used when the package directory can't be written to
+cache_path: Path = Path.home() / '.cache' / 'compbiolab-CLI'
+
+# the store opened by this process, shared by every search and comparison
+_store: Optional['LSStore'] = None
+
+
+class LSStore:
+    names: List[str]
+    vectors: np.ndarray
+    index: Dict[str, int]
+    digest: str
+    directory: Optional[Path]
+    prepared: Dict[str, tuple]
+
+    def __init__(self, names: List[str], vectors: np.ndarray, digest: str = None, directory: Path = None):
+        """
+
+        Parameters
+        ----------
+        names : List[str]
+            Names of the protein families
+        vectors : numpy.ndarray
+            Latent space data, one row per protein family
+        digest : str
+            Content hash of the names and data, computed if not given
+        directory : pathlib.Path
+            Directory holding the packed store, None if the store is only held in memory
+        """
+        self.names = names
+        self.vectors = vectors
+        self.index = {name: i for i, name in enumerate(names)}
+        self.digest = digest if digest is not None else content_digest(names, vectors)
+        self.directory = directory
+        # per-metric data computed from the vectors by the search, e.g. norms
+        self.prepared = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def get(self, name: str) -> np.ndarray:
+        """ Get the latent space data of a protein family
+
+        Parameters
+        ----------
+        name : str
+            Name of protein family
+
+        Returns
+        -------
+        numpy.ndarray
+            The family's latent space data
+        """
+        return self.vectors[self.index[name]]
+
+
+def content_digest(names: List[str], vectors: np.ndarray) -> str:
+    """ Hash of the family names and latent space data, used to key files derived from the store
+
+    Parameters
+    ----------
+    names : List[str]
+        Names of the protein families
+    vectors : numpy.ndarray
+        Latent space data, one row per protein family
+
+    Returns
+    -------
+    str
+    """
+    h = hashlib.sha1('\n'.join(names).encode())
+    h.update(str(vectors.shape).encode())
+    h.update(np.ascontiguousarray(vectors, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def store_dir() -> Path:
+    """ Directory holding the packed store
+
+    Returns
+    -------
+    pathlib.Path
+        The package directory if it is writable, otherwise the user cache directory
+    """
+    pkg_dir: Path = Path(str(pkg))
+    if (pkg_dir / store_filename).exists() or os.access(str(pkg_dir), os.W_OK):
+        return pkg_dir
+    return cache_path
+
+
+def directory_signature() -> str:
+    """
+
+    Returns
+    -------
+    str
+        Modification time of Latent_spaces/, which changes when a family is added or removed, or a file is replaced.
+        'racy' if it is too recent to tell later changes apart
+    """
+    mtime: int = os.stat(str(lspath)).st_mtime_ns
+    return str(mtime) if time.time_ns() - mtime > racy_ns else racy
+
+
+def source_signature(directory: Path = None) -> str:
+    """ Hash of the name, size and modification time of every latent space file in Latent_spaces/
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        Directory of latent space files. Default: Latent_spaces/
+
+    Returns
+    -------
+    str
+        Changes when a family is added, removed or edited, even if the directory's own mtime doesn't
+    """
+    if directory is None:
+        directory = lspath
+    h = hashlib.sha1()
+    entry: os.DirEntry
+    for entry in sorted((entry for entry in os.scandir(str(directory)) if entry.name.endswith('.txt')), key=lambda entry: entry.name):
+        stat: os.stat_result = entry.stat()
+        h.update((entry.name + ' ' + str(stat.st_size) + ' ' + str(stat.st_mtime_ns) + '\n').encode())
+    return h.hexdigest()
+
+
+def read_header(directory: Path) -> List[str]:
+    """
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        Directory holding the packed store
+
+    Returns
+    -------
+    List[str]
+        Content hash of the store, and directory and file signatures of the latent space files it was built from
+    """
+    inf: TextIO
+    with open(directory / names_filename, 'r') as inf:
+        header: List[str] = inf.readline().split()
+    if len(header) != 4 or header[0] != '#':
+        raise ValueError("Corrupt latent space store in " + str(directory))
+    return header[1:]
+
+
+def write_names(directory: Path, header: List[str], names: List[str]):
+    """ Write the name table of a store to a temporary file and move it into place
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        Directory holding the packed store
+    header : List[str]
+        Content hash of the store, and directory and file signatures of the latent space files
+    names : List[str]
+        Names of the protein families
+    """
+    tmp: Path = directory / (names_filename + '.' + str(os.getpid()))
+    outf: TextIO
+    with open(tmp, 'w') as outf:
+        outf.write('# ' + ' '.join(header) + '\n' + '\n'.join(names) + '\n')
+    os.replace(str(tmp), str(directory / names_filename))
+
+
+def is_stale(directory: Path) -> bool:
+    """ Check if the packed store is missing or was built from other latent space files than those in Latent_spaces/
+
+    Only the directory's mtime is checked while it is unchanged, every file is checked when it changed. Editing a file
+    in place leaves the directory's mtime as it was: replace it, or touch the directory
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        Directory holding the packed store
+
+    Returns
+    -------
+    bool
+    """
+    if not (directory / store_filename).exists() or not (directory / names_filename).exists():
+        return True
+    header: List[str] = read_header(directory)
+    if header[1] != racy and header[1] == directory_signature():
+        return False
+    return header[2] != source_signature()
+
+
+def read_latent_spaces() -> LSStore:
+    """ Read every latent space text file in Latent_spaces/
+
+    Returns
+    -------
+    LSStore
+        Store held in memory, sorted by family name
+    """
+    names: List[str] = []
+    rows: List[np.ndarray] = []
+    fname: str
+    for fname in sorted(f.name for f in lspath.iterdir() if f.name.endswith('.txt')):
+        row: np.ndarray = np.loadtxt(lspath / fname, ndmin=1)
+        if rows and row.shape != rows[0].shape:
+            raise ValueError("Invalid latent space file: " + fname)
+        names.append(fname[:-4])
+        rows.append(row)
+    return LSStore(names, np.stack(rows))
+
+
+def build_store(directory: Path) -> LSStore:
+    """ Pack the latent space text files into a single binary matrix
+
+    The matrix and the name table are written to temporary files first and moved into place,
+    so other processes never see a partially written store
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        Directory to write the packed store to
+
+    Returns
+    -------
+    LSStore
+    """
+    # taken first, so a file edited while the store is built makes it stale
+    signatures: List[str] = [directory_signature(), source_signature()]
+    store: LSStore = read_latent_spaces()
+
+    directory.mkdir(parents=True, exist_ok=True)
+    # np.save appends '.npy' to names that don't already end with it
+    tmp_store: Path = directory / (store_filename + '.' + str(os.getpid()) + '.npy')
+    np.save(str(tmp_store), store.vectors)
+    # the first line holds the content hash and the signatures of the latent space files
+    write_names(directory, [store.digest] + signatures, store.names)
+    os.replace(str(tmp_store), str(directory / store_filename))
+    return open_store(directory)
+
+
+def open_store(directory: Path) -> LSStore:
+    """ Memory-map a packed store
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        Directory holding the packed store
+
+    Returns
+    -------
+    LSStore
+    """
+    inf: TextIO
+    with open(directory / names_filename, 'r') as inf:
+        header: List[str] = inf.readline().split()
+        names: List[str] = inf.read().split()
+    vectors: np.ndarray = np.load(str(directory / store_filename), mmap_mode='r')
+    if len(header) != 4 or header[0] != '#' or len(names) != vectors.shape[0]:
+        raise ValueError("Corrupt latent space store in " + str(directory))
+    return LSStore(names, vectors, header[1], directory)
+
+
+def get_store() -> LSStore:
+    """ Get the packed latent space store, building it on first use
+
+    Returns
+    -------
+    LSStore
+    """
+    global _store
+    if _store is None:
+        directory: Path = store_dir()
+        try:
+            _store = None if is_stale(directory) else open_store(directory)
+            if _store is not None and read_header(directory)[1] != directory_signature():
+                # the files are unchanged, record the new mtime so the next process doesn't check them again
+                write_names(directory, [_store.digest, directory_signature(), source_signature()], _store.names)
+        except OSError:
+            # can't write the name table, the files are checked again by the next process
+            pass
+        except ValueError:
+            # corrupt, or another process is replacing it
+            _store = None
+        if _store is None:
+            try:
+                _store = build_store(directory)
+            except OSError:
+                # nowhere to write the store, so keep it in memory for this process
+                _store = read_latent_spaces()
+    return _store
@@ -0,0 +1,400 @@
+from typing import Callable, Dict, Optional, Tuple
+import numpy as np
+
+# Row-wise NumPy versions of the scipy.spatial.distance functions offered by the CLI.
+# Each kernel takes two arrays whose last axis holds the latent space data and broadcasts over the other axes,
+# so it computes many pairs, or one latent space against many, in one call.
+# They follow the formulas of scipy 1.4 (the version in compbiolab-cli.yml) for real-valued input:
+# the boolean metrics use 1 - u as "not u" instead of casting to bool, like the scalar functions do.
+
+
+def _nbool_correspond_all(u: np.ndarray, v: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    not_u: np.ndarray = 1.0 - u
+    not_v: np.ndarray = 1.0 - v
+    nff: np.ndarray = (not_u * not_v).sum(-1)
+    nft: np.ndarray = (not_u * v).sum(-1)
+    ntf: np.ndarray = (u * not_v).sum(-1)
+    ntt: np.ndarray = (u * v).sum(-1)
+    return nff, nft, ntf, ntt
+
+
+def _correlation(u: np.ndarray, v: np.ndarray, centered: bool = True) -> np.ndarray:
+    if centered:
+        u = u - u.mean(-1, keepdims=True)
+        v = v - v.mean(-1, keepdims=True)
+    uv: np.ndarray = (u * v).mean(-1)
+    uu: np.ndarray = np.square(u).mean(-1)
+    vv: np.ndarray = np.square(v).mean(-1)
+    return 1.0 - uv / np.sqrt(uu * vv)
+
+
+def euclidean(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    return np.sqrt(np.square(u - v).sum(-1))
+
+
+def minkowski(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    if p_norm < 1:
+        raise ValueError("p must be at least 1")
+    return (np.abs(u - v) ** p_norm).sum(-1) ** (1.0 / p_norm)
+
+
+def cityblock(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    return np.abs(u - v).sum(-1)
+
+
+def sqeuclidean(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    return np.square(u - v).sum(-1)
+
+
+def cosine(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    return np.clip(_correlation(u, v, centered=False), 0.0, 2.0)
+
+
+def correlation(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    return _correlation(u, v)
+
+
+def hamming(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    return (u != v).mean(-1)
+
+
+def jaccard(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    nonzero: np.ndarray = (u != 0) | (v != 0)
+    a: np.ndarray = ((u != v) & nonzero).sum(-1).astype(np.float64)
+    b: np.ndarray = nonzero.sum(-1).astype(np.float64)
+    return np.where(b != 0, a / np.where(b != 0, b, 1), 0.0)
+
+
+def chebyshev(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    return np.abs(u - v).max(-1)
+
+
+def canberra(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    return np.nansum(np.abs(u - v) / (np.abs(u) + np.abs(v)), axis=-1)
+
+
+def braycurtis(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    return np.abs(u - v).sum(-1) / np.abs(u + v).sum(-1)
+
+
+def yule(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    nff, nft, ntf, ntt = _nbool_correspond_all(u, v)
+    return 2.0 * ntf * nft / (ntt * nff + ntf * nft)
+
+
+def dice(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    nff, nft, ntf, ntt = _nbool_correspond_all(u, v)
+    return (ntf + nft) / (2.0 * ntt + ntf + nft)
+
+
+def kulsinski(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    n: int = u.shape[-1]
+    nff, nft, ntf, ntt = _nbool_correspond_all(u, v)
+    return (ntf + nft - ntt + n) / (ntf + nft + n)
+
+
+def rogerstanimoto(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    nff, nft, ntf, ntt = _nbool_correspond_all(u, v)
+    r: np.ndarray = 2.0 * (ntf + nft)
+    return r / (ntt + nff + r)
+
+
+def russellrao(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    n: int = u.shape[-1]
+    return (n - (u * v).sum(-1)) / float(n)
+
+
+def sokalmichener(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    nff, nft, ntf, ntt = _nbool_correspond_all(u, v)
+    r: np.ndarray = 2.0 * (ntf + nft)
+    return r / (ntt + nff + r)
+
+
+def sokalsneath(u: np.ndarray, v: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    nff, nft, ntf, ntt = _nbool_correspond_all(u, v)
+    r: np.ndarray = 2.0 * (ntf + nft)
+    return r / (ntt + r)
+
+
+paired_kernels: Dict[str, Callable] = {
+    'euclidean': euclidean, 'minkowski': minkowski, 'cityblock': cityblock, 'sqeuclidean': sqeuclidean,
+    'cosine': cosine, 'correlation': correlation, 'hamming': hamming, 'jaccard': jaccard,
+    'chebyshev': chebyshev, 'canberra': canberra, 'braycurtis': braycurtis, 'yule': yule, 'dice': dice,
+    'kulsinski': kulsinski, 'rogerstanimoto': rogerstanimoto, 'russellrao': russellrao,
+    'sokalmichener': sokalmichener, 'sokalsneath': sokalsneath}
+
+
+def paired_distances(u: np.ndarray, v: np.ndarray, metric_name: str, p_norm: int = 2) -> np.ndarray:
+    """ Distance between each row of u and the same row of v
+
+    Parameters
+    ----------
+    u : numpy.ndarray
+        Latent space data, one row per pair
+    v : numpy.ndarray
+        Latent space data, one row per pair
+    metric_name : str
+        Name of distance function
+    p_norm : int
+        The p-norm to apply for Minkowski
+
+    Returns
+    -------
+    numpy.ndarray
+        One distance per pair
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return paired_kernels[metric_name](np.asarray(u, dtype=np.float64), np.asarray(v, dtype=np.float64), p_norm)
+
+
+# One-vs-many kernels: every query (Q x d) against every row (N x d), returning a Q x N matrix.
+# The rows are usually the latent space store, so whatever depends only on them (norms, centered rows, row sums)
+# is computed once by a prepare function and passed back in on every call.
+
+# bounds the Q x N x d temporaries of the metrics computed by broadcasting the row-wise kernels
+block_elements: int = 1 << 22
+
+
+def prepare_rows(rows: np.ndarray) -> Tuple[np.ndarray]:
+    return np.asarray(rows, dtype=np.float64),
+
+
+def prepare_norms(rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    rows = np.asarray(rows, dtype=np.float64)
+    return rows, np.einsum('ij,ij->i', rows, rows)
+
+
+def prepare_centered(rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    rows = np.asarray(rows, dtype=np.float64)
+    return prepare_norms(rows - rows.mean(-1, keepdims=True))
+
+
+def prepare_sums(rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # the absolute sums and norms bound the rounding error of the counts, see boolean_error
+    rows = np.asarray(rows, dtype=np.float64)
+    return rows, rows.sum(-1), np.abs(rows).sum(-1), np.sqrt(np.einsum('ij,ij->i', rows, rows))
+
+
+def broadcast_distances(kernel: Callable, queries: np.ndarray, rows: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    """ Apply a row-wise kernel to every query and row, a block of queries at a time
+
+    Parameters
+    ----------
+    kernel : function
+        Row-wise kernel
+    queries : numpy.ndarray
+        Latent space data, one row per query
+    rows : numpy.ndarray
+        Latent space data, one row per protein family
+    p_norm : int
+        The p-norm to apply for Minkowski
+
+    Returns
+    -------
+    numpy.ndarray
+        Q x N matrix of distances
+    """
+    block: int = max(1, block_elements // max(1, rows.size))
+    out: np.ndarray = np.empty((len(queries), len(rows)))
+    start: int
+    for start in range(0, len(queries), block):
+        out[start:start + block] = kernel(queries[start:start + block, None, :], rows[None, :, :], p_norm)
+    return out
+
+
+def _sqeuclidean_many(queries: np.ndarray, rows: np.ndarray, sq_norms: np.ndarray) -> np.ndarray:
+    # |q - r|^2 = |q|^2 + |r|^2 - 2 q.r, one matrix product instead of Q x N x d differences.
+    # The Q x N matrix is large, so it is updated in place
+    d: np.ndarray = queries @ (-2.0 * rows.T)
+    d += np.einsum('ij,ij->i', queries, queries)[:, None]
+    d += sq_norms[None, :]
+    return np.maximum(d, 0.0, out=d)
+
+
+def euclidean_many(queries: np.ndarray, data: tuple, p_norm: int = 2) -> np.ndarray:
+    d: np.ndarray = _sqeuclidean_many(queries, *data)
+    return np.sqrt(d, out=d)
+
+
+def minkowski_many(queries: np.ndarray, data: tuple, p_norm: int = 2) -> np.ndarray:
+    if p_norm == 2:
+        return euclidean_many(queries, data)
+    return broadcast_distances(minkowski, queries, data[0], p_norm)
+
+
+def sqeuclidean_many(queries: np.ndarray, data: tuple, p_norm: int = 2) -> np.ndarray:
+    return _sqeuclidean_many(queries, *data)
+
+
+def cosine_many(queries: np.ndarray, data: tuple, p_norm: int = 2) -> np.ndarray:
+    rows, sq_norms = data
+    uu: np.ndarray = np.einsum('ij,ij->i', queries, queries)
+    # scaling the rows first leaves one pass over the Q x N matrix
+    d: np.ndarray = (queries / -np.sqrt(uu)[:, None]) @ (rows / np.sqrt(sq_norms)[:, None]).T
+    d += 1.0
+    return np.clip(d, 0.0, 2.0, out=d)
+
+
+def correlation_many(queries: np.ndarray, data: tuple, p_norm: int = 2) -> np.ndarray:
+    rows, sq_norms = data
+    queries = queries - queries.mean(-1, keepdims=True)
+    uu: np.ndarray = np.einsum('ij,ij->i', queries, queries)
+    d: np.ndarray = (queries / -np.sqrt(uu)[:, None]) @ (rows / np.sqrt(sq_norms)[:, None]).T
+    d += 1.0
+    return d
+
+
+def _nbool_correspond_many(queries: np.ndarray, rows: np.ndarray, sums: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # the counts of _nbool_correspond_all, all derived from one matrix product and the row sums
+    n: int = queries.shape[-1]
+    ntt: np.ndarray = queries @ rows.T
+    su: np.ndarray = queries.sum(-1)[:, None]
+    sv: np.ndarray = sums[None, :]
+    return n - su - sv + ntt, sv - ntt, su - ntt, ntt
+
+
+def _count_scale(queries: np.ndarray, data: tuple) -> np.ndarray:
+    # |sum((1 - u) * (1 - v))| <= n + |u|_1 + |v|_1 + |u||v|, which bounds every count of _nbool_correspond_all
+    # and _nbool_correspond_many against every row, and the terms summed to compute them
+    rows, sums, abs_sums, norms = data
+    scale: np.ndarray = (np.sqrt(np.einsum('ij,ij->i', queries, queries)) * norms.max(initial=0.0) + np.abs(queries).sum(-1) +
+                         abs_sums.max(initial=0.0) + queries.shape[-1])
+    return scale[:, None]
+
+
+def _count_error(queries: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    # rounding error of the counts, computed either way
+    return 8.0 * (queries.shape[-1] + 2) * float(np.finfo(np.float64).eps) * scale
+
+
+def _recompute_ill_conditioned(dists: np.ndarray, den: np.ndarray, den_err: np.ndarray, kernel: Callable,
+                               queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    # A denominator close to its rounding error makes the distance ill-conditioned, and the matrix product's
+    # can be anything. Those few distances are computed with the row-wise kernel, like the scalar function does,
+    # so the others are within boolean_rtol * (2 + distance) of it: |den| - den_err >= 2 den_err / boolean_rtol
+    qi, ri = np.nonzero(np.abs(den) <= den_err * (1.0 + 2.0 / boolean_rtol))
+    if len(qi):
+        dists[qi, ri] = kernel(queries[qi], rows[ri])
+    return dists
+
+
+def yule_many(queries: np.ndarray, data: tuple, p_norm: int = 2) -> np.ndarray:
+    nff, nft, ntf, ntt = _nbool_correspond_many(queries, data[0], data[1])
+    scale: np.ndarray = _count_scale(queries, data)
+    e: np.ndarray = _count_error(queries, scale)
+    den: np.ndarray = ntt * nff + ntf * nft
+    # each of the four counts is at most scale
+    den_err: np.ndarray = (4.0 * scale + 2.0 * e) * e
+    return _recompute_ill_conditioned(2.0 * ntf * nft / den, den, den_err, yule, queries, data[0])
+
+
+def dice_many(queries: np.ndarray, data: tuple, p_norm: int = 2) -> np.ndarray:
+    nff, nft, ntf, ntt = _nbool_correspond_many(queries, data[0], data[1])
+    den: np.ndarray = 2.0 * ntt + ntf + nft
+    e: np.ndarray = _count_error(queries, _count_scale(queries, data))
+    return _recompute_ill_conditioned((ntf + nft) / den, den, 4.0 * e, dice, queries, data[0])
+
+
+def kulsinski_many(queries: np.ndarray, data: tuple, p_norm: int = 2) -> np.ndarray:
+    n: int = queries.shape[-1]
+    nff, nft, ntf, ntt = _nbool_correspond_many(queries, data[0], data[1])
+    den: np.ndarray = ntf + nft + n
+    e: np.ndarray = _count_error(queries, _count_scale(queries, data))
+    return _recompute_ill_conditioned((ntf + nft - ntt + n) / den, den, 2.0 * e, kulsinski, queries, data[0])
+
+
+def rogerstanimoto_many(queries: np.ndarray, data: tuple, p_norm: int = 2) -> np.ndarray:
+    nff, nft, ntf, ntt = _nbool_correspond_many(queries, data[0], data[1])
+    r: np.ndarray = 2.0 * (ntf + nft)
+    den: np.ndarray = ntt + nff + r
+    e: np.ndarray = _count_error(queries, _count_scale(queries, data))
+    return _recompute_ill_conditioned(r / den, den, 6.0 * e, rogerstanimoto, queries, data[0])
+
+
+def russellrao_many(queries: np.ndarray, data: tuple, p_norm: int = 2) -> np.ndarray:
+    n: int = queries.shape[-1]
+    return (n - queries @ data[0].T) / float(n)
+
+
+def sokalsneath_many(queries: np.ndarray, data: tuple, p_norm: int = 2) -> np.ndarray:
+    nff, nft, ntf, ntt = _nbool_correspond_many(queries, data[0], data[1])
+    r: np.ndarray = 2.0 * (ntf + nft)
+    den: np.ndarray = ntt + r
+    e: np.ndarray = _count_error(queries, _count_scale(queries, data))
+    return _recompute_ill_conditioned(r / den, den, 5.0 * e, sokalsneath, queries, data[0])
+
+
+def broadcast_many(kernel: Callable) -> Callable:
+    """ One-vs-many kernel that applies a row-wise kernel to blocks of queries
+
+    Parameters
+    ----------
+    kernel : function
+        Row-wise kernel
+
+    Returns
+    -------
+    function
+    """
+    def many(queries: np.ndarray, data: tuple, p_norm: int = 2) -> np.ndarray:
+        return broadcast_distances(kernel, queries, data[0], p_norm)
+    return many
+
+
+# Error bounds of the kernels that sum in a different order than the scalar functions, as arrays that broadcast
+# against the Q x N distances. Families within the bound of the closest ones are scored again with the exact distance.
+
+# relative error allowed for the boolean metrics, whose counts cancel when the latent spaces aren't 0 or 1.
+# Their kernels compute the distances whose denominator isn't well above its rounding error again with the row-wise kernels
+boolean_rtol: float = 1e-8
+
+
+def sqeuclidean_error(queries: np.ndarray, data: tuple, dists: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    """ Bound on the rounding error of the sqeuclidean expansion
+
+    The expansion cancels badly for families close to the query, which are the ones that matter in a search
+
+    Parameters
+    ----------
+    queries : numpy.ndarray
+        Latent space data, one row per query
+    data : tuple
+        Output of prepare_norms for the rows
+    dists : numpy.ndarray
+        Distances computed by the kernel
+    p_norm : int
+        The p-norm to apply for Minkowski
+
+    Returns
+    -------
+    numpy.ndarray
+        Absolute error bound of the distances, one per query
+    """
+    sq_norms: np.ndarray = data[1]
+    eps: float = float(np.finfo(np.float64).eps)
+    bound: np.ndarray = 8.0 * (queries.shape[-1] + 2) * eps * (np.einsum('ij,ij->i', queries, queries) + sq_norms.max(initial=0.0))
+    return bound[:, None]
+
+
+def euclidean_error(queries: np.ndarray, data: tuple, dists: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    # |sqrt(a) - sqrt(b)| <= sqrt(|a - b|)
+    return np.sqrt(sqeuclidean_error(queries, data, dists))
+
+
+def minkowski_error(queries: np.ndarray, data: tuple, dists: np.ndarray, p_norm: int = 2) -> Optional[np.ndarray]:
+    return euclidean_error(queries, data, dists) if p_norm == 2 else None
+
+
+def cosine_error(queries: np.ndarray, data: tuple, dists: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    # u.v / |u||v| is at most 1, so its error is bounded like a dot product of unit vectors
+    eps: float = float(np.finfo(np.float64).eps)
+    return np.full((len(queries), 1), 8.0 * (queries.shape[-1] + 2) * eps)
+
+
+def correlation_error(queries: np.ndarray, data: tuple, dists: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    return cosine_error(queries, data, dists)
+
+
+def boolean_error(queries: np.ndarray, data: tuple, dists: np.ndarray, p_norm: int = 2) -> np.ndarray:
+    # the numerators' errors are at most twice the denominators', see _recompute_ill_conditioned
+    return boolean_rtol * (2.0 + np.abs(dists))
@@ -0,0 +1,224 @@
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple, List, Dict, Any
+import numpy as np
+
+
+def weights_bytes(weights: List[np.ndarray]) -> int:
+    """ Memory held by the weights of a Keras model
+
+    Parameters
+    ----------
+    weights : List[numpy.ndarray]
+        Weights, as returned by keras.Model.get_weights
+
+    Returns
+    -------
+    int
+        Size of the weight arrays in bytes
+    """
+    return sum(w.nbytes for w in weights)
+
+
+class ModelCache:
+    """ Weights of the loaded trained networks, keyed by family name, shared by every sequence searched in this process
+
+    When either budget is exceeded the least recently used networks are dropped first. The most recently used network
+    is always kept, even if it is larger than max_bytes on its own
+    """
+    load: Callable[[str], List[np.ndarray]]
+    max_models: Optional[int]
+    max_bytes: Optional[int]
+    models: 'OrderedDict[str, Tuple[List[np.ndarray], int]]'
+    total_bytes: int
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(self, load: Callable[[str], List[np.ndarray]], max_models: int = None, max_bytes: int = None):
+        """
+
+        Parameters
+        ----------
+        load : function
+            Reads the weights of a family's network
+        max_models : int
+            Most models kept. Default: no limit
+        max_bytes : int
+            Most weight bytes kept. Default: no limit
+        """
+        self.load = load
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.models = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.models)
+
+    def __contains__(self, family: str) -> bool:
+        return family in self.models
+
+    def get(self, family: str) -> List[np.ndarray]:
+        """ Get the weights of a family's network, loading them if they aren't cached
+
+        Parameters
+        ----------
+        family : str
+            Name of protein family
+
+        Returns
+        -------
+        List[numpy.ndarray]
+        """
+        if family in self.models:
+            self.hits += 1
+            self.models.move_to_end(family)
+            return self.models[family][0]
+        self.misses += 1
+        weights: List[np.ndarray] = self.load(family)
+        size: int = weights_bytes(weights)
+        self.models[family] = (weights, size)
+        self.total_bytes += size
+        self.evict()
+        return weights
+
+    def set_budget(self, max_models: int = None, max_bytes: int = None):
+        """ Change the budgets, dropping models that no longer fit
+
+        Parameters
+        ----------
+        max_models : int
+            Most models kept. Default: no limit
+        max_bytes : int
+            Most weight bytes kept. Default: no limit
+        """
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.evict()
+
+    def evict(self):
+        """ Drop the least recently used models until both budgets are met
+
+        """
+        while len(self.models) > 1 and ((self.max_models is not None and len(self.models) > self.max_models) or
+                                        (self.max_bytes is not None and self.total_bytes > self.max_bytes)):
+            size: int
+            _, (_, size) = self.models.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        """ Drop every model, e.g. when the networks they were read from changed
+
+        """
+        self.models.clear()
+        self.total_bytes = 0
+
+    def stats(self) -> str:
+        """ Hit and miss counts since the process started
+
+        Returns
+        -------
+        str
+        """
+        lookups: int = self.hits + self.misses
+        return ('model cache: ' + str(self.hits) + ' hits, ' + str(self.misses) + ' misses' +
+                (' (' + format(100 * self.hits / lookups, '.1f') + '% hit rate)' if lookups else '') +
+                ', ' + str(self.evictions) + ' evictions, ' + str(len(self.models)) + ' models, ' +
+                format(self.total_bytes / 2 ** 20, '.1f') + ' MB')
+
+
+class SharedModels:
+    """ Keras models built once per distinct architecture, shared by every family with that architecture
+
+    The model of a family is the model of its architecture with the family's weights swapped in, so it is only valid
+    until a family with the same architecture is requested
+    """
+    build: Callable[[str], Any]
+    models: Dict[str, Any]
+    loaded: Dict[str, str]
+    families: set
+    swaps: int
+
+    def __init__(self, build: Callable[[str], Any]):
+        """
+
+        Parameters
+        ----------
+        build : function
+            Builds a model from its Keras JSON config
+        """
+        self.build = build
+        self.models = {}
+        # family whose weights each model holds
+        self.loaded = {}
+        self.families = set()
+        self.swaps = 0
+
+    def __len__(self) -> int:
+        return len(self.models)
+
+    def model(self, digest: str, model_json: str) -> Any:
+        """ Get the model of an architecture, building it the first time
+
+        Parameters
+        ----------
+        digest : str
+            Hash of the canonical Keras JSON config
+        model_json : str
+            Canonical Keras JSON config
+
+        Returns
+        -------
+        keras.Model
+            The model, holding the weights of whichever family used it last
+        """
+        if digest not in self.models:
+            self.models[digest] = self.build(model_json)
+        return self.models[digest]
+
+    def get(self, family: str, digest: str, model_json: str, weights: List[np.ndarray]) -> Any:
+        """ Get the model of a family
+
+        Parameters
+        ----------
+        family : str
+            Name of protein family
+        digest : str
+            Hash of the canonical Keras JSON config of the family's network
+        model_json : str
+            Canonical Keras JSON config of the family's network
+        weights : List[numpy.ndarray]
+            Weights of the family's network, set if the model holds another family's weights
+
+        Returns
+        -------
+        keras.Model
+        """
+        model: Any = self.model(digest, model_json)
+        self.families.add(family)
+        if self.loaded.get(digest) != family:
+            model.set_weights(weights)
+            self.loaded[digest] = family
+            self.swaps += 1
+        return model
+
+    def clear(self):
+        """ Forget which family's weights each model holds, e.g. when the networks they were read from changed
+
+        The models are kept, the next family of each architecture sets its weights
+        """
+        self.loaded.clear()
+
+    def stats(self) -> str:
+        """ Number of models built since the process started
+
+        Returns
+        -------
+        str
+        """
+        return ('architectures: ' + str(len(self.models)) + ' models built for ' + str(len(self.families)) +
+                ' families, ' + str(self.swaps) + ' weight swaps')
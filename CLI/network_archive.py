@@ -0,0 +1,386 @@
+import argparse
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Dict, Optional, BinaryIO, TextIO
+from zipfile import ZipFile, ZipInfo
+
+# set to read the archive from another URL or a local file, e.g. a test server
+url_env: str = 'COMPBIOLAB_NETWORKS_URL'
+# set to the SHA-256 of the archive to check it after it is downloaded
+sha256_env: str = 'COMPBIOLAB_NETWORKS_SHA256'
+
+# bytes hashed per read
+hash_chunk: int = 1 << 20
+
+# written next to the archive once it is checked: its SHA-256, size and modification time
+sha256_suffix: str = '.sha256'
+
+# the archive opened by this process
+_archive: Optional['NetworkArchive'] = None
+
+
+class NetworkArchive:
+    """ Trained networks read from the downloaded zip archive, one family at a time, without extracting the others
+
+    The CRC-32 of every member is checked by zipfile as it is read. Weights files are extracted to a cache directory
+    for Keras to load, and the least recently used ones are deleted when the cache is larger than max_bytes
+    """
+    path: Path
+    zf: ZipFile
+    members: Dict[str, ZipInfo]
+    cache_dir: Path
+    max_bytes: int
+    cached: 'OrderedDict[str, int]'
+    cached_bytes: int
+    lock: threading.Lock
+
+    def __init__(self, path: Path, cache_dir: Path, max_bytes: int):
+        """
+
+        Parameters
+        ----------
+        path : pathlib.Path
+            Zip archive
+        cache_dir : pathlib.Path
+            Directory of the extracted weights files
+        max_bytes : int
+            Most bytes of extracted files kept, 0 to delete each one once the next is extracted
+        """
+        self.path = path
+        self.zf = ZipFile(str(path))
+        # members by filename, wherever they are in the archive
+        self.members = {os.path.basename(info.filename): info for info in self.zf.infolist() if not info.is_dir()}
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.cached = OrderedDict()
+        self.cached_bytes = 0
+        self.lock = threading.Lock()
+        if cache_dir.is_dir():
+            # files extracted by earlier runs, oldest first
+            files: List[os.DirEntry] = sorted((entry for entry in os.scandir(str(cache_dir)) if entry.is_file() and entry.name in self.members),
+                                              key=lambda entry: entry.stat().st_mtime)
+            entry: os.DirEntry
+            for entry in files:
+                self.cached[entry.name] = entry.stat().st_size
+                self.cached_bytes += entry.stat().st_size
+
+    def __contains__(self, fname: str) -> bool:
+        return fname in self.members
+
+    def families(self) -> List[str]:
+        """
+
+        Returns
+        -------
+        List[str]
+            Sorted names of the families with a .json and a _weights.h5 file
+        """
+        return sorted(fname[:-5] for fname in self.members if fname.endswith('.json') and fname[:-5] + '_weights.h5' in self.members)
+
+    def read(self, fname: str) -> bytes:
+        """ Read a member without extracting it
+
+        Parameters
+        ----------
+        fname : str
+            Filename of the member
+
+        Returns
+        -------
+        bytes
+        """
+        with self.lock:
+            return self.zf.read(self.members[fname])
+
+    def extract(self, fname: str) -> Path:
+        """ Extract a member to the cache directory, unless it is already there
+
+        Parameters
+        ----------
+        fname : str
+            Filename of the member
+
+        Returns
+        -------
+        pathlib.Path
+            The extracted file, kept at least until the next member is extracted
+        """
+        target: Path = self.cache_dir / fname
+        with self.lock:
+            if target.exists():
+                # extracted earlier, maybe by another process
+                if fname not in self.cached:
+                    self.cached[fname] = self.members[fname].file_size
+                    self.cached_bytes += self.members[fname].file_size
+                self.cached.move_to_end(fname)
+                os.utime(str(target))
+                return target
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # written under another name first, so other processes never load a partial file
+            tmp: Path = self.cache_dir / (fname + '.' + str(os.getpid()))
+            src: BinaryIO
+            outf: BinaryIO
+            with self.zf.open(self.members[fname]) as src, open(tmp, 'wb') as outf:
+                shutil.copyfileobj(src, outf)
+            os.replace(str(tmp), str(target))
+            self.cached_bytes -= self.cached.pop(fname, 0)
+            self.cached[fname] = self.members[fname].file_size
+            self.cached_bytes += self.members[fname].file_size
+            self.evict()
+        return target
+
+    def evict(self):
+        """ Delete the least recently used extracted files until the cache fits in max_bytes
+
+        """
+        while len(self.cached) > 1 and self.cached_bytes > self.max_bytes:
+            fname: str
+            size: int
+            fname, size = self.cached.popitem(last=False)
+            self.cached_bytes -= size
+            try:
+                os.remove(str(self.cache_dir / fname))
+            except OSError:
+                # already deleted by another process
+                pass
+
+    def extract_all(self, directory: Path, jobs: int = 1, pbar: bool = True):
+        """ Extract every member, in parallel
+
+        The members are extracted to a temporary directory that is moved into place when they all are,
+        so an interrupted unpack is never taken for a complete one
+
+        Parameters
+        ----------
+        directory : pathlib.Path
+            Directory to extract to, the files already in it are kept
+        jobs : int
+            Number of threads, each with its own handle on the archive
+        pbar : bool
+            Show a progress bar
+        """
+        from tqdm import tqdm
+        tmp: Path = directory.parent / (directory.name + '.partial')
+        shutil.rmtree(str(tmp), ignore_errors=True)
+        handles: threading.local = threading.local()
+
+        def extract_member(info: ZipInfo):
+            if not hasattr(handles, 'zf'):
+                handles.zf = ZipFile(str(self.path))
+            src: BinaryIO
+            outf: BinaryIO
+            # by filename, like the members are read, wherever they are in the archive
+            with handles.zf.open(info) as src, open(tmp / os.path.basename(info.filename), 'wb') as outf:
+                shutil.copyfileobj(src, outf)
+
+        tmp.mkdir(parents=True)
+        infos: List[ZipInfo] = list(self.members.values())
+        executor: ThreadPoolExecutor
+        with ThreadPoolExecutor(jobs) as executor, tqdm(total=len(infos), desc='Extracting', leave=False, disable=not pbar) as bar:
+            for future in as_completed([executor.submit(extract_member, info) for info in infos]):
+                # raises the error of a member that couldn't be extracted
+                future.result()
+                bar.update()
+        if not directory.exists():
+            os.replace(str(tmp), str(directory))
+            return
+        entry: os.DirEntry
+        for entry in os.scandir(str(tmp)):
+            os.replace(entry.path, str(directory / entry.name))
+        tmp.rmdir()
+
+
+def file_sha256(path: Path) -> str:
+    """
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        File
+
+    Returns
+    -------
+    str
+        Hex SHA-256 of the file's contents
+    """
+    h = hashlib.sha256()
+    inf: BinaryIO
+    with open(path, 'rb') as inf:
+        chunk: bytes
+        for chunk in iter(lambda: inf.read(hash_chunk), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def sha256_matches(path: Path, expected: Optional[str]) -> bool:
+    """
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Zip archive
+    expected : str
+        Hex SHA-256, None to skip the check
+
+    Returns
+    -------
+    bool
+        True if the archive has the expected SHA-256 or there is none
+    """
+    return expected is None or file_sha256(path) == expected.lower()
+
+
+def record_sha256(path: Path, sha256: str = None):
+    """ Record the SHA-256 of a checked archive, so later runs only hash it again if it changed
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Zip archive
+    sha256 : str
+        Hex SHA-256 of the archive. Default: hash it
+    """
+    stat: os.stat_result = os.stat(str(path))
+    outf: TextIO
+    try:
+        with open(str(path) + sha256_suffix, 'w') as outf:
+            outf.write(' '.join([(sha256 or file_sha256(path)).lower(), str(stat.st_size), str(stat.st_mtime_ns)]) + '\n')
+    except OSError:
+        # next to an archive in a read-only directory, which is then hashed by every run
+        pass
+
+
+def archive_matches(path: Path, expected: Optional[str]) -> bool:
+    """ Check an archive against the expected SHA-256, and against the one recorded when it was first checked
+
+    The archive is only hashed if it has no record, or its size or modification time changed since
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Zip archive
+    expected : str
+        Hex SHA-256, None to only check the recorded one
+
+    Returns
+    -------
+    bool
+        False if the archive was truncated or replaced, or doesn't have the expected SHA-256
+    """
+    recorded: List[str] = []
+    inf: TextIO
+    try:
+        with open(str(path) + sha256_suffix) as inf:
+            recorded = inf.read().split()
+    except OSError:
+        pass
+    if len(recorded) != 3:
+        # not checked yet
+        if expected is None:
+            return True
+        if not sha256_matches(path, expected):
+            return False
+        record_sha256(path, expected)
+        return True
+    stat: os.stat_result = os.stat(str(path))
+    if expected is not None and recorded[0] != expected.lower():
+        return False
+    if recorded[1:] == [str(stat.st_size), str(stat.st_mtime_ns)]:
+        return True
+    if file_sha256(path) != recorded[0]:
+        return False
+    # only touched
+    record_sha256(path, recorded[0])
+    return True
+
+
+def source_url(default: str) -> str:
+    """
+
+    Parameters
+    ----------
+    default : str
+        URL of the published archive
+
+    Returns
+    -------
+    str
+        $COMPBIOLAB_NETWORKS_URL if it is set: an http(s) or file URL, or the path of a local archive. Otherwise default
+    """
+    return os.environ.get(url_env) or default
+
+
+def expected_sha256(default: Optional[str]) -> Optional[str]:
+    """
+
+    Parameters
+    ----------
+    default : str
+        SHA-256 of the published archive, None if it isn't checked
+
+    Returns
+    -------
+    str
+        $COMPBIOLAB_NETWORKS_SHA256 if it is set, otherwise default
+    """
+    return os.environ.get(sha256_env) or default
+
+
+def get_archive(path: Path, cache_dir: Path, max_bytes: int, sha256: str = None) -> NetworkArchive:
+    """ Get the archive, opening it on first use
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Zip archive
+    cache_dir : pathlib.Path
+        Directory of the extracted weights files
+    max_bytes : int
+        Most bytes of extracted files kept
+    sha256 : str
+        Hex SHA-256 the archive is checked against when it is opened. Default: only the SHA-256 recorded when it was downloaded
+
+    Returns
+    -------
+    NetworkArchive
+    """
+    global _archive
+    if _archive is None or _archive.path != path:
+        if not archive_matches(path, sha256):
+            exit(str(path) + " doesn't have the expected SHA-256, it was truncated or replaced. Delete it to download it again")
+        _archive = NetworkArchive(path, cache_dir, max_bytes)
+    return _archive
+
+
+def main(argv: List[str] = None):
+    """
+
+    Parameters
+    ----------
+    argv : List[str]
+        Command line arguments. Default: sys.argv
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Extract every trained network from the archive, '
+                                                                          'instead of reading them from it when they are first used, and pack them.')
+    parser.add_argument('-j', '--jobs', help="Number of extracting threads. Default: %(default)s", dest="jobs", type=int, default=os.cpu_count() or 1)
+    args: argparse.Namespace = parser.parse_args(argv)
+    from . import SearchSQ
+    from .network_store import NetworkStore, build_store
+    if SearchSQ.networks_extracted():
+        exit("The trained networks are already extracted to " + str(SearchSQ.networks_path))
+    SearchSQ.check_files()
+    archive: NetworkArchive = SearchSQ.open_archive()
+    archive.extract_all(SearchSQ.networks_path, max(1, args.jobs))
+    # the extracted files are read from now on
+    shutil.rmtree(str(SearchSQ.networks_cache_path), ignore_errors=True)
+    store: NetworkStore = build_store(SearchSQ.networks_path)
+    print(str(len(store)) + " networks extracted to " + str(SearchSQ.networks_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,553 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple, TextIO, BinaryIO
+import numpy as np
+from .ls_store import racy_ns, racy
+
+# written to a subdirectory, so its own files aren't part of the signature of the trained networks
+store_dirname: str = 'packed'
+index_filename: str = 'index.json'
+# the weights blob is named after its content hash, weights_<sha1>.bin, and the index names the blob it goes with
+weights_prefix: str = 'weights_'
+weights_suffix: str = '.bin'
+store_version: int = 2
+
+# every weight array starts at a multiple of this many bytes of the blob
+alignment: int = 64
+
+# offset in the blob, dtype and shape of a weight array
+WeightEntry = Tuple[int, str, List[int]]
+
+# the store opened by this process
+_store: Optional['NetworkStore'] = None
+_store_dir: Optional[Path] = None
+
+
+class NetworkStore:
+    """ Trained networks of every protein family packed into two files: a table of the distinct architectures and,
+    for each family, its architecture, input length and the offsets of its weights in one memory-mapped blob
+
+    """
+    architectures: List[str]
+    families: Dict[str, Tuple[int, int, List[WeightEntry]]]
+    blob: np.ndarray
+    directory: Optional[Path]
+    sources: str
+    directory_sources: str
+    weights_file: str
+
+    def __init__(self, architectures: List[str], families: Dict[str, Tuple[int, int, List[WeightEntry]]], blob: np.ndarray,
+                 directory: Path = None, sources: str = '', directory_sources: str = '', weights_file: str = ''):
+        """
+
+        Parameters
+        ----------
+        architectures : List[str]
+            Distinct Keras JSON configs
+        families : Dict[str, Tuple[int, int, List[Tuple[int, str, List[int]]]]]
+            Architecture id, input length and weight arrays of each protein family
+        blob : numpy.ndarray
+            uint8 weights blob
+        directory : pathlib.Path
+            Directory holding the store
+        sources : str
+            Signature of the network files the store was built from, see source_signature
+        directory_sources : str
+            Signature of the trained networks directory the store was built from, see directory_signature
+        weights_file : str
+            Name of the weights blob in the store's directory
+        """
+        self.architectures = architectures
+        self.families = families
+        self.blob = blob
+        self.directory = directory
+        self.sources = sources
+        self.directory_sources = directory_sources
+        self.weights_file = weights_file
+
+    def __len__(self) -> int:
+        return len(self.families)
+
+    def __contains__(self, family: str) -> bool:
+        return family in self.families
+
+    def architecture_id(self, family: str) -> int:
+        """
+
+        Parameters
+        ----------
+        family : str
+            Name of protein family
+
+        Returns
+        -------
+        int
+            Position of the family's Keras JSON config in architectures
+        """
+        return self.families[family][0]
+
+    def size(self, family: str) -> int:
+        """
+
+        Parameters
+        ----------
+        family : str
+            Name of protein family
+
+        Returns
+        -------
+        int
+            Length of the sequences the network reconstructs
+        """
+        return self.families[family][1]
+
+    def architecture(self, family: str) -> str:
+        """
+
+        Parameters
+        ----------
+        family : str
+            Name of protein family
+
+        Returns
+        -------
+        str
+            Keras JSON config of the family's network
+        """
+        return self.architectures[self.families[family][0]]
+
+    def weights(self, family: str) -> List[np.ndarray]:
+        """ Weights of a family's network, in the order of keras.Model.get_weights
+
+        Parameters
+        ----------
+        family : str
+            Name of protein family
+
+        Returns
+        -------
+        List[numpy.ndarray]
+            Read-only views of the memory-mapped blob
+        """
+        arrays: List[np.ndarray] = []
+        offset: int
+        dtype: str
+        shape: List[int]
+        for offset, dtype, shape in self.families[family][2]:
+            dt: np.dtype = np.dtype(dtype)
+            count: int = int(np.prod(shape))
+            arrays.append(self.blob[offset:offset + count * dt.itemsize].view(dt).reshape(shape))
+        return arrays
+
+
+def layer_names(config, names: Dict[str, str]):
+    """ Give every layer and model name of a Keras config a positional name, in the order they appear
+
+    Parameters
+    ----------
+    config
+        Part of a Keras config
+    names : Dict[str, str]
+        Positional name of each name found so far, updated
+    """
+    if isinstance(config, dict):
+        if 'class_name' in config and isinstance(config.get('config'), dict) and isinstance(config['config'].get('name'), str):
+            names.setdefault(config['config']['name'], 'layer_' + str(len(names)))
+        value: object
+        for value in config.values():
+            layer_names(value, names)
+    elif isinstance(config, list):
+        for value in config:
+            layer_names(value, names)
+
+
+def rename(config, names: Dict[str, str]):
+    """
+
+    Parameters
+    ----------
+    config
+        Part of a Keras config
+    names : Dict[str, str]
+        New name of each layer and model name
+
+    Returns
+    -------
+    dict
+        The config with every string that is a layer or model name replaced, e.g. in the inbound nodes
+    """
+    if isinstance(config, dict):
+        return {key: rename(value, names) for key, value in config.items()}
+    if isinstance(config, list):
+        return [rename(value, names) for value in config]
+    if isinstance(config, str):
+        return names.get(config, config)
+    return config
+
+
+def canonical_json(model_json: str) -> str:
+    """ Form of a Keras JSON config that is the same for every network with the same architecture
+
+    Keys are sorted, whitespace removed, and the layer names Keras numbers as it builds models (dense_1, dense_37, ...)
+    replaced by their position. The Keras version and backend the network was saved with are dropped
+
+    Parameters
+    ----------
+    model_json : str
+        Keras JSON config
+
+    Returns
+    -------
+    str
+    """
+    config: dict = json.loads(model_json)
+    config.pop('keras_version', None)
+    config.pop('backend', None)
+    names: Dict[str, str] = {}
+    layer_names(config, names)
+    return json.dumps(rename(config, names), sort_keys=True, separators=(',', ':'))
+
+
+def architecture_digest(model_json: str) -> str:
+    """
+
+    Parameters
+    ----------
+    model_json : str
+        Canonical Keras JSON config
+
+    Returns
+    -------
+    str
+        Hash of the config, the same for networks with the same architecture
+    """
+    return hashlib.sha1(model_json.encode()).hexdigest()
+
+
+def network_files(networks_dir: Path) -> List[str]:
+    """
+
+    Parameters
+    ----------
+    networks_dir : pathlib.Path
+        Directory with a <family>.json and <family>_weights.h5 file per protein family
+
+    Returns
+    -------
+    List[str]
+        Sorted names of the families with both files
+    """
+    names: set = set(os.listdir(str(networks_dir)))
+    return sorted(fname[:-5] for fname in names if fname.endswith('.json') and fname[:-5] + '_weights.h5' in names)
+
+
+def directory_signature(networks_dir: Path) -> str:
+    """
+
+    Parameters
+    ----------
+    networks_dir : pathlib.Path
+        Trained networks directory
+
+    Returns
+    -------
+    str
+        Modification time of the directory, which changes when a family is added or removed, or a file is replaced.
+        'racy' if it is too recent to tell later changes apart
+    """
+    mtime: int = os.stat(str(networks_dir)).st_mtime_ns
+    return str(mtime) if time.time_ns() - mtime > racy_ns else racy
+
+
+def source_signature(networks_dir: Path) -> str:
+    """ Hash of the name, size and modification time of every .json and _weights.h5 file of a trained networks directory
+
+    Parameters
+    ----------
+    networks_dir : pathlib.Path
+        Trained networks directory
+
+    Returns
+    -------
+    str
+        Changes when a family is added, removed or retrained, even if the directory's own mtime doesn't
+    """
+    h = hashlib.sha1()
+    entry: os.DirEntry
+    for entry in sorted((entry for entry in os.scandir(str(networks_dir)) if entry.name.endswith(('.json', '_weights.h5'))),
+                        key=lambda entry: entry.name):
+        stat: os.stat_result = entry.stat()
+        h.update((entry.name + ' ' + str(stat.st_size) + ' ' + str(stat.st_mtime_ns) + '\n').encode())
+    return h.hexdigest()
+
+
+def is_current(store: NetworkStore, networks_dir: Path) -> bool:
+    """ Check if a store was built from the network files in the trained networks directory
+
+    Only the directory's mtime is checked while it is unchanged, every file is checked when it changed. Weights saved
+    over an existing file leave the directory's mtime as it was: touch the directory, or pack the networks again
+
+    Parameters
+    ----------
+    store : NetworkStore
+    networks_dir : pathlib.Path
+        Trained networks directory
+
+    Returns
+    -------
+    bool
+    """
+    if store.directory_sources not in ('', racy) and store.directory_sources == directory_signature(networks_dir):
+        return True
+    return store.sources == source_signature(networks_dir)
+
+
+def is_stale(networks_dir: Path) -> bool:
+    """ Check if the store is missing or was built from other network files than those in the trained networks directory
+
+    Parameters
+    ----------
+    networks_dir : pathlib.Path
+        Trained networks directory
+
+    Returns
+    -------
+    bool
+    """
+    try:
+        return not is_current(open_store(networks_dir), networks_dir)
+    except (OSError, ValueError):
+        return True
+
+
+def write_index(directory: Path, index: dict):
+    """ Write the index of a store to a temporary file and move it into place
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        Directory holding the store
+    index : dict
+        Version, signatures, weights blob, architectures and families of the store
+    """
+    tmp: Path = directory / (index_filename + '.' + str(os.getpid()))
+    jout: TextIO
+    with open(tmp, 'w') as jout:
+        json.dump(index, jout)
+    os.replace(str(tmp), str(directory / index_filename))
+
+
+def build_store(networks_dir: Path, pbar: bool = True) -> NetworkStore:
+    """ Pack the .json and _weights.h5 files of every family into a store
+
+    A Keras model is built once per distinct architecture, and the weights of each family with that architecture
+    are loaded into it to read them in get_weights order. The blob and the index are written to temporary files
+    first and moved into place, so other processes never see a partial store. The blob is named after its content hash
+    and the index, replaced last, names it: a process that read the previous index still finds the blob its offsets
+    point into, or none, never the new one
+
+    Parameters
+    ----------
+    networks_dir : pathlib.Path
+        Directory with a <family>.json and <family>_weights.h5 file per protein family
+    pbar : bool
+        Show a progress bar
+
+    Returns
+    -------
+    NetworkStore
+    """
+    import keras
+    from tqdm import tqdm
+    from .model_cache import SharedModels
+    directory: Path = networks_dir / store_dirname
+    directory.mkdir(parents=True, exist_ok=True)
+    # taken before the files are read, so files changed while packing make the store stale
+    directory_sources: str = directory_signature(networks_dir)
+    sources: str = source_signature(networks_dir)
+    pid: str = '.' + str(os.getpid())
+    tmp_weights: Path = directory / ('weights' + weights_suffix + pid)
+
+    h = hashlib.sha1()
+    shared_models: SharedModels = SharedModels(keras.models.model_from_json)
+    architectures: List[str] = []
+    arch_ids: Dict[str, int] = {}
+    families: Dict[str, Tuple[int, int, List[WeightEntry]]] = {}
+    position: int = 0
+    outf: BinaryIO
+    with open(tmp_weights, 'wb') as outf:
+        family: str
+        for family in tqdm(network_files(networks_dir), desc='Packing networks', leave=False, disable=not pbar):
+            jfile: TextIO
+            with open(networks_dir / (family + '.json')) as jfile:
+                model_json: str = canonical_json(jfile.read())
+            digest: str = architecture_digest(model_json)
+            arch_id: int = arch_ids.setdefault(digest, len(architectures))
+            if arch_id == len(architectures):
+                architectures.append(model_json)
+            model: keras.Model = shared_models.model(digest, model_json)
+            model.load_weights(str(networks_dir / (family + '_weights.h5')))
+            entries: List[WeightEntry] = []
+            w: np.ndarray
+            for w in model.get_weights():
+                w = np.ascontiguousarray(w)
+                padding: int = -position % alignment
+                outf.write(b'\0' * padding)
+                h.update(b'\0' * padding)
+                position += padding
+                entries.append((position, w.dtype.str, list(w.shape)))
+                outf.write(w.tobytes())
+                h.update(w.tobytes())
+                position += w.nbytes
+            families[family] = (arch_id, int(model.input_shape[1]) // 21, entries)
+
+    weights_file: str = weights_prefix + h.hexdigest() + weights_suffix
+    os.replace(str(tmp_weights), str(directory / weights_file))
+    write_index(directory, {'version': store_version, 'sources': sources, 'directory': directory_sources,
+                            'weights': weights_file, 'architectures': architectures, 'families': families})
+    remove_old_blobs(directory, weights_file)
+    return open_store(networks_dir)
+
+
+def remove_old_blobs(directory: Path, weights_file: str):
+    """ Delete the weights blobs of earlier stores
+
+    Processes that have one memory-mapped keep reading it. Processes that read the earlier index but haven't opened
+    its blob yet fail to open the store, and read the networks from their own files
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        Directory holding the store
+    weights_file : str
+        Name of the blob of the current store, kept
+    """
+    fname: str
+    for fname in os.listdir(str(directory)):
+        if fname.startswith(weights_prefix) and fname.endswith(weights_suffix) and fname != weights_file:
+            try:
+                os.remove(str(directory / fname))
+            except OSError:
+                # still open on Windows, removed by the next build
+                pass
+
+
+def open_store(networks_dir: Path) -> NetworkStore:
+    """ Read the index and memory-map the weights blob of a store
+
+    Parameters
+    ----------
+    networks_dir : pathlib.Path
+        Trained networks directory
+
+    Returns
+    -------
+    NetworkStore
+    """
+    directory: Path = networks_dir / store_dirname
+    inf: TextIO
+    with open(directory / index_filename) as inf:
+        index: dict = json.load(inf)
+    if index.get('version') != store_version:
+        raise ValueError("Network store in " + str(directory) + " has an unknown version")
+    weights_file: str = index['weights']
+    families: Dict[str, Tuple[int, int, List[WeightEntry]]] = {
+        family: (arch_id, size, [(offset, dtype, shape) for offset, dtype, shape in entries])
+        for family, (arch_id, size, entries) in index['families'].items()}
+    blob: np.ndarray = (np.memmap(str(directory / weights_file), dtype=np.uint8, mode='r')
+                        if (directory / weights_file).stat().st_size else np.zeros(0, dtype=np.uint8))
+    return NetworkStore(index['architectures'], families, blob, directory, index.get('sources', ''), index.get('directory', ''),
+                        weights_file)
+
+
+def get_store(networks_dir: Path) -> Optional[NetworkStore]:
+    """ Get the network store of a trained networks directory, opening it on first use
+
+    Parameters
+    ----------
+    networks_dir : pathlib.Path
+        Trained networks directory
+
+    Returns
+    -------
+    NetworkStore
+        None if the directory has no up to date store, then the networks are read from their own files
+    """
+    global _store, _store_dir
+    if _store_dir != networks_dir:
+        _store_dir = networks_dir
+        try:
+            _store = open_store(networks_dir)
+            if not is_current(_store, networks_dir):
+                _store = None
+        except (OSError, ValueError):
+            # written by an older version, or another process is replacing it
+            _store = None
+        if _store is not None and _store.directory_sources != directory_signature(networks_dir):
+            try:
+                # the files are unchanged, record the new mtime so the next process doesn't check them again
+                write_index(_store.directory, {'version': store_version, 'sources': _store.sources,
+                                               'directory': directory_signature(networks_dir), 'weights': _store.weights_file,
+                                               'architectures': _store.architectures, 'families': _store.families})
+            except OSError:
+                # can't write the index, the files are checked again by the next process
+                pass
+    return _store
+
+
+def architecture_report(store: NetworkStore) -> str:
+    """ Number of families and their input lengths for each distinct architecture
+
+    Parameters
+    ----------
+    store : NetworkStore
+
+    Returns
+    -------
+    str
+    """
+    sizes: Dict[int, List[int]] = {}
+    arch_id: int
+    size: int
+    for arch_id, size, _ in store.families.values():
+        sizes.setdefault(arch_id, []).append(size)
+    lines: List[str] = [str(len(store)) + " networks, " + str(len(store.architectures)) + " distinct architectures"]
+    for arch_id, arch_sizes in sorted(sizes.items(), key=lambda item: -len(item[1])):
+        lines.append("architecture " + str(arch_id) + ": " + str(len(arch_sizes)) + " families, input length " +
+                     (str(min(arch_sizes)) if min(arch_sizes) == max(arch_sizes) else str(min(arch_sizes)) + "-" + str(max(arch_sizes))))
+    return '\n'.join(lines)
+
+
+def main(argv: List[str] = None):
+    """
+
+    Parameters
+    ----------
+    argv : List[str]
+        Command line arguments. Default: sys.argv
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Pack the trained networks into the store search seq reads them from.')
+    parser.add_argument('networks_dir', metavar="directory", nargs='?', default='Trained_networks',
+                        help="Directory with a <family>.json and <family>_weights.h5 file per protein family. Default: %(default)s", type=str)
+    parser.add_argument('--report', help="Show the distinct architectures of an existing store instead of packing the networks",
+                        dest="report", action='store_true')
+    args: argparse.Namespace = parser.parse_args(argv)
+    networks_dir: Path = Path(args.networks_dir)
+    if not networks_dir.is_dir():
+        exit("No trained networks in " + str(networks_dir))
+    if args.report:
+        if is_stale(networks_dir):
+            exit("No up to date network store in " + str(networks_dir / store_dirname))
+        print(architecture_report(open_store(networks_dir)))
+        return
+    store: NetworkStore = build_store(networks_dir)
+    print(str(len(store)) + " networks with " + str(len(store.architectures)) + " distinct architectures written to " +
+          str(networks_dir / store_dirname))
+
+
+if __name__ == "__main__":
+    main()
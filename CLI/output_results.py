@@ -1,14 +1,184 @@
-from typing import Union
-from . import CompareLSOutput, SearchLSOutput, SearchSQOutput
+import os
+import sys
+import time
+from typing import Union, List, Dict, Optional, TextIO, BinaryIO
+from . import CompareLSOutput, CompareLSMatrixOutput, CompareLSPairsOutput, SearchLSOutput, SearchSQOutput
 
+Result = Union[SearchLSOutput.SearchLSOutput, SearchSQOutput.SearchSQOutput, CompareLSOutput.CompareLSOutput,
+               CompareLSMatrixOutput.CompareLSMatrixOutput, CompareLSPairsOutput.CompareLSPairsOutput]
 
-def output_result(res: Union[
-    SearchLSOutput.SearchLSOutput, SearchSQOutput.SearchSQOutput, CompareLSOutput.CompareLSOutput], fname: str, form: str, mode: str):
+# formats stored as one column per field instead of one line per result
+binary_formats: List[str] = ['npz', 'hdf5']
+
+# name of the HDF5 dataset holding the results
+hdf5_dataset: str = 'results'
+
+
+class ResultWriter:
+    """ Writes every result of a run to stdout or to the output file, which is opened once
+
+    Lines of text, csv and jsonl are buffered and written in bulk, at least every flush_seconds so slow searches still
+    show their progress. npz and hdf5 store the results as columns: hdf5 appends each buffer to a record array,
+    npz is written when the writer is closed. Results on stdout are always text and written as they come
     """
+    fname: str
+    form: str
+    mode: str
+    buffer_size: int
+    flush_seconds: float
+    last_flush: float
+    lines: List[str]
+    records: List[dict]
+    columns: Dict[str, list]
+    outf: Optional[TextIO]
+    opened: bool
+
+    def __init__(self, fname: str, form: str, mode: str, buffer_size: int = 4096, flush_seconds: float = 1.0):
+        """
+
+        Parameters
+        ----------
+        fname : str
+            Output filename, stdout if empty
+        form : str
+            Output format
+        mode : str
+            Output mode
+        buffer_size : int
+            Number of lines or records kept before they are written
+        flush_seconds : float
+            Longest time results are kept before they are written
+        """
+        self.fname = fname
+        self.form = form if fname != "" else "text"
+        self.mode = mode
+        self.buffer_size = buffer_size
+        self.flush_seconds = flush_seconds
+        self.last_flush = time.monotonic()
+        self.lines = []
+        self.records = []
+        self.columns = {}
+        self.outf = None
+        self.opened = False
+
+    def __enter__(self) -> 'ResultWriter':
+        if self.fname != "" and self.mode == 'w':
+            # -om w replaces the file of an earlier run even if this run has no results
+            if self.form in binary_formats:
+                if os.path.exists(self.fname):
+                    os.remove(self.fname)
+            else:
+                self.outf = open(self.fname, 'w')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, res: Result):
+        """
+
+        Parameters
+        ----------
+        res : Union[SearchLSOutput.SearchLSOutput, SearchSQOutput.SearchSQOutput, CompareLSOutput.CompareLSOutput, CompareLSMatrixOutput.CompareLSMatrixOutput, CompareLSPairsOutput.CompareLSPairsOutput]
+            Result
+        """
+        if self.fname == "":
+            sys.stdout.write(''.join(line + '\n' for line in res.to_lines("text")))
+            return
+        if self.form in binary_formats:
+            self.records.extend(res.to_records())
+        else:
+            self.lines.extend(res.to_lines(self.form))
+        if len(self.records) + len(self.lines) >= self.buffer_size or time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """ Write the buffered results
+
+        """
+        self.last_flush = time.monotonic()
+        if self.form == "npz":
+            self.add_columns()
+        elif self.form == "hdf5":
+            self.write_hdf5()
+        elif self.lines:
+            if self.outf is None:
+                # opened when the writer is entered in w mode
+                self.outf = open(self.fname, self.mode)
+            self.outf.write(''.join(line + '\n' for line in self.lines))
+            self.outf.flush()
+            self.lines = []
+
+    def close(self):
+        """ Write the remaining results and close the output file
+
+        """
+        self.flush()
+        if self.form == "npz" and self.columns:
+            self.write_npz()
+        if self.outf is not None:
+            self.outf.close()
+            self.outf = None
+
+    def add_columns(self):
+        record: dict
+        for record in self.records:
+            if self.columns and record.keys() != self.columns.keys():
+                exit("Results with different fields can't be written to the same " + self.form + " file")
+            key: str
+            for key, value in record.items():
+                self.columns.setdefault(key, []).append(value)
+        self.records = []
+
+    def write_npz(self):
+        """ Save one array per field, after the arrays already in the file in append mode
+
+        """
+        import numpy as np
+        arrays: Dict[str, np.ndarray] = {key: np.array(values) for key, values in self.columns.items()}
+        if self.mode == 'a' and os.path.exists(self.fname):
+            with np.load(self.fname) as old:
+                if set(old.files) != set(arrays):
+                    exit(self.fname + " holds results with different fields")
+                arrays = {key: np.concatenate([old[key], arrays[key]]) for key in arrays}
+        outf: BinaryIO
+        # a file object keeps numpy from adding .npz to the name
+        with open(self.fname, 'wb') as outf:
+            np.savez(outf, **arrays)
+
+    def write_hdf5(self):
+        """ Append the buffered records to a resizable record array
+
+        """
+        if not self.records:
+            return
+        import h5py
+        import numpy as np
+        str_type = h5py.special_dtype(vlen=str)
+        fields: List[str] = list(self.records[0])
+        dtype: np.dtype = np.dtype([(key, str_type if isinstance(value, str) else np.float64 if isinstance(value, float) else np.int64)
+                                    for key, value in self.records[0].items()])
+        data: np.ndarray = np.array([tuple(record[key] for key in fields) for record in self.records], dtype=dtype)
+        h5: h5py.File
+        with h5py.File(self.fname, 'a' if self.opened or self.mode == 'a' else 'w') as h5:
+            if hdf5_dataset not in h5:
+                h5.create_dataset(hdf5_dataset, data=data, maxshape=(None,), chunks=True)
+            else:
+                dset = h5[hdf5_dataset]
+                if dset.dtype.names != dtype.names:
+                    exit(self.fname + " holds results with different fields")
+                dset.resize((len(dset) + len(data),))
+                dset[-len(data):] = data
+        self.opened = True
+        self.records = []
+
+
+def output_result(res: Result, fname: str, form: str, mode: str):
+    """ Write a single result
 
     Parameters
     ----------
-    res : Union[SearchLSOutput.SearchLSOutput, SearchSQOutput.SearchSQOutput, CompareLSOutput.CompareLSOutput]
+    res : Union[SearchLSOutput.SearchLSOutput, SearchSQOutput.SearchSQOutput, CompareLSOutput.CompareLSOutput, CompareLSMatrixOutput.CompareLSMatrixOutput, CompareLSPairsOutput.CompareLSPairsOutput]
         Result
     fname : str
         Output filename
@@ -17,7 +187,6 @@ def output_result(res: Union[
     mode : str
         Output mode
     """
-    if fname != "":
-        res.to_file(fname, form, mode)
-    else:
-        res.to_stdout()
+    writer: ResultWriter
+    with ResultWriter(fname, form, mode) as writer:
+        writer.write(res)
@@ -1,30 +1,86 @@
 import argparse
+from typing import List
 from argparse_formatter import FlexiFormatter
-from .search_seq import seq_search
-from .family_list import print_families
-from .search_lat import ls_search
-from . import output_opt_parser, dist_opt_parser, metrics_epilog
+from . import output_opt_parser, dist_opt_parser, metrics_epilog, lazy_command
 
 lat_help: str = "Provide a new protein family latent space. The closest protein family to this new latent space will be shown."
 seq_help: str = "Provide a protein sequence to get the closest protein family for this sequence."
 
 
-def main():
+def positive_int(value: str) -> int:
+    """ Argparse type for counts that must be at least 1
+
+    """
+    n: int = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError("must be at least 1: " + value)
+    return n
+
+
+def accuracy(value: str) -> float:
+    """ Argparse type for reconstruction accuracies
+
+    """
+    acc: float = float(value)
+    if not 0 < acc <= 1:
+        raise argparse.ArgumentTypeError("must be above 0 and at most 1: " + value)
+    return acc
+
+
+def main(argv: List[str] = None):
+    """
+
+    Parameters
+    ----------
+    argv : List[str]
+        Command line arguments. Default: sys.argv
+    """
     parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Find the closest protein family to a new latent space or protein sequence.',
                                                               formatter_class=FlexiFormatter)
     subparsers = parser.add_subparsers(dest='command', title='subcommands', metavar="{lat,seq,list names}")
     parser_ls: argparse.ArgumentParser = subparsers.add_parser('lat', help=lat_help, parents=[output_opt_parser, dist_opt_parser], formatter_class=FlexiFormatter, epilog=metrics_epilog)
     parser_ls.add_argument('latent_space', metavar="filename", help="The file name of a new latent space.", type=str, nargs='+')
+    neighbor_group = parser_ls.add_argument_group("neighbor options")
+    neighbor_group.add_argument('-k', help="Show a ranked list of the k closest protein families", dest="top_k", type=positive_int, default=None)
+    neighbor_group.add_argument('--radius', help="Show a ranked list of the protein families within this distance", dest="radius", type=float, default=None)
 
-    parser_seq: argparse.ArgumentParser = subparsers.add_parser('seq', help=seq_help, parents=[output_opt_parser])
+    parser_seq: argparse.ArgumentParser = subparsers.add_parser('seq', help=seq_help, parents=[output_opt_parser, dist_opt_parser], formatter_class=FlexiFormatter,
+                                                                epilog=metrics_epilog)
     parser_seq.add_argument('sequence', metavar="filename", help="The name of the file containing a protein sequence.", type=str, nargs='+')
+    parser_seq.add_argument('--fasta', help="The files are FASTA files with any number of sequences, gzip compressed or not. "
+                                            "The results are named after the FASTA headers", dest="fasta", action='store_true')
+    parser_seq.add_argument('-j', '--jobs', help="Score the protein families in this many worker processes. Default: %(default)s", dest="jobs",
+                            type=positive_int, default=1)
+    parser_seq.add_argument('--ignore-gaps', help="Only score the reconstruction of the sequence's letters, not of the gaps around it", dest="ignore_gaps",
+                            action='store_true')
+    shortlist_group = parser_seq.add_argument_group("shortlist options")
+    shortlist_group.add_argument('--shortlist', help="Map each sequence to a latent space with an encoder network and only score the K families closest to it "
+                                                     "in the distance metric", metavar="K", dest="shortlist", type=positive_int, default=None)
+    shortlist_group.add_argument('--encoder', help="Encoder network files without the .json and _weights.h5 endings. Default: Trained_networks/encoder",
+                                 dest="encoder", type=str, default=None)
+    shortlist_group.add_argument('--recall', help="Also score every family and show how often --shortlist, --prefilter-top or --stop-at found the same closest family",
+                                 dest="recall", action='store_true')
+    prefilter_group = parser_seq.add_argument_group("prefilter options")
+    prefilter_group.add_argument('--prefilter-top', help="Only score the N families whose k-mer composition is the most similar to the sequence's",
+                                 metavar="N", dest="prefilter_top", type=positive_int, default=None)
+    prefilter_group.add_argument('--stop-at', help="Score the families in order of k-mer similarity and stop once the reconstruction accuracy "
+                                                   "reaches ACC", metavar="ACC", dest="stop_at", type=accuracy, default=None)
+    prefilter_group.add_argument('--kmer-index', help="k-mer index built with python -m CLI.kmer_index. Default: Trained_networks/kmer_index.npz",
+                                 dest="kmer_index", type=str, default=None)
+    cache_group = parser_seq.add_argument_group("model cache options")
+    cache_group.add_argument('--model-cache', help="Most trained networks kept loaded between sequences. Default: no limit", metavar="N",
+                             dest="model_cache", type=positive_int, default=None)
+    cache_group.add_argument('--model-cache-mb', help="Most memory in MB used by the weights of the trained networks kept loaded. Default: 1024",
+                             metavar="MB", dest="model_cache_mb", type=positive_int, default=None)
+    cache_group.add_argument('--cache-stats', help="Show the model cache hits and misses when the search is done", dest="cache_stats", action='store_true')
 
     parser_names: argparse.ArgumentParser = subparsers.add_parser('list names', aliases=['list'], help="Show available protein family names")
     parser_names.add_argument('names', nargs='?', help=argparse.SUPPRESS)
-    parser_ls.set_defaults(func=ls_search)
-    parser_seq.set_defaults(func=seq_search)
-    parser_names.set_defaults(func=print_families)
-    args: argparse.Namespace = parser.parse_args()
+    # each subcommand imports its dependencies only when it runs
+    parser_ls.set_defaults(func=lazy_command('.search_lat', 'ls_search'))
+    parser_seq.set_defaults(func=lazy_command('.search_seq', 'seq_search'))
+    parser_names.set_defaults(func=lazy_command('.family_list', 'print_families'))
+    args: argparse.Namespace = parser.parse_args(argv)
     # print help text if nothing is selected
     if args.command is None:
         parser.print_help()
@@ -1,9 +1,9 @@
 import argparse
-from typing import Callable, List
+from typing import List, Optional
 from .SearchLSOutput import SearchLSOutput
-from .get_metric import get_distance_function
-from .SearchLS import SearchLS
-from .output_results import output_result
+from .get_metric import Metric, get_distance_function
+from .SearchLS import closest_families
+from .output_results import ResultWriter
 from .LSVector import LSVector
 
 
@@ -20,14 +20,17 @@ def ls_search(args: argparse.Namespace):
     out_format: str = args.output_format
     out_mode: str = args.output_mode
     p_norm: int = args.p_norm  # The p-norm to apply for Minkowski - default is 2
+    top_k: Optional[int] = args.top_k  # ranked list of the k closest families
+    radius: Optional[float] = args.radius  # ranked list of the families within this distance
 
     # set the distance metric
     distance_metric: str = args.distance_metric
-    distance_function: Callable = get_distance_function(distance_metric)
-    
-    # find the closest latent space
-    lat_space: str
-    for lat_space in lat_spaces:
-        v: LSVector = LSVector(lat_space)
-        res: SearchLSOutput = SearchLS(v, distance_function, p_norm).result
-        output_result(res, output_filename, out_format, out_mode)
+    distance_function: Metric = get_distance_function(distance_metric)
+
+    # find the closest latent space, scoring every query against the protein families at once
+    vectors: List[LSVector] = [LSVector(lat_space) for lat_space in lat_spaces]
+    res: SearchLSOutput
+    writer: ResultWriter
+    with ResultWriter(output_filename, out_format, out_mode) as writer:
+        for res in closest_families(vectors, distance_function, p_norm, top_k, radius):
+            writer.write(res)
@@ -1,11 +1,101 @@
 import sys
 import argparse
-from typing import List
+import multiprocessing.pool
+from pathlib import Path
+from typing import List, Optional, Iterator, Tuple
 from .SearchSQOutput import SearchSQOutput
-from .output_results import output_result
+from .output_results import ResultWriter
 
 debug = True
 
+# FASTA records searched together, the results of each batch are written before the next one is read
+fasta_batch: int = 8192
+
+
+def sequence_batches(args: argparse.Namespace) -> Iterator[Tuple[List[str], Optional[List[str]]]]:
+    """ Names and sequences to search together
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+
+    Returns
+    -------
+    Iterator[Tuple[List[str], Optional[List[str]]]]
+        Filenames and None to read them without --fasta, otherwise FASTA headers and sequences
+    """
+    if not args.fasta:
+        yield args.sequence, None
+        return
+    from .utils.io import iter_fasta
+    names: List[str] = []
+    lseqs: List[str] = []
+    fname: str
+    for fname in args.sequence:
+        try:
+            for name, lseq in iter_fasta(fname):
+                names.append(name)
+                lseqs.append(lseq.upper())
+                if len(names) == fasta_batch:
+                    yield names, lseqs
+                    names, lseqs = [], []
+        except OSError as err:
+            exit(err)
+    if names:
+        yield names, lseqs
+
+
+def run_searches(args: argparse.Namespace):
+    """ Search every sequence together, loading each trained network once
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+    """
+    from . import SearchSQ
+    from .get_metric import get_distance_function
+    # a search server keeps its cache between requests, so options left out restore the defaults
+    cache_models: int = args.model_cache if args.model_cache is not None else SearchSQ.cache_models
+    cache_mb: int = args.model_cache_mb if args.model_cache_mb is not None else SearchSQ.cache_mb
+    SearchSQ.model_cache.set_budget(cache_models, cache_mb * 2 ** 20)
+    if args.shortlist is not None and (args.prefilter_top is not None or args.stop_at is not None):
+        exit("--shortlist can't be combined with --prefilter-top or --stop-at")
+    encoder: Optional[Path] = Path(args.encoder) if args.encoder is not None else None
+    kmer_index: Optional[Path] = Path(args.kmer_index) if args.kmer_index is not None else None
+    recall: bool = args.recall and (args.shortlist is not None or args.prefilter_top is not None or args.stop_at is not None)
+    found: int = 0
+    total: int = 0
+    pool: Optional[multiprocessing.pool.Pool] = None
+    if args.jobs > 1:
+        from .seq_pool import open_pool
+        # shared by every batch and the --recall searches
+        pool = open_pool(args.jobs)
+    try:
+        writer: ResultWriter
+        with ResultWriter(args.output_file, args.output_format, args.output_mode) as writer:
+            names: List[str]
+            lseqs: Optional[List[str]]
+            for names, lseqs in sequence_batches(args):
+                results: List[SearchSQOutput] = SearchSQ.search_sequences(names, args.ignore_gaps, args.jobs, args.shortlist,
+                                                                          get_distance_function(args.distance_metric), args.p_norm, encoder,
+                                                                          args.prefilter_top, args.stop_at, kmer_index, lseqs, args.fasta, pool)
+                res: SearchSQOutput
+                for res in results:
+                    writer.write(res)
+                if recall:
+                    exhaustive: List[SearchSQOutput] = SearchSQ.search_sequences(names, args.ignore_gaps, args.jobs, lseqs=lseqs,
+                                                                                 skip_invalid=args.fasta, pool=pool)
+                    found += sum(res.closest == full.closest for res, full in zip(results, exhaustive))
+                    total += len(results)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    if recall and total:
+        sys.stderr.write('recall: ' + str(found) + ' of ' + str(total) + ' sequences (' +
+                         format(100 * found / total, '.1f') + '%) have the closest family of the full search\n')
+    if args.cache_stats:
+        sys.stderr.write(SearchSQ.model_cache.stats() + '\n' + SearchSQ.shared_models.stats() + '\n')
+
 
 def seq_search(args: argparse.Namespace):
     """
@@ -14,26 +104,13 @@ def seq_search(args: argparse.Namespace):
     ----------
     args : argparse.Namespace
     """
-    # get the arguments
-    sequences: List[str] = args.sequence
-    output_filename: str = args.output_file
-    out_format: str = args.output_format
-    out_mode: str = args.output_mode
     if sys.version_info[:2] == (3, 7) and ('32 bit' not in sys.version):
         # don't import function and dependencies if you don't need to
         if debug:
-            from .SearchSQ import SearchSQ
-            ns: str
-            for ns in sequences:
-                res: SearchSQOutput = SearchSQ(ns).result
-                output_result(res, output_filename, out_format, out_mode)
+            run_searches(args)
         else:
             try:
-                from .SearchSQ import SearchSQ
-                ns: str
-                for ns in sequences:
-                    res: SearchSQOutput = SearchSQ(ns).result
-                    output_result(res, output_filename, out_format, out_mode)
+                run_searches(args)
             except Exception as err:
                 print("Error")
                 exit(err)
@@ -0,0 +1,151 @@
+import math
+import multiprocessing
+import multiprocessing.pool
+import os
+from typing import List, Dict, Tuple, Optional
+import numpy as np
+from .utils.metrics import merge_scores
+
+# pieces of the family list per worker, so workers that get small families take more pieces
+pieces_per_job: int = 4
+
+# read by the math libraries and TensorFlow when a worker loads them, see open_pool
+thread_variables: List[str] = ['OMP_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS']
+
+# a piece of work: families, their rows of the mask, the sequences they may score and whether to ignore gaps
+Piece = Tuple[List[Tuple[int, str, int]], Optional[np.ndarray], List[np.ndarray], bool]
+
+
+def init_worker(threads: int, cache_models: Optional[int], cache_bytes: Optional[int]):
+    """ Load TensorFlow in a worker process, limited to its share of the cores, with its own session and model cache
+
+    Parameters
+    ----------
+    threads : int
+        Threads TensorFlow may use in this worker
+    cache_models : int
+        Most models kept by the worker's model cache
+    cache_bytes : int
+        Most weight bytes kept by the worker's model cache
+    """
+    from . import SearchSQ
+    import tensorflow as tf
+    from keras import backend as K
+    if hasattr(K, 'set_session'):
+        # Keras 2.3 runs the models in its own TensorFlow 1 session
+        K.set_session(tf.compat.v1.Session(config=tf.compat.v1.ConfigProto(intra_op_parallelism_threads=threads,
+                                                                           inter_op_parallelism_threads=1)))
+    SearchSQ.no_pbar = True
+    SearchSQ.model_cache.set_budget(cache_models, cache_bytes)
+
+
+def score_piece(piece: Piece) -> Tuple[int, np.ndarray, np.ndarray]:
+    """ Score some sequences against some families
+
+    Parameters
+    ----------
+    piece : Tuple[List[Tuple[int, str, int]], numpy.ndarray, List[numpy.ndarray], bool]
+        Families and their rows of the mask, sequences and ignore_gaps, see SearchSQ.score_families
+
+    Returns
+    -------
+    Tuple[int, numpy.ndarray, numpy.ndarray]
+        Number of families, and the output of SearchSQ.score_families
+    """
+    from .SearchSQ import score_families
+    families, allowed, encoded, ignore_gaps = piece
+    return (len(families),) + score_families(families, encoded, ignore_gaps, allowed)
+
+
+def open_pool(jobs: int) -> multiprocessing.pool.Pool:
+    """ Start the worker processes, once per search: the sequences are sent with each piece of work
+
+    Parameters
+    ----------
+    jobs : int
+        Number of worker processes
+
+    Returns
+    -------
+    multiprocessing.pool.Pool
+        Pool to pass to pool_scores, and to close
+    """
+    from .SearchSQ import model_cache
+    threads: int = max(1, (os.cpu_count() or 1) // jobs)
+    # TensorFlow isn't safe to fork once it is loaded
+    context = multiprocessing.get_context('spawn')
+    # spawned workers inherit the environment, which is only read when they import numpy and TensorFlow,
+    # so it is set here and restored once they are started
+    saved: Dict[str, Optional[str]] = {name: os.environ.get(name) for name in thread_variables + ['TF_NUM_INTEROP_THREADS']}
+    name: str
+    for name in thread_variables:
+        os.environ[name] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    try:
+        return context.Pool(jobs, initializer=init_worker, initargs=(threads, model_cache.max_models, model_cache.max_bytes))
+    finally:
+        value: Optional[str]
+        for name, value in saved.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+
+
+def pool_scores(pool: multiprocessing.pool.Pool, jobs: int, families: List[Tuple[int, str, int]], encoded: List[np.ndarray],
+                ignore_gaps: bool = False, allowed: np.ndarray = None, pbar=None) -> Tuple[np.ndarray, np.ndarray]:
+    """ SearchSQ.score_families, with the families split between worker processes
+
+    Each piece of families is sent with the sequences that fit in its largest family and that the mask lets it score.
+    The best family of each sequence is the same as when the families are scored in order in one process:
+    the highest accuracy wins and ties go to the family that comes first in the search order
+
+    Parameters
+    ----------
+    pool : multiprocessing.pool.Pool
+        Workers started by open_pool
+    jobs : int
+        Number of worker processes
+    families : List[Tuple[int, str, int]]
+        Position in the search order, name and size of each family, in search order
+    encoded : List[numpy.ndarray]
+        Letter indices of the sequences
+    ignore_gaps : bool
+        Score the reconstructions on the positions that aren't gaps only
+    allowed : numpy.ndarray
+        Family x sequence mask, see SearchSQ.score_families
+    pbar : tqdm
+        Progress bar advanced once per family
+
+    Returns
+    -------
+    Tuple[numpy.ndarray, numpy.ndarray]
+        Best accuracy of each sequence, and search order position of the first family that reached it, -1 if none did
+    """
+    lengths: np.ndarray = np.array([len(enc) for enc in encoded])
+    piece_size: int = math.ceil(len(families) / (jobs * pieces_per_job))
+    columns: List[np.ndarray] = []
+    pieces: List[Piece] = []
+    i: int
+    for i in range(0, len(families), piece_size):
+        piece_allowed: Optional[np.ndarray] = None if allowed is None else allowed[i:i + piece_size]
+        needed: np.ndarray = np.flatnonzero((lengths <= max(size for _, _, size in families[i:i + piece_size])) &
+                                            (True if piece_allowed is None else piece_allowed.any(axis=0)))
+        columns.append(needed)
+        pieces.append((families[i:i + piece_size], None if piece_allowed is None else piece_allowed[:, needed],
+                       [encoded[j] for j in needed], ignore_gaps))
+    max_acc: np.ndarray = np.zeros(len(encoded))
+    chosen_family: np.ndarray = np.full(len(encoded), -1)
+    # in the order of the pieces, so each result is matched with its sequences
+    count: int
+    acc: np.ndarray
+    order: np.ndarray
+    for needed, (count, acc, order) in zip(columns, pool.imap(score_piece, pieces)):
+        piece_acc: np.ndarray = max_acc[needed]
+        piece_family: np.ndarray = chosen_family[needed]
+        merge_scores(piece_acc, piece_family, acc, order)
+        max_acc[needed] = piece_acc
+        chosen_family[needed] = piece_family
+        if pbar is not None:
+            pbar.update(count)
+    return max_acc, chosen_family
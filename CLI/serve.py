@@ -0,0 +1,417 @@
+import argparse
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import redirect_stdout, redirect_stderr
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from .client import socket_env, forwarded_env, socket_path, connect, send_request
+
+# latencies kept per command for the statistics
+stats_window: int = 10000
+
+
+def stat_signature(path) -> Optional[Tuple[int, int]]:
+    """
+
+    Parameters
+    ----------
+    path
+        File or directory
+
+    Returns
+    -------
+    Tuple[int, int]
+        Modification time and size, None if it doesn't exist
+    """
+    try:
+        stat: os.stat_result = os.stat(str(path))
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def data_key() -> tuple:
+    """
+
+    Returns
+    -------
+    tuple
+        Signatures of the latent space files and seq_lengths.csv of the package
+    """
+    from .load_files import lspath, s_length
+    return stat_signature(lspath), stat_signature(s_length)
+
+
+def networks_key() -> Optional[tuple]:
+    """
+
+    Returns
+    -------
+    tuple
+        Current directory, and signatures of the trained networks, their store and their archive relative to it.
+        None until a sequence search has loaded them
+    """
+    seq_module = sys.modules.get(__package__ + '.SearchSQ')
+    if seq_module is None:
+        return None
+    from .network_store import store_dirname, index_filename
+    return (os.getcwd(), stat_signature(seq_module.networks_path), stat_signature(seq_module.networks_path / store_dirname / index_filename),
+            stat_signature(seq_module.archive_path()))
+
+
+def reset(module_name: str, **values):
+    """ Set module globals, if the module is loaded
+
+    Parameters
+    ----------
+    module_name : str
+        Module of this package
+    values
+        New value of each global
+    """
+    module = sys.modules.get(__package__ + '.' + module_name)
+    if module is not None:
+        module.__dict__.update(values)
+
+
+def set_env(env: Dict[str, Optional[str]]):
+    """ Set the forwarded environment variables, unsetting those left out
+
+    Parameters
+    ----------
+    env : Dict[str, str]
+        Value of each variable, None or missing to unset it
+    """
+    name: str
+    for name in forwarded_env:
+        if env.get(name) is not None:
+            os.environ[name] = env[name]
+        else:
+            os.environ.pop(name, None)
+
+
+def clear_data_caches():
+    """ Drop the latent space store and the family catalog and list, they are read again by the next request
+
+    """
+    reset('ls_store', _store=None)
+    reset('family_catalog', _catalog=None)
+    load_files = sys.modules.get(__package__ + '.load_files')
+    if load_files is not None:
+        # built again from the catalog when it is next used
+        load_files.__dict__.pop('latent_space_list', None)
+
+
+def clear_network_caches():
+    """ Drop the trained networks read from the directory of earlier requests, they are read again by the next request
+
+    The models built for each architecture are kept, only the weights they hold are set again
+    """
+    reset('network_store', _store=None, _store_dir=None)
+    reset('network_archive', _archive=None)
+    seq_module = sys.modules.get(__package__ + '.SearchSQ')
+    if seq_module is not None:
+        seq_module.networks_extracted.cache_clear()
+        seq_module.family_architecture.cache_clear()
+        seq_module.model_cache.clear()
+        seq_module.shared_models.clear()
+
+
+class OutputStream(io.TextIOBase):
+    """ Stands in for the stdout or stderr of a served command, and sends what it writes to the client
+
+    Complete lines are sent as soon as they are written, so the client prints a long run's results as they come
+    and the server doesn't hold them
+    """
+    name: str
+    send: Callable[[dict], None]
+    pending: List[str]
+
+    def __init__(self, name: str, send: Callable[[dict], None]):
+        """
+
+        Parameters
+        ----------
+        name : str
+            stdout or stderr
+        send : function
+            Sends one message to the client
+        """
+        super().__init__()
+        self.name = name
+        self.send = send
+        self.pending = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self.pending.append(text)
+        if '\n' in text:
+            data: str = ''.join(self.pending)
+            end: int = data.rfind('\n') + 1
+            self.pending = [data[end:]] if end < len(data) else []
+            self.send({self.name: data[:end]})
+        return len(text)
+
+    def flush(self):
+        if self.pending:
+            data: str = ''.join(self.pending)
+            self.pending = []
+            self.send({self.name: data})
+
+
+def is_seq_search(command: str, argv: List[str]) -> bool:
+    return command == 'search' and argv[:1] == ['seq']
+
+
+class SearchServer(socketserver.UnixStreamServer):
+    """ Runs compare and search requests one at a time in this process
+
+    The latent space store, indexes, distance matrices and networks loaded by earlier requests stay in memory.
+    The networks are read relative to the client's directory, so they are dropped when a request comes from another
+    directory. Both are dropped when their files change
+    """
+    entry_points: Dict[str, Callable]
+    latencies: Dict[str, Deque[float]]
+    started: float
+    keys: Tuple[tuple, Optional[tuple]]
+
+    def __init__(self, path: str):
+        """
+
+        Parameters
+        ----------
+        path : str
+            Unix domain socket to listen on
+        """
+        from .compare import main as compare_main
+        from .search import main as search_main
+        self.entry_points = {'compare': compare_main, 'search': search_main}
+        self.latencies = {command: deque(maxlen=stats_window) for command in self.entry_points}
+        self.started = time.time()
+        self.keys = (data_key(), networks_key())
+        super().__init__(path, RequestHandler)
+
+    def check_caches(self):
+        """ Drop the data loaded by earlier requests that the files of this request's directory no longer match
+
+        """
+        if data_key() != self.keys[0]:
+            clear_data_caches()
+        if networks_key() != self.keys[1]:
+            clear_network_caches()
+
+    def run(self, request: dict, send: Callable[[dict], None]) -> dict:
+        """ Run one command as if it was called from the command line in the client's directory and environment
+
+        Parameters
+        ----------
+        request : dict
+            command, argv, cwd and the forwarded environment variables of the client
+        send : function
+            Sends one output message to the client, called as the command writes its output
+
+        Returns
+        -------
+        dict
+            Exit status and run time of the command
+        """
+        command: str = request['command']
+        out: OutputStream = OutputStream('stdout', send)
+        err: OutputStream = OutputStream('stderr', send)
+        status: int = 0
+        old_cwd: str = os.getcwd()
+        old_argv: List[str] = sys.argv
+        old_env: Dict[str, Optional[str]] = {name: os.environ.get(name) for name in forwarded_env}
+        start: float = time.perf_counter()
+        try:
+            set_env(request.get('env', {}))
+            os.chdir(request['cwd'])
+            self.check_caches()
+            # argparse names the program after sys.argv[0]
+            sys.argv = [command] + request['argv']
+            with redirect_stdout(out), redirect_stderr(err):
+                if is_seq_search(command, request['argv']):
+                    # imported here rather than by the command, so its progress bars are off before they are shown
+                    from . import SearchSQ
+                    SearchSQ.no_pbar = True
+                self.entry_points[command](request['argv'])
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                status = e.code
+            elif e.code is not None:
+                err.write(str(e.code) + '\n')
+                status = 1
+        except Exception:
+            err.write(traceback.format_exc())
+            status = 1
+        finally:
+            try:
+                out.flush()
+                err.flush()
+            except OSError:
+                # the client is gone
+                pass
+            sys.argv = old_argv
+            # what the caches hold now, including the files this request wrote
+            self.keys = (data_key(), networks_key())
+            os.chdir(old_cwd)
+            set_env(old_env)
+        elapsed: float = time.perf_counter() - start
+        self.latencies[command].append(elapsed)
+        return {'status': status, 'elapsed': elapsed}
+
+    def stats(self) -> str:
+        """ Latency statistics of the requests served so far, and the model cache hits and misses
+
+        Returns
+        -------
+        str
+            One line per command
+        """
+        lines: List[str] = ['uptime: ' + format(time.time() - self.started, '.0f') + ' s']
+        command: str
+        for command, latencies in self.latencies.items():
+            if not latencies:
+                lines.append(command + ': no requests')
+                continue
+            ms: List[float] = sorted(1000 * t for t in latencies)
+            lines.append(command + ': ' + str(len(ms)) + ' requests, mean ' + format(sum(ms) / len(ms), '.1f') +
+                         ' ms, p50 ' + format(ms[len(ms) // 2], '.1f') +
+                         ' ms, p95 ' + format(ms[min(len(ms) - 1, int(0.95 * len(ms)))], '.1f') +
+                         ' ms, max ' + format(ms[-1], '.1f') + ' ms')
+        # only once a sequence search has loaded TensorFlow
+        seq_module = sys.modules.get(__package__ + '.SearchSQ')
+        if seq_module is not None:
+            lines.append(seq_module.model_cache.stats())
+            lines.append(seq_module.shared_models.stats())
+        return '\n'.join(lines) + '\n'
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    server: SearchServer
+    disconnected: bool = False
+
+    def send(self, message: dict):
+        """ Send one line of JSON to the client
+
+        Parameters
+        ----------
+        message : dict
+            Output or response
+        """
+        if self.disconnected:
+            return
+        try:
+            self.wfile.write(json.dumps(message).encode() + b'\n')
+        except OSError:
+            # the client is gone: the command stops at its next write, and what it writes after is dropped
+            self.disconnected = True
+            raise
+
+    def handle(self):
+        line: bytes = self.rfile.readline()
+        if not line:
+            return
+        request: dict = json.loads(line.decode())
+        command: str = request.get('command')
+        if command == 'stats':
+            response: dict = {'status': 0, 'stdout': self.server.stats()}
+        elif command == 'stop':
+            response = {'status': 0, 'stdout': 'Search server stopped\n'}
+            # shutdown waits for serve_forever, which is running this handler
+            threading.Thread(target=self.server.shutdown).start()
+        elif command in self.server.entry_points:
+            response = self.server.run(request, self.send)
+        else:
+            response = {'status': 2, 'stderr': 'Unknown command: ' + str(command) + '\n'}
+        try:
+            self.send(response)
+        except OSError:
+            pass
+
+
+def preload(seq: bool):
+    """ Load the data used by every request before accepting any
+
+    Parameters
+    ----------
+    seq : bool
+        Also import TensorFlow and the sequence search
+    """
+    from .ls_store import get_store
+    get_store()
+    if seq:
+        from . import SearchSQ
+        SearchSQ.no_pbar = True
+        SearchSQ.check_files()
+
+
+def main(argv: List[str] = None):
+    """
+
+    Parameters
+    ----------
+    argv : List[str]
+        Command line arguments. Default: sys.argv
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description='Keep the protein family data loaded and answer compare and search requests from the same user over a Unix domain socket. '
+                    'compare and search forward to it while it is running, unless COMPBIOLAB_NO_SERVER is set.')
+    parser.add_argument('--socket', help="Socket path. Default: $COMPBIOLAB_SOCKET or ~/.cache/compbiolab-CLI/serve.sock", type=str, default=None)
+    parser.add_argument('--seq', help="Load TensorFlow and the trained networks at start-up", action='store_true')
+    parser.add_argument('--stats', help="Show the request latencies of the running server", action='store_true')
+    parser.add_argument('--stop', help="Stop the running server", action='store_true')
+    args: argparse.Namespace = parser.parse_args(argv)
+    if args.socket is not None:
+        os.environ[socket_env] = args.socket
+    path: Path = socket_path()
+
+    if args.stats or args.stop:
+        sock: socket.socket = connect()
+        if sock is None:
+            exit("No search server is running on " + str(path))
+        response: dict = send_request(sock, {'command': 'stats' if args.stats else 'stop'})
+        print(response.get('stdout', ''), end='')
+        return
+
+    if not hasattr(socket, 'AF_UNIX'):
+        exit("Unix domain sockets aren't supported on this platform")
+    running: socket.socket = connect()
+    if running is not None:
+        running.close()
+        exit("A search server is already running on " + str(path))
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if path.exists():
+        # left behind by a server that is no longer running
+        path.unlink()
+
+    preload(args.seq and sys.version_info[:2] == (3, 7) and '32 bit' not in sys.version)
+    server: SearchServer
+    old_umask: int = os.umask(0o177)  # only this user may connect
+    try:
+        server = SearchServer(str(path))
+    finally:
+        os.umask(old_umask)
+    print('Search server listening on ' + str(path), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if path.exists():
+            path.unlink()
+
+
+if __name__ == "__main__":
+    main()
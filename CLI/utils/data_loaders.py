@@ -1,9 +1,131 @@
-from typing import List, Union, Dict
+from functools import lru_cache
+from typing import List, Union, Dict, Tuple
 import numpy as np
 import pandas as pd
 from . import aa_letters
 
 
+# invalid letters listed in the error message, the error holds all of them
+max_reported: int = 10
+
+
+class InvalidSequenceError(ValueError):
+    """ Sequences with letters that aren't in the alphabet
+
+    """
+    positions: List[Tuple[int, int]]
+
+    def __init__(self, seqlist: List[str], positions: List[Tuple[int, int]]):
+        """
+
+        Parameters
+        ----------
+        seqlist : List[str]
+            Encoded sequences
+        positions : List[Tuple[int, int]]
+            Sequence and position of every invalid letter, from 0
+        """
+        self.positions = positions
+        letters: List[str] = [repr(seqlist[i][j]) + ' at position ' + str(j + 1) + ('' if len(seqlist) == 1 else ' of sequence ' + str(i + 1))
+                              for i, j in positions[:max_reported]]
+        more: str = ' and ' + str(len(positions) - max_reported) + ' more' if len(positions) > max_reported else ''
+        super().__init__("Invalid sequence letters: " + ', '.join(letters) + more)
+
+
+@lru_cache(maxsize=None)
+def lookup_table(alphabet: Tuple[str, ...]) -> np.ndarray:
+    """ Index of every byte in the alphabet
+
+    Parameters
+    ----------
+    alphabet : Tuple[str, ...]
+
+    Returns
+    -------
+    numpy.ndarray
+        256 uint8 indices, 255 for bytes that aren't in the alphabet
+    """
+    lut: np.ndarray = np.full(256, 255, dtype=np.uint8)
+    i: int
+    for i, l in enumerate(alphabet):
+        lut[ord(l)] = i
+    return lut
+
+
+def encode_indices(seqlist: List[str], alphabet: List[str] = aa_letters) -> np.ndarray:
+    """ Encode sequences of the same length as the positions of their letters in the alphabet
+
+    Parameters
+    ----------
+    seqlist : List[str]
+    alphabet : List[str]
+
+    Returns
+    -------
+    numpy.ndarray
+        len(seqlist) x sequence length uint8 array of letter indices
+
+    Raises
+    ------
+    InvalidSequenceError
+        If any letter isn't in the alphabet
+    """
+    length: int = len(seqlist[0]) if len(seqlist) else 0
+    if any(len(prot) != length for prot in seqlist):
+        raise ValueError("all sequences must have the same length")
+    # one byte per letter: letters past U+00FF become '?', which isn't in the alphabet
+    codes: np.ndarray = np.frombuffer(''.join(seqlist).encode('latin-1', 'replace'), dtype=np.uint8)
+    indices: np.ndarray = lookup_table(tuple(alphabet))[codes].reshape(len(seqlist), length)
+    if (indices == 255).any():
+        raise InvalidSequenceError(seqlist, [(int(i), int(j)) for i, j in np.argwhere(indices == 255)])
+    return indices
+
+
+def to_indices(sequence: str, alphabet: List[str] = aa_letters) -> np.ndarray:
+    """ Encode a sequence as the positions of its letters in the alphabet
+
+    Parameters
+    ----------
+    sequence : str
+    alphabet : List[str]
+
+    Returns
+    -------
+    numpy.ndarray
+        uint8 array of letter indices, one per position
+
+    Raises
+    ------
+    InvalidSequenceError
+        If any letter isn't in the alphabet
+    """
+    return encode_indices([sequence], alphabet)[0]
+
+
+def indices_to_one_hot(indices: np.ndarray, depth: int = len(aa_letters), dtype: np.dtype = np.float64) -> np.ndarray:
+    """ One hot encode letter indices
+
+    Parameters
+    ----------
+    indices : numpy.ndarray
+        Letter indices, any shape
+    depth : int
+        Size of the alphabet
+    dtype : numpy.dtype
+        Output type, e.g. numpy.uint8 or numpy.float32 to save memory
+
+    Returns
+    -------
+    numpy.ndarray
+        indices shape x depth
+    """
+    one_hot: np.ndarray = np.zeros(indices.shape + (depth,), dtype=dtype)
+    # set one element per position of the flat buffer
+    flat: np.ndarray = one_hot.reshape(-1, depth)
+    flat[np.arange(len(flat)), indices.reshape(-1)] = 1
+    return one_hot
+
+
 def seq_to_one_hot(sequence: str, aa_key: Dict[str, int]) -> np.ndarray:
     """
 
@@ -16,39 +138,32 @@ def seq_to_one_hot(sequence: str, aa_key: Dict[str, int]) -> np.ndarray:
     -------
     numpy.ndarray
     """
-    arr: np.ndarray = np.zeros((len(sequence), len(aa_key)))
-    j: int
-    for j, c in enumerate(sequence):
-        err: KeyError
-        try:
-            arr[j, aa_key[c]] = 1
-        except KeyError as err:
-            print("Invalid sequence letter")
-            exit(err)
-    return arr
-
-
-def to_one_hot(seqlist: Union[str, List[str]], alphabet: List[str] = aa_letters) -> np.ndarray:
+    return to_one_hot(sequence, sorted(aa_key, key=aa_key.get))
+
+
+def to_one_hot(seqlist: Union[str, List[str]], alphabet: List[str] = aa_letters, dtype: np.dtype = np.float64) -> np.ndarray:
     """
 
     Parameters
     ----------
     seqlist : List[str]
+        One sequence, or sequences of the same length
     alphabet : List[str]
+    dtype : numpy.dtype
+        Output type, e.g. numpy.uint8 or numpy.float32 to save memory
 
     Returns
     -------
     numpy.ndarray
+
+    Raises
+    ------
+    InvalidSequenceError
+        If any letter isn't in the alphabet, with the positions of all of them
     """
-    aa_key: Dict[str, int] = {l: i for i, l in enumerate(alphabet)}
-    if type(seqlist) == str:
-        return seq_to_one_hot(seqlist, aa_key)
-    else:
-        encoded_seqs: List[np.ndarray] = []
-        prot: str
-        for prot in seqlist:
-            encoded_seqs.append(seq_to_one_hot(prot, aa_key))
-        return np.stack(encoded_seqs)
+    if isinstance(seqlist, str):
+        return indices_to_one_hot(to_indices(seqlist, alphabet), len(alphabet), dtype)
+    return indices_to_one_hot(encode_indices(list(seqlist), alphabet), len(alphabet), dtype)
 
 
 def right_pad(seqlist, target_length=None):
@@ -85,7 +200,7 @@ def one_hot_generator(seqlist, conditions=None, batch_size: int = 32,
         i: int
         for i in range(len(prots) // batch_size):
             batch: np.ndarray = to_one_hot(right_pad(prots[i * batch_size:(i + 1) * batch_size], padding),
-                                           alphabet=alphabet)
+                                           alphabet=alphabet, dtype=np.float32)
             if conditions is not None:
                 yield [batch, conds[i * batch_size:(i + 1) * batch_size]], batch
             else:
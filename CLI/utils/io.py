@@ -1,8 +1,19 @@
+import bisect
 import gzip
-from typing import List, BinaryIO, TextIO
+import io
+import os
+import struct
+import zlib
+from typing import List, BinaryIO, TextIO, Iterator, Tuple, Dict, Optional
 import numpy as np
 from .data_loaders import to_one_hot
 
+# bytes read from the file at a time
+chunk_size: int = 1 << 20
+
+# .fai line of a record: length, offset of the first letter, letters per line, bytes per line
+FaiEntry = Tuple[int, int, int, int]
+
 
 def load_gzdata(filename, one_hot: bool = True):
     names: List[str]
@@ -21,65 +32,143 @@ def compress_file(filename):
             gzout.write(b)
 
 
+def is_gzip(filepath) -> bool:
+    f: BinaryIO
+    with open(filepath, 'rb') as f:
+        return f.read(2) == b'\x1f\x8b'
+
+
+def is_bgzf(filepath) -> bool:
+    """ Check if a file is BGZF compressed (bgzip, samtools), gzip with an index-friendly block structure
+
+    """
+    f: BinaryIO
+    with open(filepath, 'rb') as f:
+        header: bytes = f.read(18)
+    # gzip magic, deflate, FEXTRA flag, then a 'BC' extra subfield holding the block size
+    return len(header) == 18 and header[:4] == b'\x1f\x8b\x08\x04' and header[12:14] == b'BC'
+
+
+def open_fasta(filepath) -> BinaryIO:
+    """ Open a FASTA file for reading in chunks, decompressing it if it is gzip or BGZF compressed
+
+    Parameters
+    ----------
+    filepath
+        FASTA file
+
+    Returns
+    -------
+    BinaryIO
+    """
+    if is_gzip(filepath):
+        return io.BufferedReader(gzip.GzipFile(filepath, 'rb'), chunk_size)
+    return open(filepath, 'rb', buffering=chunk_size)
+
+
+def scan_fasta(fin: BinaryIO, with_seqs: bool = True) -> Iterator[Tuple[str, Optional[bytes], FaiEntry]]:
+    """ Read the records of a FASTA file one at a time
+
+    Only the lines of the current record are held in memory, and joined once at its end
+
+    Parameters
+    ----------
+    fin : BinaryIO
+        Open FASTA file
+    with_seqs : bool
+        Also return the sequences, not only their .fai entries
+
+    Returns
+    -------
+    Iterator[Tuple[str, Optional[bytes], FaiEntry]]
+        Header without the '>', sequence and .fai entry of each record. The entry's line lengths are 0 if they vary
+    """
+    header: Optional[bytes] = None
+    parts: List[bytes] = []
+    length: int = 0
+    offset: int = 0
+    line_bases: int = 0
+    line_width: int = 0
+    # a line shorter than the first one must be the last
+    ragged: bool = False
+    short: bool = False
+    position: int = 0
+    line: bytes
+    for line in fin:
+        position += len(line)
+        if line.startswith(b'>'):
+            if header is not None:
+                yield (header.decode(errors='replace'), b''.join(parts) if with_seqs else None,
+                       (length, offset, 0 if ragged else line_bases, 0 if ragged else line_width))
+            header = line[1:].strip()
+            parts = []
+            length = 0
+            offset = position
+            line_bases = line_width = 0
+            ragged = short = False
+            continue
+        letters: bytes = line.rstrip(b'\r\n')
+        if not letters or header is None:
+            # only the last line of a record may be shorter
+            short = short or line_bases > 0
+            continue
+        # only the last line of the file can lack a line terminator, which says nothing of the line width
+        terminated: bool = line.endswith(b'\n')
+        if line_bases == 0:
+            # blank lines before the sequence are skipped by the offset too. A single unterminated line counts as
+            # ending in '\n', like samtools
+            line_bases, line_width = len(letters), len(line) if terminated else len(letters) + 1
+            offset = position - len(line)
+        elif short or len(letters) > line_bases or (terminated and len(line) - len(letters) != line_width - line_bases):
+            ragged = True
+        short = short or len(letters) < line_bases
+        length += len(letters)
+        if with_seqs:
+            parts.append(letters)
+    if header is not None:
+        yield (header.decode(errors='replace'), b''.join(parts) if with_seqs else None,
+               (length, offset, 0 if ragged else line_bases, 0 if ragged else line_width))
+
+
+def iter_fasta(filepath, encoding: str = 'utf-8') -> Iterator[Tuple[str, str]]:
+    """ Read the records of a FASTA file one at a time, gzip compressed or not
+
+    Parameters
+    ----------
+    filepath
+        FASTA file
+    encoding : str
+        Encoding of the sequences
+
+    Returns
+    -------
+    Iterator[Tuple[str, str]]
+        Header without the '>' and sequence of each record
+    """
+    fin: BinaryIO
+    with open_fasta(filepath) as fin:
+        name: str
+        seq: bytes
+        for name, seq, _ in scan_fasta(fin):
+            yield name, seq.decode(encoding)
+
+
 def read_gzfasta(filepath, output_arr: bool = False, encoding: str = 'utf-8'):
-    names: List[str] = []
-    seqs = []
-    seq: str = ''
-    with gzip.open(filepath, 'rb') as fin:
-        file_content: str = fin.read().decode(encoding)
-        lines: List[str] = file_content.split('\n')
-        line: str
-        for line in lines:
-            if line:
-                if line[0] == '>':
-                    if seq:
-                        names.append(name)
-                        if output_arr:
-                            seqs.append(np.array(list(seq)))
-                        else:
-                            seqs.append(seq)
-                    name: str = line[1:]
-                    seq = ''
-                else:
-                    seq += line
-            else:
-                continue
-        if seq:  # handle last seq in file
-            names.append(name)
-            if output_arr:
-                seqs.append(np.array(list(seq)))
-            else:
-                seqs.append(seq)
-    if output_arr:
-        seqs = np.array(seqs)
-    return names, seqs
+    return read_fasta(filepath, output_arr, encoding)
+
 
+def read_fasta(filepath, output_arr: bool = False, encoding: str = 'utf-8'):
+    """ Read every record of a FASTA file, gzip compressed or not. Records without a sequence are left out
 
-def read_fasta(filepath, output_arr: bool = False):
+    """
     names: List[str] = []
     seqs = []
-    seq: str = ''
-    fin: TextIO
-    with open(filepath, 'r') as fin:
-        line: str
-        for line in fin:
-            if line[0] == '>':
-                if seq:
-                    names.append(name)
-                    if output_arr:
-                        seqs.append(np.array(list(seq)))
-                    else:
-                        seqs.append(seq)
-                name: str = line.rstrip('\n')[1:]
-                seq = ''
-            else:
-                seq += line.rstrip('\n')
-        if seq:  # handle last seq in file
+    name: str
+    seq: str
+    for name, seq in iter_fasta(filepath, encoding):
+        if seq:
             names.append(name)
-            if output_arr:
-                seqs.append(np.array(list(seq)))
-            else:
-                seqs.append(seq)
+            seqs.append(np.array(list(seq)) if output_arr else seq)
     if output_arr:
         seqs = np.array(seqs)
     return names, seqs
@@ -91,3 +180,256 @@ def output_fasta(names, seqs, filepath):
         for name, seq in zip(names, seqs):
             fout.write('>{}\n'.format(name))
             fout.write(seq + '\n')
+
+
+def bgzf_blocks(filepath) -> List[Tuple[int, int]]:
+    """ Compressed and uncompressed offset of every BGZF block, as in a .gzi index
+
+    Parameters
+    ----------
+    filepath
+        BGZF compressed file
+
+    Returns
+    -------
+    List[Tuple[int, int]]
+    """
+    blocks: List[Tuple[int, int]] = []
+    compressed: int = 0
+    uncompressed: int = 0
+    f: BinaryIO
+    with open(filepath, 'rb') as f:
+        while True:
+            header: bytes = f.read(12)
+            if len(header) < 12:
+                break
+            extra: bytes = f.read(struct.unpack('<H', header[10:12])[0])
+            block_size: Optional[int] = None
+            i: int = 0
+            while i + 4 <= len(extra):
+                sub_len: int = struct.unpack('<H', extra[i + 2:i + 4])[0]
+                if extra[i:i + 2] == b'BC':
+                    block_size = struct.unpack('<H', extra[i + 4:i + 6])[0] + 1
+                i += 4 + sub_len
+            if block_size is None:
+                raise ValueError(str(filepath) + " isn't BGZF compressed")
+            # the uncompressed size closes the block
+            f.seek(compressed + block_size - 4)
+            size: int = struct.unpack('<I', f.read(4))[0]
+            blocks.append((compressed, uncompressed))
+            compressed += block_size
+            uncompressed += size
+    return blocks
+
+
+class FastaIndex:
+    """ Random access to the records of a FASTA file by name, through a .fai index like samtools faidx writes
+
+    Plain files are read from the record's offset. BGZF files (bgzip) are read from the block holding it, found with
+    their .gzi block index. Other gzip files are indexed too, but have to be decompressed from the start to get a record
+    """
+    path: str
+    names: List[str]
+    entries: Dict[str, FaiEntry]
+    blocks: Optional[List[Tuple[int, int]]]
+    block_starts: Optional[List[int]]
+    compressed: bool
+
+    def __init__(self, path: str, names: List[str], entries: Dict[str, FaiEntry], blocks: List[Tuple[int, int]] = None):
+        """
+
+        Parameters
+        ----------
+        path : str
+            FASTA file
+        names : List[str]
+            Record names in file order, the first word of the headers
+        entries : Dict[str, FaiEntry]
+            .fai entry of each record
+        blocks : List[Tuple[int, int]]
+            BGZF blocks of the file, None if it isn't BGZF compressed
+        """
+        self.path = path
+        self.names = names
+        self.entries = entries
+        self.blocks = blocks
+        # uncompressed offset of every block, to find the block of an offset by bisection
+        self.block_starts = None if blocks is None else [block[1] for block in blocks]
+        self.compressed = is_gzip(path)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def fetch(self, name: str, encoding: str = 'utf-8') -> str:
+        """ Read one record
+
+        Parameters
+        ----------
+        name : str
+            Record name, the first word of its header
+        encoding : str
+            Encoding of the sequence
+
+        Returns
+        -------
+        str
+            Sequence
+        """
+        length, offset, line_bases, line_width = self.entries[name]
+        if length == 0:
+            return ''
+        if line_bases == 0:
+            raise ValueError(name + " in " + self.path + " has lines of different lengths and can't be read by offset")
+        # full lines, then the last partial one
+        size: int = length // line_bases * line_width + length % line_bases
+        data: bytes = self.read(offset, size)
+        return data.replace(b'\n', b'').replace(b'\r', b'').decode(encoding)
+
+    def read(self, offset: int, size: int) -> bytes:
+        """ Read bytes of the uncompressed file
+
+        Parameters
+        ----------
+        offset : int
+            Uncompressed offset
+        size : int
+            Number of bytes
+
+        Returns
+        -------
+        bytes
+        """
+        f: BinaryIO
+        if not self.compressed:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                return f.read(size)
+        if self.blocks is None:
+            with gzip.open(self.path, 'rb') as f:
+                f.seek(offset)
+                return f.read(size)
+        # last block starting at or before the offset
+        i: int = bisect.bisect_right(self.block_starts, offset) - 1
+        parts: List[bytes] = []
+        have: int = 0
+        skip: int = offset - self.blocks[i][1]
+        with open(self.path, 'rb') as f:
+            file_size: int = os.fstat(f.fileno()).st_size
+            f.seek(self.blocks[i][0])
+            while have < skip + size:
+                block_end: int = self.blocks[i + 1][0] if i + 1 < len(self.blocks) else file_size
+                block: bytes = f.read(block_end - self.blocks[i][0])
+                if not block:
+                    break
+                # each block is a complete gzip member
+                data: bytes = zlib.decompress(block, 31)
+                parts.append(data)
+                have += len(data)
+                i += 1
+                if i >= len(self.blocks):
+                    break
+        return b''.join(parts)[skip:skip + size]
+
+    def save(self):
+        """ Write the .fai index next to the FASTA file, and the .gzi block index of BGZF files
+
+        """
+        fout: TextIO
+        with open(self.path + '.fai', 'w') as fout:
+            name: str
+            for name in self.names:
+                fout.write(name + '\t' + '\t'.join(str(value) for value in self.entries[name]) + '\n')
+        if self.blocks is not None:
+            gzout: BinaryIO
+            with open(self.path + '.gzi', 'wb') as gzout:
+                # like bgzip, without the first block at 0, 0
+                gzout.write(struct.pack('<Q', len(self.blocks) - 1))
+                for compressed, uncompressed in self.blocks[1:]:
+                    gzout.write(struct.pack('<QQ', compressed, uncompressed))
+
+
+def build_fasta_index(filepath) -> FastaIndex:
+    """ Index the records of a FASTA file by the first word of their headers
+
+    Parameters
+    ----------
+    filepath
+        FASTA file, plain, gzip or BGZF compressed
+
+    Returns
+    -------
+    FastaIndex
+    """
+    names: List[str] = []
+    entries: Dict[str, FaiEntry] = {}
+    fin: BinaryIO
+    with open_fasta(filepath) as fin:
+        header: str
+        entry: FaiEntry
+        for header, _, entry in scan_fasta(fin, with_seqs=False):
+            name: str = header.split()[0] if header.split() else ''
+            if name in entries:
+                raise ValueError("Duplicate record name " + name + " in " + str(filepath))
+            names.append(name)
+            entries[name] = entry
+    return FastaIndex(str(filepath), names, entries, bgzf_blocks(filepath) if is_bgzf(filepath) else None)
+
+
+def load_fasta_index(filepath) -> FastaIndex:
+    """ Read the .fai (and .gzi) index of a FASTA file
+
+    Parameters
+    ----------
+    filepath
+        FASTA file
+
+    Returns
+    -------
+    FastaIndex
+    """
+    names: List[str] = []
+    entries: Dict[str, FaiEntry] = {}
+    fin: TextIO
+    with open(str(filepath) + '.fai', 'r') as fin:
+        line: str
+        for line in fin:
+            fields: List[str] = line.rstrip('\n').split('\t')
+            names.append(fields[0])
+            entries[fields[0]] = (int(fields[1]), int(fields[2]), int(fields[3]), int(fields[4]))
+    blocks: Optional[List[Tuple[int, int]]] = None
+    if is_bgzf(filepath):
+        if os.path.exists(str(filepath) + '.gzi'):
+            f: BinaryIO
+            with open(str(filepath) + '.gzi', 'rb') as f:
+                count: int = struct.unpack('<Q', f.read(8))[0]
+                blocks = [(0, 0)] + [struct.unpack('<QQ', f.read(16)) for _ in range(count)]
+        else:
+            blocks = bgzf_blocks(filepath)
+    return FastaIndex(str(filepath), names, entries, blocks)
+
+
+def get_fasta_index(filepath) -> FastaIndex:
+    """ Load the index of a FASTA file, building and saving it if it is missing or older than the file
+
+    Parameters
+    ----------
+    filepath
+        FASTA file
+
+    Returns
+    -------
+    FastaIndex
+    """
+    fai: str = str(filepath) + '.fai'
+    if os.path.exists(fai) and os.stat(fai).st_mtime_ns >= os.stat(str(filepath)).st_mtime_ns:
+        return load_fasta_index(filepath)
+    index: FastaIndex = build_fasta_index(filepath)
+    try:
+        index.save()
+    except OSError:
+        # read-only directory, the index is only kept in memory
+        pass
+    return index
@@ -1,10 +1,57 @@
-import tensorflow as tf
-from keras import backend as K
+import numpy as np
 
 
 def aa_acc(prots_oh, reconstructed):
+    import tensorflow as tf
+    from keras import backend as K
     x, fx = K.argmax(prots_oh, axis=-1), K.argmax(reconstructed, axis=-1)
     non_dash_mask = tf.greater(x, 0)
     aa_acc = K.sum(tf.cast(tf.boolean_mask(K.equal(x, fx), non_dash_mask), 'float32'))
     aa_acc /= K.sum(tf.cast(non_dash_mask, 'float32'))
     return aa_acc
+
+
+def reconstruction_acc(x: np.ndarray, reconstructed: np.ndarray, ignore_gaps: bool = False) -> np.ndarray:
+    """ Fraction of the positions of each sequence that a network reconstructs correctly
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        Letter indices of the sequences, ... x length
+    reconstructed : numpy.ndarray
+        Network output, ... x length x alphabet size
+    ignore_gaps : bool
+        Only count the positions that aren't gaps in x, like aa_acc
+
+    Returns
+    -------
+    numpy.ndarray
+        Accuracy of each sequence, ... shape
+    """
+    correct: np.ndarray = x == np.argmax(reconstructed, axis=-1)
+    if not ignore_gaps:
+        return correct.mean(axis=-1)
+    non_dash_mask: np.ndarray = x > 0
+    with np.errstate(invalid='ignore'):
+        # sequences made only of gaps get nan
+        return (correct & non_dash_mask).sum(axis=-1) / non_dash_mask.sum(axis=-1)
+
+
+def merge_scores(max_acc: np.ndarray, chosen_family: np.ndarray, acc: np.ndarray, order: np.ndarray):
+    """ Combine the results of score_families for two sets of families, as if they were scored together in search order
+
+    Parameters
+    ----------
+    max_acc : numpy.ndarray
+        Best accuracy of each sequence, updated
+    chosen_family : numpy.ndarray
+        Search order position of the family that reached it, updated
+    acc : numpy.ndarray
+        Best accuracy of each sequence over the other families
+    order : numpy.ndarray
+        Search order position of the family that reached it
+    """
+    # the highest accuracy wins and ties go to the family that comes first in the search order
+    better: np.ndarray = (acc > max_acc) | ((acc == max_acc) & (order >= 0) & (order < chosen_family))
+    max_acc[better] = acc[better]
+    chosen_family[better] = order[better]
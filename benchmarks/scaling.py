@@ -0,0 +1,415 @@
+""" Search and comparison times on synthetic protein family libraries
+
+Generates latent space libraries of 10^3 to 10^6 families, packed like Latent_spaces.npy, and times ``compare``,
+``search lat`` with a single query and with a batch of queries for every metric in CLI.get_metric, and ``search seq``
+against small synthetic Keras networks (skipped when Keras isn't installed). The libraries live in a temporary
+directory and replace the bundled one only inside this process.
+
+The results are written as JSON. Given a baseline written by an earlier run with the same settings (the output options
+aside), every case that got slower by more than the tolerance is reported, and the exit status is 1.
+
+    python benchmarks/scaling.py [--sizes N ...] [--metrics NAME ...] [--out results.json] [--baseline baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, TextIO
+
+import numpy as np
+
+root: Path = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from CLI import ls_store  # noqa: E402
+from CLI.get_metric import Metric, metric_registry  # noqa: E402
+
+results_version: int = 1
+
+# latent space dimensions of the bundled families
+dims: int = 30
+
+# rows generated at once, bounds the memory used to write the larger libraries
+write_rows: int = 1 << 16
+
+# amino acids the synthetic sequences are drawn from
+aa_letters: str = 'ACDEFGHIKLMNPQRSTVWY'
+
+# slowdowns shorter than this are noise, whatever the ratio
+min_seconds: float = 0.002
+
+# settings that don't change what is timed, every other one must match the baseline's
+output_settings: List[str] = ['out', 'baseline', 'tolerance']
+
+
+def best_time(run: Callable[[], object], repeat: int) -> float:
+    """
+
+    Parameters
+    ----------
+    run : function
+        Code to time
+    repeat : int
+        Number of runs
+
+    Returns
+    -------
+    float
+        Fastest run in seconds
+    """
+    best: float = float('inf')
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def family_names(n: int) -> List[str]:
+    return ['FAM' + format(i, '07d') for i in range(n)]
+
+
+def synthetic_store(n: int, directory: Path, seed: int) -> ls_store.LSStore:
+    """ Write a packed latent space store of random families and open it
+
+    Parameters
+    ----------
+    n : int
+        Number of families
+    directory : pathlib.Path
+        Directory to write the store to
+    seed : int
+        Random seed, the same seed gives the same library
+
+    Returns
+    -------
+    CLI.ls_store.LSStore
+    """
+    rng: np.random.RandomState = np.random.RandomState(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    vectors: np.ndarray = np.lib.format.open_memmap(str(directory / ls_store.store_filename), mode='w+', dtype=np.float64, shape=(n, dims))
+    start: int
+    for start in range(0, n, write_rows):
+        rows: int = min(write_rows, n - start)
+        # latent spaces are mostly small, with a few larger dimensions
+        vectors[start:start + rows] = rng.standard_normal((rows, dims)) * rng.gamma(2.0, 0.5, dims)
+    vectors.flush()
+    names: List[str] = family_names(n)
+    # not built from latent space files
+    ls_store.write_names(directory, [ls_store.content_digest(names, np.asarray(vectors)), 'synthetic', 'synthetic'], names)
+    del vectors
+    return ls_store.open_store(directory)
+
+
+def time_compare(store: ls_store.LSStore, repeat: int, seed: int) -> Dict[str, float]:
+    """ compare two families, the first time in this process and after
+
+    No distance matrix is saved for the synthetic libraries (only ``python -m CLI.ls_distances`` builds one), so both
+    compute the distance from the latent spaces. The first run also reads the two families from the newly opened store
+
+    Parameters
+    ----------
+    store : CLI.ls_store.LSStore
+        Library in use
+    repeat : int
+        Runs of the warm comparison
+    seed : int
+        Random seed picking the families
+
+    Returns
+    -------
+    Dict[str, float]
+        Seconds by case
+    """
+    from CLI.CompareLS import CompareLS
+    from CLI.LSVector import LSVector
+    rng: np.random.RandomState = np.random.RandomState(seed)
+    a, b = (store.names[i] for i in rng.choice(len(store), 2, replace=False))
+    metric: Metric = metric_registry['euclidean']
+    first: float = best_time(lambda: CompareLS([LSVector(a), LSVector(b)], metric, 2), 1)
+    return {'compare first': first, 'compare': best_time(lambda: CompareLS([LSVector(a), LSVector(b)], metric, 2), repeat)}
+
+
+def time_search_lat(store: ls_store.LSStore, metrics: List[str], queries: int, p_norm: int, repeat: int, seed: int) -> Dict[str, float]:
+    """ search lat with one query and with a batch of queries, for each metric
+
+    Parameters
+    ----------
+    store : CLI.ls_store.LSStore
+        Library in use
+    metrics : List[str]
+        Names of the metrics
+    queries : int
+        Number of latent spaces in the batch
+    p_norm : int
+        The p-norm to apply for Minkowski
+    repeat : int
+        Runs per case, the first one, which prepares the library for the metric, isn't counted
+    seed : int
+        Random seed of the queries
+
+    Returns
+    -------
+    Dict[str, float]
+        Seconds by case
+    """
+    from CLI.SearchLS import closest_families
+    from CLI.LSVector import LSVector
+    rng: np.random.RandomState = np.random.RandomState(seed)
+    batch: List[LSVector] = [LSVector('query' + str(i), v) for i, v in enumerate(rng.standard_normal((queries, dims)))]
+    times: Dict[str, float] = {}
+    name: str
+    for name in metrics:
+        metric: Metric = metric_registry[name]
+        times['search lat ' + name + ' first'] = best_time(lambda: closest_families(batch[:1], metric, p_norm), 1)
+        times['search lat ' + name] = best_time(lambda: closest_families(batch[:1], metric, p_norm), repeat)
+        times['search lat ' + name + ' batch'] = best_time(lambda: closest_families(batch, metric, p_norm), repeat)
+    return times
+
+
+def synthetic_networks(n: int, directory: Path, hidden: int, seed: int) -> Dict[str, int]:
+    """ Save small random autoencoders in the format of the trained networks: <family>.json and <family>_weights.h5
+
+    Each takes a one hot encoded sequence of its size, flattened to size * 21 floats, and returns as many
+
+    Parameters
+    ----------
+    n : int
+        Number of families
+    directory : pathlib.Path
+        Directory to write the networks to
+    hidden : int
+        Units of the hidden layer
+    seed : int
+        Random seed
+
+    Returns
+    -------
+    Dict[str, int]
+        Size of each family
+    """
+    import keras
+    from keras import backend as K
+    rng: np.random.RandomState = np.random.RandomState(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    # a few sizes, so some families share an architecture as the trained networks do
+    sizes: Dict[str, int] = {name: int(size) for name, size in zip(family_names(n), rng.choice(np.arange(150, 451, 50), n))}
+    name: str
+    for name, size in sizes.items():
+        model: keras.Model = keras.models.Sequential([keras.layers.Dense(hidden, activation='relu', input_shape=(size * 21,)),
+                                                      keras.layers.Dense(size * 21, activation='sigmoid')])
+        model.set_weights([rng.standard_normal(w.shape).astype(w.dtype) * 0.1 for w in model.get_weights()])
+        jfile: TextIO
+        with open(directory / (name + '.json'), 'w') as jfile:
+            jfile.write(model.to_json())
+        model.save_weights(str(directory / (name + '_weights.h5')))
+        # keeps the graph from growing with every network
+        K.clear_session()
+    return sizes
+
+
+def time_search_seq(n: int, directory: Path, queries: int, hidden: int, repeat: int, seed: int) -> Dict[str, float]:
+    """ search seq against synthetic networks, read from their files and from the packed network store
+
+    Parameters
+    ----------
+    n : int
+        Number of families
+    directory : pathlib.Path
+        Directory to write the networks to
+    queries : int
+        Number of sequences searched together
+    hidden : int
+        Units of the hidden layer of the networks
+    repeat : int
+        Runs of the warm searches
+    seed : int
+        Random seed
+
+    Returns
+    -------
+    Dict[str, float]
+        Seconds by case
+    """
+    from CLI import SearchSQ, family_catalog, network_store
+    from CLI.model_cache import ModelCache, SharedModels
+    networks_dir: Path = directory / 'Trained_networks'
+    sizes: Dict[str, int] = synthetic_networks(n, networks_dir, hidden, seed)
+    rng: np.random.RandomState = np.random.RandomState(seed)
+    lseqs: List[str] = [''.join(rng.choice(list(aa_letters), rng.randint(100, 150))) for _ in range(queries)]
+    names: List[str] = ['seq' + str(i) for i in range(queries)]
+
+    def use_networks():
+        # fresh caches, and a catalog of the synthetic families that is never saved
+        SearchSQ.networks_path = networks_dir
+        SearchSQ.networks_extracted.cache_clear()
+        SearchSQ.family_architecture.cache_clear()
+        SearchSQ.shared_models = SharedModels(SearchSQ.keras.models.model_from_json)
+        SearchSQ.model_cache = ModelCache(SearchSQ.load_weights, SearchSQ.cache_models, SearchSQ.cache_mb * 2 ** 20)
+        network_store._store, network_store._store_dir = None, None
+        order: np.ndarray = np.argsort([sizes[name] for name in sizes], kind='stable')
+        catalog_names: np.ndarray = np.array(list(sizes), dtype=str)[order]
+        family_catalog._catalog = family_catalog.FamilyCatalog(
+            catalog_names, np.array([sizes[name] for name in catalog_names], dtype=np.int64), order.astype(np.int64),
+            np.zeros(n, dtype=bool), np.ones(n, dtype=bool), '', SearchSQ.network_source())
+
+    SearchSQ.no_pbar = True
+    times: Dict[str, float] = {}
+    use_networks()
+    times['search seq files first'] = best_time(lambda: SearchSQ.search_sequences(names, lseqs=lseqs), 1)
+    times['search seq files'] = best_time(lambda: SearchSQ.search_sequences(names, lseqs=lseqs), repeat)
+    network_store.build_store(networks_dir, False)
+    use_networks()
+    times['search seq store first'] = best_time(lambda: SearchSQ.search_sequences(names, lseqs=lseqs), 1)
+    times['search seq store'] = best_time(lambda: SearchSQ.search_sequences(names, lseqs=lseqs), repeat)
+    return times
+
+
+def environment() -> Dict[str, str]:
+    """
+
+    Returns
+    -------
+    Dict[str, str]
+        Versions and machine the results were measured with
+    """
+    import scipy
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(), 'cpus': str(os.cpu_count())}
+
+
+def compare_results(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """ Cases slower than in the baseline
+
+    Parameters
+    ----------
+    results : Dict[str, Dict[str, float]]
+        Seconds by library size and case
+    baseline : Dict[str, Dict[str, float]]
+        Seconds by library size and case of the baseline
+    tolerance : float
+        Allowed slowdown, 0.2 for 20%
+
+    Returns
+    -------
+    List[str]
+        One line per regression
+    """
+    regressions: List[str] = []
+    size: str
+    for size, cases in results.items():
+        case: str
+        for case, seconds in cases.items():
+            old: Optional[float] = baseline.get(size, {}).get(case)
+            if old is not None and seconds > old * (1 + tolerance) and seconds - old > min_seconds:
+                regressions.append(format(case, '<36') + format('n=' + size, '<10') + format(1000 * old, '10.2f') + ' ms -> ' +
+                                   format(1000 * seconds, '.2f') + ' ms (+' + format(100 * (seconds / old - 1), '.0f') + '%)')
+    return regressions
+
+
+def changed_settings(settings: dict, baseline: dict) -> List[str]:
+    """ Settings that change the timed workload and differ from the baseline's
+
+    Parameters
+    ----------
+    settings : dict
+        Settings of this run
+    baseline : dict
+        Settings of the baseline run
+
+    Returns
+    -------
+    List[str]
+        One line per setting
+    """
+    changed: List[str] = []
+    name: str
+    for name in sorted(set(settings) | set(baseline)):
+        if name not in output_settings and settings.get(name) != baseline.get(name):
+            changed.append(name + ': ' + json.dumps(baseline.get(name)) + ' in the baseline, ' + json.dumps(settings.get(name)) + ' now')
+    return changed
+
+
+def main():
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Time compare, search lat and search seq on synthetic libraries')
+    parser.add_argument('--sizes', help="Library sizes. Default: %(default)s", nargs='+', type=int, default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--metrics', help="Metrics searched with. Default: every metric", nargs='+', choices=list(metric_registry),
+                        default=list(metric_registry))
+    parser.add_argument('--queries', help="Latent spaces in a batch search. Default: %(default)s", type=int, default=100)
+    parser.add_argument('-p', help="The p-norm to apply for Minkowski. Default: %(default)s", dest="p_norm", type=int, default=3)
+    parser.add_argument('--seq-sizes', help="Numbers of synthetic networks searched by search seq, none to skip it. Default: %(default)s",
+                        dest="seq_sizes", nargs='*', type=int, default=[10, 100])
+    parser.add_argument('--seq-queries', help="Sequences searched together. Default: %(default)s", dest="seq_queries", type=int, default=32)
+    parser.add_argument('--hidden', help="Hidden units of the synthetic networks. Default: %(default)s", type=int, default=32)
+    parser.add_argument('--repeat', help="Runs per case, the fastest one is kept. Default: %(default)s", type=int, default=3)
+    parser.add_argument('--seed', help="Random seed of the libraries and queries. Default: %(default)s", type=int, default=0)
+    parser.add_argument('--out', help="JSON file to write the results to", type=str, default=None)
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare with", type=str, default=None)
+    parser.add_argument('--tolerance', help="Slowdown reported as a regression. Default: %(default)s", type=float, default=0.2)
+    args: argparse.Namespace = parser.parse_args()
+
+    baseline: Optional[dict] = None
+    if args.baseline is not None:
+        # checked before the run, which takes minutes
+        inf: TextIO
+        with open(args.baseline) as inf:
+            baseline = json.load(inf)
+        if baseline.get('version') != results_version:
+            sys.exit(args.baseline + " was written by another version of this benchmark")
+        changed: List[str] = changed_settings(vars(args), baseline.get('settings', {}))
+        if changed:
+            sys.exit(args.baseline + " timed another workload, run with its settings to compare with it:\n  " + '\n  '.join(changed))
+
+    results: Dict[str, Dict[str, float]] = {}
+    seq_results: Dict[str, Dict[str, float]] = {}
+    tmp: str
+    with tempfile.TemporaryDirectory(prefix='compbiolab-bench-') as tmp:
+        n: int
+        for n in args.sizes:
+            store: ls_store.LSStore = synthetic_store(n, Path(tmp) / ('ls_' + str(n)), args.seed)
+            # replaces the bundled library in this process
+            ls_store._store = store
+            results[str(n)] = time_compare(store, args.repeat, args.seed)
+            results[str(n)].update(time_search_lat(store, args.metrics, args.queries, args.p_norm, args.repeat, args.seed))
+            ls_store._store = None
+            del store
+            case: str
+            for case, seconds in results[str(n)].items():
+                print(format(case, '<36') + format('n=' + str(n), '<10') + format(1000 * seconds, '10.2f') + ' ms')
+        seq_sizes: List[int] = args.seq_sizes
+        if seq_sizes:
+            try:
+                import keras  # noqa: F401
+            except ImportError:
+                print("search seq skipped: Keras isn't installed")
+                seq_sizes = []
+        for n in seq_sizes:
+            seq_results[str(n)] = time_search_seq(n, Path(tmp) / ('seq_' + str(n)), args.seq_queries, args.hidden, args.repeat, args.seed)
+            for case, seconds in seq_results[str(n)].items():
+                print(format(case, '<36') + format('n=' + str(n), '<10') + format(1000 * seconds, '10.2f') + ' ms')
+
+    output: dict = {'version': results_version, 'environment': environment(), 'settings': vars(args),
+                    'lat': results, 'seq': seq_results}
+    outf: TextIO
+    if args.out is not None:
+        with open(args.out, 'w') as outf:
+            json.dump(output, outf, indent=1)
+
+    if baseline is not None:
+        if baseline.get('environment') != output['environment']:
+            print("The baseline was measured on another machine or with other versions: " + json.dumps(baseline.get('environment')))
+        regressions: List[str] = (compare_results(results, baseline.get('lat', {}), args.tolerance) +
+                                  compare_results(seq_results, baseline.get('seq', {}), args.tolerance))
+        print(str(len(regressions)) + " regressions against " + args.baseline)
+        line: str
+        for line in regressions:
+            print('  ' + line)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+""" Start-up time of the command line entry points
+
+Measures the cumulative import time reported by ``python -X importtime`` for each entry point module, and the wall time
+of a few commands that should never load scipy, pandas or TensorFlow. Exits with status 1 if any of them is over budget.
+
+    python benchmarks/startup.py [--budget MS] [--repeat N]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+root: Path = Path(__file__).resolve().parent.parent
+
+# entry point modules, checked with -X importtime
+modules: List[str] = ['CLI.client', 'CLI.search', 'CLI.compare']
+
+# commands timed end to end, run in this process' interpreter with the search server bypassed
+commands: Dict[str, List[str]] = {
+    'search --help': ['-m', 'CLI.search', '--help'],
+    'search list': ['-m', 'CLI.search', 'list'],
+    'compare --help': ['-m', 'CLI.compare', '--help'],
+}
+
+# modules that mustn't be imported by the commands above
+heavy_modules: List[str] = ['scipy', 'pandas', 'tensorflow']
+
+importtime_line: re.Pattern = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def import_time(module: str) -> Tuple[float, List[str]]:
+    """ Import a module in a fresh interpreter
+
+    Parameters
+    ----------
+    module : str
+        Module to import
+
+    Returns
+    -------
+    Tuple[float, List[str]]
+        Cumulative import time of the module in ms, heavy modules it imported
+    """
+    result: subprocess.CompletedProcess = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                                                         cwd=str(root), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                                         universal_newlines=True, check=True)
+    total: float = 0
+    heavy: List[str] = []
+    line: str
+    for line in result.stderr.splitlines():
+        match = importtime_line.match(line)
+        if match is None:
+            continue
+        name: str = match.group(4)
+        if name == module:
+            total = int(match.group(2)) / 1000
+        if name.split('.')[0] in heavy_modules and name.split('.')[0] not in heavy:
+            heavy.append(name.split('.')[0])
+    return total, heavy
+
+
+def wall_time(argv: List[str], repeat: int) -> float:
+    """ Best wall time of a command
+
+    Parameters
+    ----------
+    argv : List[str]
+        Interpreter arguments
+    repeat : int
+        Number of runs
+
+    Returns
+    -------
+    float
+        Fastest run in ms
+    """
+    env: dict = dict(os.environ, COMPBIOLAB_NO_SERVER='1')
+    best: float = float('inf')
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        subprocess.run([sys.executable] + argv, cwd=str(root), stdout=subprocess.DEVNULL, env=env, check=True)
+        best = min(best, time.perf_counter() - start)
+    return 1000 * best
+
+
+def main():
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description='Check the start-up time of the entry points against a budget')
+    parser.add_argument('--budget', help="Import time budget per module in ms. Default: %(default)s", type=float, default=100)
+    parser.add_argument('--command-budget', help="Wall time budget per command in ms, interpreter start-up included. Default: %(default)s",
+                        type=float, default=250)
+    parser.add_argument('--repeat', help="Runs per command, the fastest one is kept. Default: %(default)s", type=int, default=5)
+    args: argparse.Namespace = parser.parse_args()
+
+    over: bool = False
+    module: str
+    for module in modules:
+        ms, heavy = import_time(module)
+        failed: bool = ms > args.budget or bool(heavy)
+        over = over or failed
+        print(format(module, '<20') + format(ms, '8.1f') + ' ms import' + (' imports ' + ', '.join(heavy) if heavy else '') +
+              ('  OVER BUDGET' if failed else ''))
+    name: str
+    for name, argv in commands.items():
+        ms = wall_time(argv, args.repeat)
+        failed = ms > args.command_budget
+        over = over or failed
+        print(format(name, '<20') + format(ms, '8.1f') + ' ms wall' + ('  OVER BUDGET' if failed else ''))
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+""" CLI.SearchSQ for tests that stub the trained networks, importable where Keras isn't installed """
+import importlib
+import sys
+import types
+from typing import Iterator, List
+import numpy as np
+import pytest
+
+import CLI
+
+
+class FakeNetwork:
+    """ Reconstructs a one-hot sequence with fixed noise per family, so each family scores each sequence differently """
+    seed: int
+    calls: List[int]
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        # batch size of every predict_on_batch call
+        self.calls = []
+
+    def predict_on_batch(self, x: np.ndarray) -> np.ndarray:
+        self.calls.append(len(x))
+        noise: np.ndarray = np.random.RandomState(self.seed).rand(x.shape[1]).astype(np.float32)
+        return x * 0.5 + noise * 0.6
+
+
+def stand_in(monkeypatch, name: str) -> types.ModuleType:
+    module: types.ModuleType = types.ModuleType(name)
+    monkeypatch.setitem(sys.modules, name, module)
+    return module
+
+
+@pytest.fixture
+def search_sq(monkeypatch) -> Iterator[types.ModuleType]:
+    """ CLI.SearchSQ, with stand-ins for Keras and silence_tensorflow if they aren't installed. Networks must be stubbed """
+    if 'CLI.SearchSQ' in sys.modules:
+        yield sys.modules['CLI.SearchSQ']
+        return
+    try:
+        import keras
+    except ImportError:
+        keras = stand_in(monkeypatch, 'keras')
+        keras.Model = object
+        keras.models = stand_in(monkeypatch, 'keras.models')
+        # the tests stub the networks instead
+        keras.models.model_from_json = None
+    try:
+        import silence_tensorflow.auto
+    except ImportError:
+        stand_in(monkeypatch, 'silence_tensorflow').auto = stand_in(monkeypatch, 'silence_tensorflow.auto')
+    yield importlib.import_module('CLI.SearchSQ')
+    # imported again by the next test, with the same stand-ins
+    del sys.modules['CLI.SearchSQ']
+    delattr(CLI, 'SearchSQ')
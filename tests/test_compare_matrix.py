@@ -0,0 +1,76 @@
+""" compare --rows --cols: the distance matrix streamed tile by tile to .npy or HDF5 """
+from pathlib import Path
+from typing import List
+import numpy as np
+import pytest
+from scipy.spatial import distance
+
+from CLI import ls_store
+from CLI.CompareLSMatrix import CompareLSMatrix
+from CLI.get_metric import Metric, get_distance_function
+from CLI.ls_store import LSStore
+
+ROWS: List[str] = ['F' + str(i) for i in range(0, 26, 2)]
+COLS: List[str] = ['F' + str(i) for i in range(25, 0, -2)] + ['F0']
+
+
+@pytest.fixture
+def store(tmp_path: Path, monkeypatch) -> LSStore:
+    rng: np.random.RandomState = np.random.RandomState(0)
+    vectors: np.ndarray = rng.randn(26, 30)
+    # boolean metrics see the signs
+    vectors[:, ::3] = np.maximum(vectors[:, ::3], 0)
+    ls_data: LSStore = LSStore(['F' + str(i) for i in range(26)], vectors)
+    monkeypatch.setattr(ls_store, '_store', ls_data)
+    return ls_data
+
+
+def expected(store: LSStore, rows: List[str], cols: List[str], metric: Metric, p_norm: int) -> np.ndarray:
+    return metric.exact_distances(store.vectors[[store.index[name] for name in rows]],
+                                  store.vectors[[store.index[name] for name in cols]], p_norm)
+
+
+# 13 x 14: tiles that don't divide either side, one tile, and one row or column at a time
+@pytest.mark.parametrize('tile_size', [1, 4, 5, 13, 1024])
+def test_tiles_match_cdist(store: LSStore, tmp_path: Path, tile_size: int):
+    metric: Metric = get_distance_function('euclidean')
+    matrix: np.ndarray = np.full((len(ROWS), len(COLS)), np.nan)
+    covered: np.ndarray = np.zeros(matrix.shape, dtype=int)
+    compare: CompareLSMatrix = CompareLSMatrix('rows.txt', ROWS, 'cols.txt', COLS, metric, 2, str(tmp_path / 'm.npy'), tile_size)
+    for row_slice, col_slice, tile in compare.tiles():
+        assert tile.shape == (row_slice.stop - row_slice.start, col_slice.stop - col_slice.start)
+        assert tile.shape[0] <= tile_size and tile.shape[1] <= tile_size
+        matrix[row_slice, col_slice] = tile
+        covered[row_slice, col_slice] += 1
+    assert (covered == 1).all()
+    np.testing.assert_array_equal(matrix, distance.cdist(store.vectors[0:26:2], store.vectors[[*range(25, 0, -2), 0]]))
+
+
+@pytest.mark.parametrize('name,p_norm', [('euclidean', 2), ('minkowski', 3), ('cosine', 2), ('jaccard', 2), ('dice', 2)])
+def test_npy(store: LSStore, tmp_path: Path, name: str, p_norm: int):
+    metric: Metric = get_distance_function(name)
+    # a latent space file among the rows
+    np.savetxt(str(tmp_path / 'new.txt'), np.random.RandomState(1).randn(30))
+    rows: List[str] = ROWS + [str(tmp_path / 'new.txt')]
+    CompareLSMatrix('rows.txt', rows, 'cols.txt', COLS, metric, p_norm, str(tmp_path / 'm.npy'), 4)
+    matrix: np.memmap = np.load(str(tmp_path / 'm.npy'), mmap_mode='r')
+    assert matrix.dtype == np.float64 and matrix.shape == (len(rows), len(COLS))
+    np.testing.assert_array_equal(matrix[:-1], expected(store, ROWS, COLS, metric, p_norm))
+    np.testing.assert_array_equal(matrix[-1], metric.exact_distances(np.loadtxt(str(tmp_path / 'new.txt'))[None],
+                                                                     store.vectors[[store.index[c] for c in COLS]], p_norm)[0])
+    assert (tmp_path / 'm_rows.txt').read_text().splitlines() == rows
+    assert (tmp_path / 'm_cols.txt').read_text().splitlines() == COLS
+
+
+def test_hdf5(store: LSStore, tmp_path: Path):
+    h5py = pytest.importorskip('h5py')
+    metric: Metric = get_distance_function('minkowski')
+    output: str = CompareLSMatrix('rows.txt', ROWS, 'cols.txt', COLS, metric, 3, str(tmp_path / 'm.h5'), 4).result.matrix_file
+    assert output == str(tmp_path / 'm.h5') and not (tmp_path / 'm_rows.txt').exists()
+    h5: h5py.File
+    with h5py.File(output, 'r') as h5:
+        np.testing.assert_array_equal(h5['distances'][()], expected(store, ROWS, COLS, metric, 3))
+        assert h5['distances'].chunks == (4, 4)
+        assert h5['distances'].attrs['metric'] == 'minkowski' and h5['distances'].attrs['p_norm'] == 3
+        assert [row.decode() if isinstance(row, bytes) else row for row in h5['rows'][()]] == ROWS
+        assert [col.decode() if isinstance(col, bytes) else col for col in h5['cols'][()]] == COLS
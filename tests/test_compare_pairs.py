@@ -0,0 +1,53 @@
+""" compare --pairs gives every pair the distance compare A B gives it """
+from pathlib import Path
+from typing import List, Tuple
+import numpy as np
+import pytest
+
+from CLI import ls_distances, ls_store, metrics
+from CLI.CompareLS import CompareLS
+from CLI.CompareLSPairs import CompareLSPairs
+from CLI.LSVector import LSVector
+from CLI.get_metric import Metric, get_distance_function
+from CLI.ls_store import LSStore
+
+
+@pytest.fixture
+def pairs(tmp_path: Path, monkeypatch) -> List[Tuple[str, str]]:
+    rng: np.random.RandomState = np.random.RandomState(0)
+    vectors: np.ndarray = rng.randn(40, 30)
+    # boolean metrics see the signs
+    vectors[:, ::3] = np.maximum(vectors[:, ::3], 0)
+    monkeypatch.setattr(ls_store, '_store', LSStore(['F' + str(i) for i in range(40)], vectors, directory=tmp_path))
+    monkeypatch.setattr(ls_distances, '_matrices', {})
+    np.savetxt(str(tmp_path / 'new.txt'), rng.randn(30))
+    names: List[str] = ['F' + str(i) for i in range(40)] + [str(tmp_path / 'new.txt')]
+    # repeated first names, both orders, and pairs of the same latent space
+    return [(names[i], names[j]) for i, j in rng.randint(0, len(names), (300, 2))] + [('F1', 'F2'), ('F2', 'F1'), ('F5', 'F5')]
+
+
+@pytest.mark.parametrize('p_norm', [2, 3])
+@pytest.mark.parametrize('name', metrics)
+def test_pairs_match_compare(pairs: List[Tuple[str, str]], name: str, p_norm: int):
+    metric: Metric = get_distance_function(name)
+    results: List[str] = CompareLSPairs(pairs, metric, p_norm).result.results
+    assert results == [CompareLS([LSVector(a), LSVector(b)], metric, p_norm).result.result for a, b in pairs]
+
+
+@pytest.mark.parametrize('name', ['euclidean', 'dice'])
+def test_pairs_match_the_saved_matrix(pairs: List[Tuple[str, str]], name: str):
+    metric: Metric = get_distance_function(name)
+    ls_distances.build_and_save(ls_store._store, metric, 2)
+    results: List[str] = CompareLSPairs(pairs, metric, 2).result.results
+    assert results == [CompareLS([LSVector(a), LSVector(b)], metric, 2).result.result for a, b in pairs]
+
+
+def test_pairs_in_chunks(pairs: List[Tuple[str, str]], monkeypatch):
+    metric: Metric = get_distance_function('cosine')
+    expected: List[str] = CompareLSPairs(pairs, metric, 2).result.results
+    monkeypatch.setattr('CLI.CompareLSPairs.chunk_size', 17)
+    assert CompareLSPairs(pairs, metric, 2).result.results == expected
+
+
+def test_no_pairs():
+    assert CompareLSPairs([], get_distance_function('euclidean'), 2).result.results == []
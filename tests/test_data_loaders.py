@@ -0,0 +1,60 @@
+""" Sequences encoded through the byte lookup table give the same one hot arrays as a letter by letter encoding """
+from typing import List
+import numpy as np
+import pytest
+
+from CLI.utils import aa_letters
+from CLI.utils.data_loaders import (InvalidSequenceError, encode_indices, indices_to_one_hot, seq_to_one_hot, to_indices,
+                                    to_one_hot)
+
+
+def one_hot_by_letter(seq: str, alphabet: List[str]) -> np.ndarray:
+    arr: np.ndarray = np.zeros((len(seq), len(alphabet)))
+    j: int
+    for j, c in enumerate(seq):
+        arr[j, alphabet.index(c)] = 1
+    return arr
+
+
+def test_every_letter():
+    seq: str = ''.join(aa_letters) * 3
+    np.testing.assert_array_equal(to_indices(seq), np.tile(np.arange(len(aa_letters)), 3))
+    np.testing.assert_array_equal(to_one_hot(seq), one_hot_by_letter(seq, list(aa_letters)))
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32, np.uint8])
+def test_batches_and_dtypes(dtype):
+    rng: np.random.RandomState = np.random.RandomState(0)
+    seqs: List[str] = [''.join(rng.choice(list(aa_letters), 50)) for _ in range(8)]
+    one_hot: np.ndarray = to_one_hot(seqs, dtype=dtype)
+    assert one_hot.dtype == dtype and one_hot.shape == (8, 50, len(aa_letters))
+    np.testing.assert_array_equal(one_hot, np.stack([one_hot_by_letter(seq, list(aa_letters)) for seq in seqs]))
+    np.testing.assert_array_equal(indices_to_one_hot(encode_indices(seqs), dtype=dtype), one_hot)
+
+
+def test_other_alphabets():
+    assert seq_to_one_hot('BAB', {'A': 0, 'B': 1}).tolist() == [[0, 1], [1, 0], [0, 1]]
+    assert to_indices('ba', ['a', 'b']).tolist() == [1, 0]
+
+
+def test_invalid_letters_are_all_reported():
+    err: InvalidSequenceError
+    with pytest.raises(InvalidSequenceError) as err:
+        encode_indices(['ACDX', 'ZĀCD'])
+    assert err.value.positions == [(0, 3), (1, 0), (1, 1)]
+    assert "'X' at position 4 of sequence 1" in str(err.value)
+    # still a ValueError for the callers that catch those
+    assert isinstance(err.value, ValueError)
+
+
+def test_many_invalid_letters_are_summarized():
+    err: InvalidSequenceError
+    with pytest.raises(InvalidSequenceError) as err:
+        to_indices('X' * 15)
+    assert len(err.value.positions) == 15 and str(err.value).endswith(' and 5 more')
+
+
+def test_lengths_must_match():
+    with pytest.raises(ValueError):
+        encode_indices(['ACD', 'AC'])
+    assert encode_indices([]).shape == (0, 0)
@@ -0,0 +1,106 @@
+""" The family catalog: sizes, search order and which families have a latent space or a trained network """
+import os
+import time
+from pathlib import Path
+from typing import List
+import numpy as np
+import pytest
+
+from CLI import family_catalog
+from CLI.family_catalog import FamilyCatalog, build_catalog, get_catalog, load_catalog
+
+
+@pytest.fixture
+def sources(tmp_path: Path, monkeypatch) -> Path:
+    # seq_lengths.csv isn't sorted by size, and sizes are tied
+    (tmp_path / 'seq_lengths.csv').write_text('name,size\nEEE,300\nBBB,100.0\nDDD,200\nAAA,200\nCCC,100\n')
+    (tmp_path / 'Latent_spaces').mkdir()
+    name: str
+    for name in ['AAA', 'CCC', 'ZZZ', 'YYY']:
+        (tmp_path / 'Latent_spaces' / (name + '.txt')).write_text('0.0\n' * 30)
+    monkeypatch.setattr(family_catalog, 's_length', tmp_path / 'seq_lengths.csv')
+    monkeypatch.setattr(family_catalog, 'lspath', tmp_path / 'Latent_spaces')
+    monkeypatch.setattr(family_catalog, 'catalog_file', lambda: tmp_path / 'store' / family_catalog.catalog_filename)
+    monkeypatch.setattr(family_catalog, '_catalog', None)
+    return tmp_path
+
+
+def test_sorted_by_size(sources: Path):
+    catalog: FamilyCatalog = build_catalog()
+    # families with only a latent space have size 0 and come first
+    assert catalog.names.tolist() == ['YYY', 'ZZZ', 'BBB', 'CCC', 'DDD', 'AAA', 'EEE']
+    assert catalog.sizes.tolist() == [0, 0, 100, 100, 200, 200, 300]
+    assert catalog.csv_names() == ['EEE', 'BBB', 'DDD', 'AAA', 'CCC']
+    assert catalog.latent_names() == ['AAA', 'CCC', 'YYY', 'ZZZ']
+    assert 'ZZZ' in catalog and 'FFF' not in catalog and len(catalog) == 7
+
+
+@pytest.mark.parametrize('slen', [0, 1, 100, 101, 200, 201, 300, 301])
+def test_fitting_in_csv_order(sources: Path, slen: int):
+    catalog: FamilyCatalog = build_catalog()
+    catalog.set_networks('networks 1', ['AAA', 'BBB', 'DDD', 'EEE', 'ZZZ'])
+    expected: List[str] = [name for name, size in [('EEE', 300), ('BBB', 100), ('DDD', 200), ('AAA', 200)] if size >= slen]
+    # ZZZ has a network but isn't in seq_lengths.csv
+    assert [name for name, _ in catalog.fitting(slen)] == expected
+    assert all(size >= slen for _, size in catalog.fitting(slen))
+
+
+def test_fitting_matches_a_linear_scan():
+    rng: np.random.RandomState = np.random.RandomState(0)
+    sizes: np.ndarray = np.sort(rng.randint(50, 500, 1000))
+    order: np.ndarray = rng.permutation(1000)
+    # families missing from seq_lengths.csv
+    order[rng.rand(1000) < 0.1] = -1
+    catalog: FamilyCatalog = FamilyCatalog(np.array(['F' + str(i) for i in range(1000)]), sizes, order, np.ones(1000, dtype=bool),
+                                           rng.rand(1000) < 0.8, '')
+    slen: int
+    for slen in [0, 50, 123, 300, 499, 500]:
+        rows: List[int] = sorted((i for i in range(1000) if sizes[i] >= slen and catalog.has_network[i] and order[i] >= 0),
+                                 key=lambda i: order[i])
+        assert catalog.fitting(slen) == [('F' + str(i), int(sizes[i])) for i in rows]
+
+
+def test_saved_and_reused(sources: Path, monkeypatch):
+    catalog: FamilyCatalog = get_catalog('networks 1', lambda: ['AAA'])
+    assert catalog.has_network.tolist() == [name == 'AAA' for name in catalog.names.tolist()]
+    saved: FamilyCatalog = load_catalog(family_catalog.catalog_file())
+    assert saved.names.tolist() == catalog.names.tolist() and saved.network_source == 'networks 1'
+    # a new process reads it and doesn't list the networks again
+    monkeypatch.setattr(family_catalog, '_catalog', None)
+    monkeypatch.setattr(family_catalog, 'build_catalog', None)
+    assert get_catalog('networks 1', None).has_network.tolist() == catalog.has_network.tolist()
+
+
+def test_networks_listed_again_when_they_change(sources: Path):
+    get_catalog('networks 1', lambda: ['AAA'])
+    assert [name for name, _ in get_catalog('networks 2', lambda: ['BBB', 'CCC']).fitting(0)] == ['BBB', 'CCC']
+
+
+def test_rebuilt_when_a_family_is_added(sources: Path, monkeypatch):
+    get_catalog()
+    (sources / 'Latent_spaces' / 'XXX.txt').write_text('0.0\n' * 30)
+    monkeypatch.setattr(family_catalog, '_catalog', None)
+    assert 'XXX' in get_catalog()
+
+
+def test_racy_catalog_checks_every_file(sources: Path, monkeypatch):
+    csv_file: Path = sources / 'seq_lengths.csv'
+    mtime: int = csv_file.stat().st_mtime_ns
+    assert get_catalog().directory_sources == family_catalog.racy
+    # edited within the same clock tick: the mtimes are as they were, the size isn't
+    csv_file.write_text('name,size\nEEE,300\nBBB,100.0\nDDD,200\nAAA,200\nCCC,100\nFFF,400\n')
+    os.utime(str(csv_file), ns=(mtime, mtime))
+    monkeypatch.setattr(family_catalog, '_catalog', None)
+    assert 'FFF' in get_catalog()
+
+
+def test_unchanged_directory_skips_the_file_check(sources: Path, monkeypatch):
+    old: int = time.time_ns() - 10 * family_catalog.racy_ns
+    path: Path
+    for path in [sources / 'seq_lengths.csv', sources / 'Latent_spaces']:
+        os.utime(str(path), ns=(old, old))
+    assert get_catalog().directory_sources == str(old) + ' ' + str(old)
+    monkeypatch.setattr(family_catalog, '_catalog', None)
+    monkeypatch.setattr(family_catalog, 'source_signature', None)
+    monkeypatch.setattr(family_catalog, 'build_catalog', None)
+    assert len(get_catalog()) == 7
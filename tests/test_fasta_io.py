@@ -0,0 +1,166 @@
+""" Reading FASTA files in chunks, and fetching records by name through .fai and .gzi indexes """
+import gzip
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import List, Tuple
+import pytest
+
+from CLI.utils import io
+from CLI.utils.io import FastaIndex, get_fasta_index, iter_fasta, load_fasta_index, read_fasta
+
+RECORDS: List[Tuple[str, str]] = [('seq1 first record', 'ACDEFGHIKLMNPQRSTVWY' * 7 + 'AC'),
+                                  ('seq2', ''),
+                                  ('seq3', 'MKV-LA' * 40),
+                                  ('seq4 last', 'W')]
+
+
+def fasta_text(records: List[Tuple[str, str]], width: int = 60) -> bytes:
+    lines: List[str] = []
+    header: str
+    seq: str
+    for header, seq in records:
+        lines.append('>' + header)
+        lines.extend(seq[i:i + width] for i in range(0, len(seq), width))
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def bgzip(data: bytes, block_size: int) -> bytes:
+    """ BGZF compress data, block_size uncompressed bytes per block, like bgzip with small blocks """
+    out: List[bytes] = []
+    start: int
+    for start in range(0, len(data), block_size):
+        chunk: bytes = data[start:start + block_size]
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        deflated: bytes = compressor.compress(chunk) + compressor.flush()
+        size: int = 12 + 6 + len(deflated) + 8
+        out.append(b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00' + struct.pack('<H', size - 1) +
+                   deflated + struct.pack('<II', zlib.crc32(chunk), len(chunk)))
+    # the empty end-of-file block
+    out.append(bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000'))
+    return b''.join(out)
+
+
+@pytest.fixture(params=['plain', 'gzip', 'bgzf'])
+def fasta(request, tmp_path: Path) -> Path:
+    data: bytes = fasta_text(RECORDS)
+    if request.param == 'plain':
+        path: Path = tmp_path / 'records.fasta'
+        path.write_bytes(data)
+    elif request.param == 'gzip':
+        path = tmp_path / 'records.fasta.gz'
+        path.write_bytes(gzip.compress(data))
+    else:
+        path = tmp_path / 'records.fasta.bgz'
+        path.write_bytes(bgzip(data, 50))
+    return path
+
+
+def test_iter_fasta(fasta: Path, monkeypatch):
+    # records span several chunks
+    monkeypatch.setattr(io, 'chunk_size', 16)
+    assert list(iter_fasta(fasta)) == RECORDS
+
+
+def test_read_fasta_leaves_out_empty_records(fasta: Path):
+    names, seqs = read_fasta(fasta)
+    assert names == ['seq1 first record', 'seq3', 'seq4 last']
+    assert seqs == [RECORDS[0][1], RECORDS[2][1], RECORDS[3][1]]
+
+
+def test_fetch_every_record(fasta: Path):
+    index: FastaIndex = get_fasta_index(fasta)
+    assert len(index) == 4 and 'seq1' in index and 'first' not in index
+    assert [index.fetch(name) for name in ['seq4', 'seq2', 'seq3', 'seq1']] == [RECORDS[3][1], '', RECORDS[2][1],
+                                                                                RECORDS[0][1]]
+
+
+def test_fai_matches_samtools(tmp_path: Path):
+    path: Path = tmp_path / 'records.fasta'
+    path.write_bytes(fasta_text(RECORDS))
+    get_fasta_index(path)
+    assert (tmp_path / 'records.fasta.fai').read_text().splitlines() == ['seq1\t142\t19\t60\t61',
+                                                                         'seq2\t0\t170\t0\t0',
+                                                                         'seq3\t240\t176\t60\t61',
+                                                                         'seq4\t1\t431\t1\t2']
+
+
+def test_gzi_lookups(tmp_path: Path):
+    path: Path = tmp_path / 'records.fasta.bgz'
+    data: bytes = fasta_text([('r' + str(i), 'ACDEFGHIKL' * (i % 13)) for i in range(200)])
+    path.write_bytes(bgzip(data, 37))
+    get_fasta_index(path)
+    count: int = struct.unpack('<Q', (tmp_path / 'records.fasta.bgz.gzi').read_bytes()[:8])[0]
+    # every block but the first, with the empty one at the end
+    assert count == -(-len(data) // 37)
+    index: FastaIndex = load_fasta_index(path)
+    assert index.block_starts == list(range(0, len(data), 37)) + [len(data)]
+    i: int
+    for i in range(200):
+        assert index.fetch('r' + str(i)) == 'ACDEFGHIKL' * (i % 13)
+    # every offset is found in its block
+    offset: int
+    for offset in range(0, len(data), 11):
+        assert index.read(offset, 50) == data[offset:offset + 50]
+
+
+def test_gzi_is_read_not_rebuilt(tmp_path: Path, monkeypatch):
+    path: Path = tmp_path / 'records.fasta.bgz'
+    path.write_bytes(bgzip(fasta_text(RECORDS), 50))
+    get_fasta_index(path)
+    monkeypatch.setattr(io, 'bgzf_blocks', None)
+    assert get_fasta_index(path).fetch('seq3') == RECORDS[2][1]
+    # without the .gzi the blocks are found by reading the block headers again
+    os.remove(str(path) + '.gzi')
+    monkeypatch.undo()
+    assert get_fasta_index(path).fetch('seq1') == RECORDS[0][1]
+
+
+def test_stale_index_is_rebuilt(tmp_path: Path):
+    path: Path = tmp_path / 'records.fasta'
+    path.write_bytes(fasta_text(RECORDS))
+    get_fasta_index(path)
+    path.write_bytes(fasta_text(RECORDS[2:]))
+    os.utime(str(path) + '.fai', ns=(0, 0))
+    assert len(get_fasta_index(path)) == 2
+
+
+def test_blank_lines_before_the_sequence(tmp_path: Path):
+    path: Path = tmp_path / 'records.fasta'
+    path.write_bytes(b'>a\n\n\nACDE\nAC\n>b\r\n\r\nKLMN\r\n>c\n\n>d\nWY\n')
+    index: FastaIndex = get_fasta_index(path)
+    assert (tmp_path / 'records.fasta.fai').read_text().splitlines() == ['a\t6\t5\t4\t5', 'b\t4\t19\t4\t6',
+                                                                         'c\t0\t28\t0\t0', 'd\t2\t32\t2\t3']
+    assert [index.fetch(name) for name in 'abcd'] == ['ACDEAC', 'KLMN', '', 'WY']
+
+
+def test_no_trailing_newline(tmp_path: Path):
+    path: Path = tmp_path / 'records.fasta'
+    path.write_bytes(b'>a\nACGT\nACGT\nAC\n>b\nACGT\nACGT\nAC')
+    index: FastaIndex = get_fasta_index(path)
+    # the same entries as samtools faidx
+    assert (tmp_path / 'records.fasta.fai').read_text().splitlines() == ['a\t10\t3\t4\t5', 'b\t10\t19\t4\t5']
+    assert [index.fetch(name) for name in 'ab'] == ['ACGTACGTAC', 'ACGTACGTAC']
+    path.write_bytes(b'>a\nACGT\nAC\n>b\nACG')
+    index = get_fasta_index(path)
+    assert (tmp_path / 'records.fasta.fai').read_text().splitlines() == ['a\t6\t3\t4\t5', 'b\t3\t14\t3\t4']
+    assert index.fetch('b') == 'ACG'
+
+
+def test_ragged_records_cant_be_fetched(tmp_path: Path):
+    path: Path = tmp_path / 'records.fasta'
+    path.write_bytes(b'>ragged\nACDE\nAC\nACDE\n>fine\nACDE\nAC\n')
+    index: FastaIndex = get_fasta_index(path)
+    assert index.fetch('fine') == 'ACDEAC'
+    with pytest.raises(ValueError):
+        index.fetch('ragged')
+    # still read whole
+    assert list(iter_fasta(path))[0] == ('ragged', 'ACDEACACDE')
+
+
+def test_duplicate_names_are_refused(tmp_path: Path):
+    path: Path = tmp_path / 'records.fasta'
+    path.write_bytes(b'>a one\nAC\n>a two\nDE\n')
+    with pytest.raises(ValueError):
+        get_fasta_index(path)
@@ -0,0 +1,75 @@
+""" k-mer counts and the family k-mer index used to prefilter sequence searches """
+import gzip
+import itertools
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+import pytest
+
+from CLI import kmer_index
+from CLI.kmer_index import KmerIndex, build_index, kmer_counts, load_index
+
+LETTERS: str = 'ACDEFGHIKLMNPQRSTVWY'
+
+
+def counts_by_kmer(seq: str, k: int) -> np.ndarray:
+    codes: Dict[str, int] = {''.join(kmer): i for i, kmer in enumerate(itertools.product(LETTERS, repeat=k))}
+    seq = seq.upper().replace('-', '')
+    counts: np.ndarray = np.zeros(20 ** k, dtype=np.int64)
+    i: int
+    for i in range(len(seq) - k + 1):
+        if seq[i:i + k] in codes:
+            counts[codes[seq[i:i + k]]] += 1
+    return counts
+
+
+@pytest.mark.parametrize('k', [1, 2, 3])
+def test_counts_match_a_kmer_by_kmer_count(k: int):
+    rng: np.random.RandomState = np.random.RandomState(k)
+    seq: str
+    for seq in [''.join(rng.choice(list(LETTERS + '-XB'), 200)), 'acd-EF', 'AC', '', 'XXXX']:
+        np.testing.assert_array_equal(kmer_counts(seq, k), counts_by_kmer(seq, k))
+
+
+@pytest.fixture
+def fasta_dir(tmp_path: Path) -> Path:
+    (tmp_path / 'AAA.fasta').write_text('>a1\nACDEFGHIK\n>a2\nACDEFG\n')
+    with gzip.open(str(tmp_path / 'BBB.fa.gz'), 'wt') as outf:
+        outf.write('>b1\nWYWYWYWY\n')
+    (tmp_path / 'CCC.fa').write_text('>c1\nMKVLA\n')
+    (tmp_path / 'notes.txt').write_text('not a family')
+    return tmp_path
+
+
+def test_build_save_and_load(fasta_dir: Path, tmp_path: Path):
+    index: KmerIndex = build_index(fasta_dir, 2)
+    assert index.names == ['AAA', 'BBB', 'CCC'] and index.k == 2
+    np.testing.assert_allclose(np.linalg.norm(index.profiles, axis=1), 1, rtol=1e-6)
+    expected: np.ndarray = counts_by_kmer('ACDEFGHIK', 2) + counts_by_kmer('ACDEFG', 2)
+    np.testing.assert_allclose(index.profiles[0], expected / np.linalg.norm(expected), rtol=1e-6)
+    index.save(tmp_path / 'index.npz')
+    loaded: KmerIndex = load_index(tmp_path / 'index.npz')
+    assert loaded.names == index.names and loaded.k == 2 and loaded.index['CCC'] == 2
+    np.testing.assert_array_equal(loaded.profiles, index.profiles)
+
+
+def test_similarity(fasta_dir: Path):
+    index: KmerIndex = build_index(fasta_dir, 2)
+    similarity: np.ndarray = index.similarity(['WYWYW', 'MKVLA', 'QQQ'])
+    assert similarity.shape == (3, 3)
+    assert similarity[0].argmax() == 1 and similarity[1, 2] == pytest.approx(1)
+    # no k-mer in common with any family
+    assert not similarity[2].any()
+
+
+def test_missing_index_exits(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(kmer_index, '_index', None)
+    with pytest.raises(SystemExit):
+        kmer_index.get_index(tmp_path / 'missing.npz')
+    with pytest.raises(SystemExit):
+        build_index(tmp_path)
+
+
+def test_family_names():
+    names: List[object] = [kmer_index.family_name(fname) for fname in ['A.fasta.gz', 'B.fa', 'C.fasta', 'D.fa.gz', 'E.txt']]
+    assert names == ['A', 'B', 'C', 'D', None]
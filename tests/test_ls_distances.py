@@ -0,0 +1,73 @@
+""" Saved distance matrices of compare: built on request only, and the same distances as the metric computes """
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+import pytest
+
+from CLI import ls_distances, ls_store
+from CLI.get_metric import Metric, get_distance_function
+from CLI.ls_distances import build_and_save, family_distance, get_distance_matrix
+from CLI.ls_store import LSStore
+
+
+@pytest.fixture
+def store(tmp_path: Path, monkeypatch) -> LSStore:
+    monkeypatch.setattr(ls_distances, '_matrices', {})
+    rng: np.random.RandomState = np.random.RandomState(0)
+    vectors: np.ndarray = rng.randn(300, 30)
+    # boolean metrics see the signs
+    vectors[:, ::3] = np.maximum(vectors[:, ::3], 0)
+    return LSStore(['F' + str(i) for i in range(300)], vectors, directory=tmp_path)
+
+
+@pytest.mark.parametrize('name,p_norm', [('euclidean', 2), ('minkowski', 3), ('canberra', 2), ('cosine', 2), ('correlation', 2),
+                                         ('jaccard', 2), ('dice', 2)])
+def test_matrix_matches_the_metric(store: LSStore, name: str, p_norm: int):
+    metric: Metric = get_distance_function(name)
+    # computed from the latent spaces until the matrix is built
+    assert family_distance(store, 'F3', 'F7', metric, p_norm) is None and get_distance_matrix(store, metric, p_norm) is None
+    path: Path = build_and_save(store, metric, p_norm)
+    assert path.parent == store.directory / ls_distances.distances_dirname
+    assert isinstance(get_distance_matrix(store, metric, p_norm), np.memmap)
+    rng: np.random.RandomState = np.random.RandomState(1)
+    i: int
+    j: int
+    for i, j in rng.randint(0, 300, (200, 2)):
+        if i == j:
+            continue
+        distance: Optional[np.double] = family_distance(store, store.names[i], store.names[j], metric, p_norm)
+        if i > j and name in ls_distances.ordered_metrics:
+            # computed from the latent spaces instead
+            assert distance is None
+        else:
+            assert distance == metric(store.vectors[i], store.vectors[j], p_norm)
+
+
+def test_pairs_not_in_the_matrix(store: LSStore, monkeypatch):
+    metric: Metric = get_distance_function('euclidean')
+    build_and_save(store, metric, 2)
+    assert family_distance(store, 'F3', 'F3', metric, 2) is None
+    assert family_distance(store, 'F3', 'unknown', metric, 2) is None
+    # built for another p
+    assert family_distance(store, 'F3', 'F4', get_distance_function('minkowski'), 3) is None
+    monkeypatch.setattr(ls_distances, 'max_families', 299)
+    assert family_distance(store, 'F3', 'F4', metric, 2) is None
+
+
+def test_matrices_of_an_older_store_are_removed(store: LSStore):
+    metric: Metric = get_distance_function('cosine')
+    old: Path = build_and_save(store, metric, 2)
+    other: Path = build_and_save(store, get_distance_function('euclidean'), 2)
+    new: Path = build_and_save(LSStore(store.names, store.vectors * 2, directory=store.directory), metric, 2)
+    assert not old.exists() and new.exists() and other.exists()
+
+
+def test_main(store: LSStore, monkeypatch, capsys):
+    monkeypatch.setattr(ls_store, '_store', store)
+    ls_distances.main(['-m', 'minkowski', '-p', '3'])
+    files: List[str] = [path.name for path in (store.directory / ls_distances.distances_dirname).iterdir()]
+    assert files == [ls_distances.matrix_filename(store, 'minkowski', 3)]
+    assert capsys.readouterr().out.startswith('300 protein families, distance matrix written to ')
+    monkeypatch.setattr(ls_distances, 'max_families', 100)
+    with pytest.raises(SystemExit):
+        ls_distances.main([])
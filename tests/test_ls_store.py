@@ -0,0 +1,93 @@
+""" The packed latent space store is rebuilt when the latent space files change """
+import os
+from pathlib import Path
+import numpy as np
+import pytest
+
+from CLI import ls_store
+
+
+@pytest.fixture
+def latent_spaces(tmp_path: Path, monkeypatch) -> Path:
+    lspath: Path = tmp_path / 'Latent_spaces'
+    lspath.mkdir()
+    name: str
+    for i, name in enumerate(['BBB', 'AAA', 'CCC']):
+        np.savetxt(str(lspath / (name + '.txt')), np.arange(30) + i)
+    monkeypatch.setattr(ls_store, 'lspath', lspath)
+    monkeypatch.setattr(ls_store, 'store_dir', lambda: tmp_path / 'packed')
+    monkeypatch.setattr(ls_store, '_store', None)
+    return lspath
+
+
+def test_build_and_open(latent_spaces: Path, tmp_path: Path):
+    store: ls_store.LSStore = ls_store.build_store(tmp_path / 'packed')
+    assert store.names == ['AAA', 'BBB', 'CCC']
+    np.testing.assert_array_equal(store.get('CCC'), np.arange(30) + 2)
+    assert store.digest == ls_store.content_digest(store.names, np.asarray(store.vectors))
+    assert not ls_store.is_stale(tmp_path / 'packed')
+    assert ls_store.open_store(tmp_path / 'packed').digest == store.digest
+
+
+def test_replaced_file_makes_the_store_stale(latent_spaces: Path, tmp_path: Path):
+    old: ls_store.LSStore = ls_store.get_store()
+    # like an editor saving a file: write a new one and move it over the old one
+    np.savetxt(str(latent_spaces / 'AAA.tmp'), np.arange(30) * 2.5)
+    os.replace(str(latent_spaces / 'AAA.tmp'), str(latent_spaces / 'AAA.txt'))
+    os.utime(str(latent_spaces), ns=(0, 1))
+    assert ls_store.is_stale(tmp_path / 'packed')
+    ls_store._store = None
+    new: ls_store.LSStore = ls_store.get_store()
+    np.testing.assert_array_equal(new.get('AAA'), np.arange(30) * 2.5)
+    assert new.digest != old.digest
+    assert not ls_store.is_stale(tmp_path / 'packed')
+
+
+def test_files_are_only_checked_when_the_directory_changed(latent_spaces: Path, tmp_path: Path, monkeypatch):
+    os.utime(str(latent_spaces), ns=(0, 0))
+    ls_store.get_store()
+    monkeypatch.setattr(ls_store, 'source_signature', None)
+    assert not ls_store.is_stale(tmp_path / 'packed')
+    monkeypatch.undo()
+    monkeypatch.setattr(ls_store, 'lspath', latent_spaces)
+    monkeypatch.setattr(ls_store, 'store_dir', lambda: tmp_path / 'packed')
+    # a file created and deleted again
+    os.utime(str(latent_spaces), ns=(0, 1))
+    assert not ls_store.is_stale(tmp_path / 'packed')
+    monkeypatch.setattr(ls_store, '_store', None)
+    digest: str = ls_store.get_store().digest
+    # the new mtime is recorded, so the files aren't checked again
+    assert ls_store.read_header(tmp_path / 'packed') == [digest, '1', ls_store.source_signature()]
+    monkeypatch.setattr(ls_store, 'source_signature', None)
+    assert not ls_store.is_stale(tmp_path / 'packed')
+
+
+def test_added_and_removed_families(latent_spaces: Path, tmp_path: Path):
+    ls_store.build_store(tmp_path / 'packed')
+    np.savetxt(str(latent_spaces / 'DDD.txt'), np.zeros(30))
+    assert ls_store.is_stale(tmp_path / 'packed')
+    ls_store.build_store(tmp_path / 'packed')
+    os.remove(str(latent_spaces / 'BBB.txt'))
+    assert ls_store.is_stale(tmp_path / 'packed')
+    assert ls_store.build_store(tmp_path / 'packed').names == ['AAA', 'CCC', 'DDD']
+
+
+def test_recent_changes_are_checked_file_by_file(latent_spaces: Path, tmp_path: Path, monkeypatch):
+    ls_store.build_store(tmp_path / 'packed')
+    assert ls_store.read_header(tmp_path / 'packed')[1] == ls_store.racy
+    # added in the same clock tick as the store was built
+    mtime: int = os.stat(str(latent_spaces)).st_mtime_ns
+    np.savetxt(str(latent_spaces / 'DDD.txt'), np.zeros(30))
+    os.utime(str(latent_spaces), ns=(mtime, mtime))
+    assert ls_store.is_stale(tmp_path / 'packed')
+
+
+def test_missing_store_is_stale(latent_spaces: Path, tmp_path: Path):
+    assert ls_store.is_stale(tmp_path / 'packed')
+
+
+def test_corrupt_store_is_rebuilt(latent_spaces: Path, tmp_path: Path):
+    store: ls_store.LSStore = ls_store.build_store(tmp_path / 'packed')
+    (tmp_path / 'packed' / ls_store.names_filename).write_text('AAA\n')
+    ls_store._store = None
+    assert ls_store.get_store().names == store.names
@@ -0,0 +1,48 @@
+""" Scores of families searched in pieces are merged as if they were searched in one pass """
+from typing import List, Tuple
+import numpy as np
+
+from CLI.utils.metrics import merge_scores
+
+
+def test_higher_accuracy_wins():
+    max_acc: np.ndarray = np.array([0.5, 0.5, 0.5])
+    chosen_family: np.ndarray = np.array([3, 3, 3])
+    merge_scores(max_acc, chosen_family, np.array([0.6, 0.4, 0.6]), np.array([7, 1, -1]))
+    np.testing.assert_array_equal(max_acc, [0.6, 0.5, 0.6])
+    np.testing.assert_array_equal(chosen_family, [7, 3, -1])
+
+
+def test_ties_go_to_the_first_family_in_search_order():
+    max_acc: np.ndarray = np.array([0.5, 0.5, 0.5, 0.0])
+    chosen_family: np.ndarray = np.array([3, 3, -1, -1])
+    merge_scores(max_acc, chosen_family, np.array([0.5, 0.5, 0.5, 0.0]), np.array([1, 8, 2, -1]))
+    np.testing.assert_array_equal(chosen_family, [1, 3, -1, -1])
+
+
+def test_no_family_keeps_none():
+    max_acc: np.ndarray = np.zeros(2)
+    chosen_family: np.ndarray = np.full(2, -1)
+    merge_scores(max_acc, chosen_family, np.array([0.0, np.nan]), np.array([-1, 4]))
+    np.testing.assert_array_equal(chosen_family, [-1, -1])
+
+
+def test_merge_order_doesnt_matter():
+    rng: np.random.RandomState = np.random.RandomState(0)
+    # accuracies of 40 families for 50 sequences, with many ties
+    scores: np.ndarray = rng.randint(0, 5, (40, 50)) / 4
+    best: np.ndarray = scores.argmax(axis=0)
+    pieces: List[Tuple[np.ndarray, np.ndarray]] = []
+    start: int
+    for start in range(0, 40, 7):
+        piece: np.ndarray = scores[start:start + 7]
+        pieces.append((piece.max(axis=0), start + piece.argmax(axis=0)))
+    for _ in range(5):
+        max_acc: np.ndarray = np.zeros(50)
+        chosen_family: np.ndarray = np.full(50, -1)
+        i: int
+        for i in rng.permutation(len(pieces)):
+            merge_scores(max_acc, chosen_family, *pieces[i])
+        np.testing.assert_array_equal(max_acc, scores.max(axis=0))
+        # families with no correct position at all aren't chosen
+        np.testing.assert_array_equal(chosen_family, np.where(scores.max(axis=0) > 0, best, -1))
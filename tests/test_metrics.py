@@ -0,0 +1,196 @@
+""" Every metric of the registry against scipy.spatial.distance.cdist, or the scipy 1.4 formulas
+
+jaccard and the boolean metrics are checked against the formulas of scipy 1.4 for real-valued input, written out below
+one pair at a time: recent scipy versions cast their input to bool, or dropped them
+"""
+from typing import Callable, Dict
+import numpy as np
+import pytest
+from scipy.spatial.distance import cdist
+
+from CLI import get_metric, metric_kernels
+from CLI.get_metric import Metric, cdist_metrics, metric_registry
+
+p_norms = [1, 2, 3, 5]
+dims: int = 30
+
+
+def _nbool_correspond_all(u: np.ndarray, v: np.ndarray):
+    not_u: np.ndarray = 1.0 - u
+    not_v: np.ndarray = 1.0 - v
+    return (not_u * not_v).sum(), (not_u * v).sum(), (u * not_v).sum(), (u * v).sum()
+
+
+def jaccard(u: np.ndarray, v: np.ndarray) -> float:
+    nonzero: np.ndarray = np.bitwise_or(u != 0, v != 0)
+    unequal_nonzero: np.ndarray = np.bitwise_and(u != v, nonzero)
+    a: np.double = np.double(unequal_nonzero.sum())
+    b: np.double = np.double(nonzero.sum())
+    return (a / b) if b != 0 else 0
+
+
+def yule(u: np.ndarray, v: np.ndarray) -> float:
+    nff, nft, ntf, ntt = _nbool_correspond_all(u, v)
+    return 2.0 * ntf * nft / np.array(ntt * nff + ntf * nft)
+
+
+def dice(u: np.ndarray, v: np.ndarray) -> float:
+    nff, nft, ntf, ntt = _nbool_correspond_all(u, v)
+    return (ntf + nft) / np.array(2.0 * ntt + ntf + nft)
+
+
+def kulsinski(u: np.ndarray, v: np.ndarray) -> float:
+    n: int = len(u)
+    nff, nft, ntf, ntt = _nbool_correspond_all(u, v)
+    return (ntf + nft - ntt + n) / np.array(ntf + nft + n)
+
+
+def rogerstanimoto(u: np.ndarray, v: np.ndarray) -> float:
+    nff, nft, ntf, ntt = _nbool_correspond_all(u, v)
+    return 2.0 * (ntf + nft) / np.array(ntt + nff + 2.0 * (ntf + nft))
+
+
+def russellrao(u: np.ndarray, v: np.ndarray) -> float:
+    n: int = len(u)
+    return (n - (u * v).sum()) / np.array(n, dtype=np.float64)
+
+
+def sokalmichener(u: np.ndarray, v: np.ndarray) -> float:
+    ntt: np.double = (u * v).sum()
+    nff: np.double = ((1.0 - u) * (1.0 - v)).sum()
+    nft: np.double = ((1.0 - u) * v).sum()
+    ntf: np.double = (u * (1.0 - v)).sum()
+    return 2.0 * (ntf + nft) / np.array(ntt + nff + 2.0 * (ntf + nft))
+
+
+def sokalsneath(u: np.ndarray, v: np.ndarray) -> float:
+    # scipy 1.4 raises a ValueError for two vectors of zeros, the CLI gives nan
+    nff, nft, ntf, ntt = _nbool_correspond_all(u, v)
+    return 2.0 * (ntf + nft) / np.array(ntt + 2.0 * (ntf + nft))
+
+
+scipy14_metrics: Dict[str, Callable] = {
+    'jaccard': jaccard, 'yule': yule, 'dice': dice, 'kulsinski': kulsinski, 'rogerstanimoto': rogerstanimoto,
+    'russellrao': russellrao, 'sokalmichener': sokalmichener, 'sokalsneath': sokalsneath}
+
+
+def special_rows(rng: np.random.RandomState, values: np.ndarray) -> np.ndarray:
+    # zero vectors and constant rows are the divide by zero and nan paths, a copy of a query is at distance 0
+    return np.vstack([values, np.zeros(dims), np.ones(dims), np.full(dims, 0.5), values[0], -values[1]])
+
+
+@pytest.fixture(params=['real', 'binary'])
+def latent_spaces(request):
+    rng: np.random.RandomState = np.random.RandomState(0)
+    if request.param == 'real':
+        values: np.ndarray = rng.standard_normal((12, dims)) * rng.gamma(2.0, 0.5, dims)
+    else:
+        values = (rng.rand(12, dims) < 0.3).astype(np.float64)
+    rows: np.ndarray = special_rows(rng, values)
+    return rows[::2], rows
+
+
+def expected_distances(name: str, queries: np.ndarray, rows: np.ndarray, p_norm: int) -> np.ndarray:
+    if name in scipy14_metrics:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.array([[scipy14_metrics[name](u, v) for v in rows] for u in queries], dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if name == 'minkowski':
+            return cdist(queries, rows, 'minkowski', p=p_norm)
+        return cdist(queries, rows, name)
+
+
+def assert_distances(actual: np.ndarray, expected: np.ndarray, atol: float = 1e-12):
+    np.testing.assert_allclose(actual, expected, rtol=1e-10, atol=atol, equal_nan=True)
+
+
+def test_registry_matches_cli_choices():
+    from CLI import metrics
+    assert list(metric_registry) == metrics
+    assert set(cdist_metrics).isdisjoint(scipy14_metrics)
+    assert set(cdist_metrics) | set(scipy14_metrics) == set(metric_registry)
+
+
+@pytest.mark.parametrize('p_norm', p_norms)
+@pytest.mark.parametrize('name', list(metric_registry))
+def test_call(name: str, p_norm: int, latent_spaces):
+    queries, rows = latent_spaces
+    metric: Metric = metric_registry[name]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        actual: np.ndarray = np.array([[metric(u, v, p_norm) for v in rows] for u in queries], dtype=np.float64)
+    assert_distances(actual, expected_distances(name, queries, rows, p_norm))
+
+
+@pytest.mark.parametrize('p_norm', p_norms)
+@pytest.mark.parametrize('name', list(metric_registry))
+def test_exact_distances(name: str, p_norm: int, latent_spaces):
+    queries, rows = latent_spaces
+    actual: np.ndarray = metric_registry[name].exact_distances(queries, rows, p_norm)
+    assert actual.shape == (len(queries), len(rows))
+    assert_distances(actual, expected_distances(name, queries, rows, p_norm))
+
+
+@pytest.mark.parametrize('p_norm', p_norms)
+@pytest.mark.parametrize('name', list(metric_registry))
+def test_paired_distances(name: str, p_norm: int, latent_spaces):
+    queries, rows = latent_spaces
+    u: np.ndarray = np.repeat(queries, len(rows), axis=0)
+    v: np.ndarray = np.tile(rows, (len(queries), 1))
+    actual: np.ndarray = metric_kernels.paired_distances(u, v, name, p_norm).reshape(len(queries), len(rows))
+    assert_distances(actual, expected_distances(name, queries, rows, p_norm))
+
+
+@pytest.mark.parametrize('p_norm', p_norms)
+@pytest.mark.parametrize('name', list(metric_registry))
+def test_metric_paired_distances(name: str, p_norm: int, latent_spaces, monkeypatch):
+    queries, rows = latent_spaces
+    # pairs spread over several blocks, the last one partial
+    monkeypatch.setattr(get_metric, 'paired_block', 7)
+    monkeypatch.setattr(get_metric, 'paired_pow_block', 3)
+    u: np.ndarray = np.repeat(queries, len(rows), axis=0)
+    v: np.ndarray = np.tile(rows, (len(queries), 1))
+    metric: Metric = metric_registry[name]
+    actual: np.ndarray = metric.paired_distances(u, v, p_norm).reshape(len(queries), len(rows))
+    # the same digits as exact_distances, not only within rounding
+    np.testing.assert_array_equal(actual, metric.exact_distances(queries, rows, p_norm))
+
+
+@pytest.mark.parametrize('p_norm', p_norms)
+@pytest.mark.parametrize('name', list(metric_registry))
+def test_distances_within_error_bound(name: str, p_norm: int, latent_spaces):
+    queries, rows = latent_spaces
+    metric: Metric = metric_registry[name]
+    data: tuple = metric.prepare(rows)
+    actual: np.ndarray = metric.distances(queries, data, p_norm)
+    exact: np.ndarray = metric.exact_distances(queries, rows, p_norm)
+    assert actual.shape == exact.shape
+    bound = metric.error_bound(queries, data, actual, p_norm)
+    if bound is None:
+        assert_distances(actual, exact)
+        return
+    bound = np.broadcast_to(bound, exact.shape)
+    with np.errstate(invalid='ignore'):
+        within: np.ndarray = (np.abs(actual - exact) <= bound) | (actual == exact) | (np.isnan(actual) & np.isnan(exact))
+    # an infinite bound means the distance is ill-conditioned, and searches compute the exact one
+    assert np.all(within | np.isposinf(bound))
+    # only the few ill-conditioned distances are computed again
+    assert np.mean(np.isposinf(bound)) < 0.2
+
+
+@pytest.mark.parametrize('name', list(metric_registry))
+def test_distances_of_one_query(name: str):
+    rng: np.random.RandomState = np.random.RandomState(1)
+    rows: np.ndarray = rng.standard_normal((50, dims))
+    metric: Metric = metric_registry[name]
+    actual: np.ndarray = metric.distances(rows[:1], metric.prepare(rows))
+    assert actual.shape == (1, 50)
+    expected: np.ndarray = metric.exact_distances(rows[:1], rows)
+    # the query is its own closest family for the proper metrics
+    if name in ['euclidean', 'minkowski', 'cityblock', 'sqeuclidean', 'cosine', 'correlation', 'chebyshev', 'braycurtis', 'canberra']:
+        assert int(np.argmin(actual)) == int(np.argmin(expected)) == 0
+    assert_distances(actual, expected, atol=1e-6)
+
+
+def test_minkowski_p_below_one():
+    with pytest.raises(ValueError):
+        metric_kernels.paired_distances(np.zeros((1, dims)), np.ones((1, dims)), 'minkowski', 0)
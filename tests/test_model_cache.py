@@ -0,0 +1,75 @@
+""" The model cache keeps the most recently used networks within its budgets, and shared models swap weights per family """
+from typing import Dict, List
+import numpy as np
+
+from CLI.model_cache import ModelCache, SharedModels
+
+
+def loader(loads: List[str]):
+    def load(family: str) -> List[np.ndarray]:
+        loads.append(family)
+        # 100 bytes per model, 200 for the BIG family
+        return [np.zeros(25 if family != 'BIG' else 50, dtype=np.float32)]
+    return load
+
+
+def test_hits_and_misses():
+    loads: List[str] = []
+    cache: ModelCache = ModelCache(loader(loads))
+    cache.get('AAA')
+    cache.get('BBB')
+    cache.get('AAA')
+    assert loads == ['AAA', 'BBB'] and (cache.hits, cache.misses) == (1, 2)
+    assert cache.total_bytes == 200 and cache.stats().startswith('model cache: 1 hits, 2 misses (33.3% hit rate)')
+
+
+def test_least_recently_used_are_dropped():
+    loads: List[str] = []
+    cache: ModelCache = ModelCache(loader(loads), max_models=2)
+    family: str
+    for family in ['AAA', 'BBB', 'AAA', 'CCC', 'BBB']:
+        cache.get(family)
+    assert list(cache.models) == ['CCC', 'BBB'] and loads == ['AAA', 'BBB', 'CCC', 'BBB']
+    assert cache.evictions == 2 and cache.total_bytes == 200
+
+
+def test_byte_budget():
+    cache: ModelCache = ModelCache(loader([]), max_bytes=250)
+    cache.get('AAA')
+    cache.get('BBB')
+    cache.get('BIG')
+    assert list(cache.models) == ['BIG'] and cache.total_bytes == 200
+    # the last model is kept even if it doesn't fit
+    cache.set_budget(max_bytes=10)
+    assert list(cache.models) == ['BIG']
+    cache.set_budget(max_models=0)
+    assert len(cache) == 1
+
+
+class FakeModel:
+    weights: List[np.ndarray]
+
+    def __init__(self):
+        self.weights = []
+
+    def set_weights(self, weights: List[np.ndarray]):
+        self.weights = weights
+
+
+def test_shared_models_swap_weights():
+    builds: Dict[str, int] = {}
+
+    def build(model_json: str) -> FakeModel:
+        builds[model_json] = builds.get(model_json, 0) + 1
+        return FakeModel()
+
+    shared: SharedModels = SharedModels(build)
+    weights: Dict[str, List[np.ndarray]] = {name: [np.full(2, i)] for i, name in enumerate(['AAA', 'BBB', 'CCC'])}
+    a: FakeModel = shared.get('AAA', 'arch1', '{1}', weights['AAA'])
+    assert shared.get('BBB', 'arch1', '{1}', weights['BBB']) is a and a.weights is weights['BBB']
+    c: FakeModel = shared.get('CCC', 'arch2', '{2}', weights['CCC'])
+    assert c is not a and builds == {'{1}': 1, '{2}': 1}
+    # the weights are only set again when another family used the model since
+    assert shared.get('CCC', 'arch2', '{2}', weights['CCC']) is c and shared.swaps == 3
+    assert shared.get('AAA', 'arch1', '{1}', weights['AAA']).weights is weights['AAA'] and shared.swaps == 4
+    assert len(shared) == 2 and shared.families == {'AAA', 'BBB', 'CCC'}
@@ -0,0 +1,111 @@
+""" Reading trained networks from the zip archive: lazy extraction, the LRU cache and the SHA-256 checks """
+import hashlib
+import os
+from pathlib import Path
+from zipfile import ZipFile
+import pytest
+
+from CLI import network_archive
+from CLI.network_archive import NetworkArchive, archive_matches, record_sha256
+
+
+@pytest.fixture
+def archive(tmp_path: Path) -> Path:
+    path: Path = tmp_path / 'Trained_networks.zip'
+    with ZipFile(str(path), 'w') as zf:
+        name: str
+        for name in ['AAA', 'BBB', 'CCC']:
+            zf.writestr('Trained_networks/' + name + '.json', '{"name": "' + name + '"}')
+            zf.writestr('Trained_networks/' + name + '_weights.h5', name.encode() * 100)
+        # a json with no weights isn't a family
+        zf.writestr('Trained_networks/DDD.json', '{}')
+    return path
+
+
+def test_members_by_basename(archive: Path, tmp_path: Path):
+    na: NetworkArchive = NetworkArchive(archive, tmp_path / 'cache', 1 << 20)
+    assert na.families() == ['AAA', 'BBB', 'CCC']
+    assert 'AAA.json' in na and 'DDD_weights.h5' not in na
+    assert na.read('BBB.json') == b'{"name": "BBB"}'
+    # reading doesn't extract anything
+    assert not (tmp_path / 'cache').exists()
+
+
+def test_extract_is_lazy_and_reused(archive: Path, tmp_path: Path):
+    na: NetworkArchive = NetworkArchive(archive, tmp_path / 'cache', 1 << 20)
+    target: Path = na.extract('AAA_weights.h5')
+    assert target == tmp_path / 'cache' / 'AAA_weights.h5'
+    assert target.read_bytes() == b'AAA' * 100
+    assert os.listdir(str(tmp_path / 'cache')) == ['AAA_weights.h5']
+    # a new process finds the files extracted by the earlier ones
+    assert list(NetworkArchive(archive, tmp_path / 'cache', 1 << 20).cached) == ['AAA_weights.h5']
+    mtime: int = target.stat().st_mtime_ns
+    assert na.extract('AAA_weights.h5') == target and target.stat().st_mtime_ns >= mtime
+
+
+def test_least_recently_used_are_deleted(archive: Path, tmp_path: Path):
+    # room for two weights files of 300 bytes
+    na: NetworkArchive = NetworkArchive(archive, tmp_path / 'cache', 700)
+    na.extract('AAA_weights.h5')
+    na.extract('BBB_weights.h5')
+    na.extract('AAA_weights.h5')
+    na.extract('CCC_weights.h5')
+    assert sorted(os.listdir(str(tmp_path / 'cache'))) == ['AAA_weights.h5', 'CCC_weights.h5']
+    assert list(na.cached) == ['AAA_weights.h5', 'CCC_weights.h5'] and na.cached_bytes == 600
+
+
+def test_the_last_file_is_kept_past_the_budget(archive: Path, tmp_path: Path):
+    na: NetworkArchive = NetworkArchive(archive, tmp_path / 'cache', 0)
+    na.extract('AAA_weights.h5')
+    assert na.extract('BBB_weights.h5').exists()
+    assert os.listdir(str(tmp_path / 'cache')) == ['BBB_weights.h5']
+
+
+def test_extract_all(archive: Path, tmp_path: Path):
+    target: Path = tmp_path / 'Trained_networks'
+    target.mkdir()
+    (target / 'kmer_index.npz').write_bytes(b'')
+    NetworkArchive(archive, tmp_path / 'cache', 0).extract_all(target, jobs=3, pbar=False)
+    assert sorted(os.listdir(str(target))) == ['AAA.json', 'AAA_weights.h5', 'BBB.json', 'BBB_weights.h5', 'CCC.json',
+                                               'CCC_weights.h5', 'DDD.json', 'kmer_index.npz']
+    assert not (tmp_path / 'Trained_networks.partial').exists()
+
+
+def test_sha256_is_recorded_and_checked(archive: Path):
+    sha256: str = hashlib.sha256(archive.read_bytes()).hexdigest()
+    assert network_archive.sha256_matches(archive, sha256.upper())
+    assert not network_archive.sha256_matches(archive, '0' * 64)
+    # not checked yet, and nothing to check it against
+    assert archive_matches(archive, None)
+    assert not archive_matches(archive, '0' * 64)
+    assert archive_matches(archive, sha256)
+    assert Path(str(archive) + network_archive.sha256_suffix).read_text().split()[0] == sha256
+    assert archive_matches(archive, None)
+    # another published archive
+    assert not archive_matches(archive, '0' * 64)
+
+
+def test_truncated_archive_is_refused(archive: Path):
+    record_sha256(archive)
+    os.truncate(str(archive), archive.stat().st_size - 10)
+    assert not archive_matches(archive, None)
+
+
+def test_touched_archive_is_hashed_again(archive: Path, monkeypatch):
+    record_sha256(archive)
+    os.utime(str(archive), ns=(0, 0))
+    assert archive_matches(archive, None)
+    # recorded again, so the next run doesn't hash it
+    monkeypatch.setattr(network_archive, 'file_sha256', None)
+    assert archive_matches(archive, None)
+
+
+def test_source_url_and_sha256_from_the_environment(monkeypatch):
+    monkeypatch.delenv(network_archive.url_env, raising=False)
+    monkeypatch.delenv(network_archive.sha256_env, raising=False)
+    assert network_archive.source_url('https://example.org/a.zip') == 'https://example.org/a.zip'
+    assert network_archive.expected_sha256(None) is None
+    monkeypatch.setenv(network_archive.url_env, '/data/a.zip')
+    monkeypatch.setenv(network_archive.sha256_env, 'ab' * 32)
+    assert network_archive.source_url('https://example.org/a.zip') == '/data/a.zip'
+    assert network_archive.expected_sha256(None) == 'ab' * 32
@@ -0,0 +1,179 @@
+""" The packed network store: canonical architectures, weights read from the memory-mapped blob, and staleness """
+import json
+import os
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+import pytest
+
+from CLI import network_store
+from CLI.network_store import NetworkStore, architecture_digest, canonical_json, network_files, open_store
+from conftest import stand_in
+
+
+def model_json(prefix: str, units: int) -> str:
+    # the layer names Keras numbers as it builds models
+    return json.dumps({'class_name': 'Sequential', 'keras_version': '2.' + str(units), 'backend': 'tensorflow',
+                       'config': {'name': prefix + '_model', 'layers': [
+                           {'class_name': 'Dense', 'config': {'name': prefix + '_dense_1', 'units': units}},
+                           {'class_name': 'Dense', 'config': {'name': prefix + '_dense_2', 'units': 21,
+                                                              'inbound_nodes': [[prefix + '_dense_1', 0, 0]]}}]}})
+
+
+def test_canonical_json():
+    canonical: str = canonical_json(model_json('sequential_4', 8))
+    assert canonical == canonical_json(model_json('sequential_17', 8))
+    assert canonical != canonical_json(model_json('sequential_4', 16))
+    config: dict = json.loads(canonical)
+    assert 'keras_version' not in config and 'backend' not in config
+    assert config['config']['layers'][1]['config']['inbound_nodes'] == [['layer_1', 0, 0]]
+    assert architecture_digest(canonical) == architecture_digest(canonical_json(model_json('x', 8)))
+
+
+def test_network_files(tmp_path: Path):
+    name: str
+    for name in ['AAA.json', 'AAA_weights.h5', 'BBB.json', 'CCC_weights.h5', 'notes.txt']:
+        (tmp_path / name).write_text('')
+    assert network_files(tmp_path) == ['AAA']
+
+
+def write_store(networks_dir: Path, weights: Dict[str, List[np.ndarray]]):
+    # the layout build_store writes, without Keras
+    directory: Path = networks_dir / network_store.store_dirname
+    directory.mkdir(parents=True)
+    families: dict = {}
+    blob: bytearray = bytearray()
+    family: str
+    for family, arrays in weights.items():
+        entries: list = []
+        w: np.ndarray
+        for w in arrays:
+            blob.extend(b'\0' * (-len(blob) % network_store.alignment))
+            entries.append((len(blob), w.dtype.str, list(w.shape)))
+            blob.extend(w.tobytes())
+        families[family] = (len(arrays) - 1, 10 * len(arrays), entries)
+    (directory / 'weights_test.bin').write_bytes(bytes(blob))
+    (directory / network_store.index_filename).write_text(json.dumps({'version': network_store.store_version,
+                                                                      'sources': network_store.source_signature(networks_dir),
+                                                                      'directory': network_store.directory_signature(networks_dir),
+                                                                      'weights': 'weights_test.bin',
+                                                                      'architectures': ['{1}', '{2}'], 'families': families}))
+
+
+@pytest.fixture
+def packed(tmp_path: Path) -> Dict[str, List[np.ndarray]]:
+    rng: np.random.RandomState = np.random.RandomState(0)
+    weights: Dict[str, List[np.ndarray]] = {'AAA': [rng.rand(3, 5).astype(np.float32), rng.rand(5)],
+                                            'BBB': [rng.rand(7).astype(np.float32)],
+                                            'CCC': [rng.rand(2, 2), np.arange(3, dtype=np.int64)]}
+    name: str
+    for name in ['AAA', 'BBB', 'CCC']:
+        (tmp_path / (name + '.json')).write_text('{}')
+        (tmp_path / (name + '_weights.h5')).write_bytes(b'weights')
+    write_store(tmp_path, weights)
+    return weights
+
+
+def test_weights_from_the_blob(tmp_path: Path, packed: Dict[str, List[np.ndarray]]):
+    store: NetworkStore = open_store(tmp_path)
+    assert len(store) == 3 and 'BBB' in store and 'DDD' not in store
+    assert store.architecture('AAA') == '{2}' and store.architecture_id('BBB') == 0 and store.size('CCC') == 20
+    family: str
+    for family, arrays in packed.items():
+        read: List[np.ndarray] = store.weights(family)
+        assert len(read) == len(arrays)
+        w: np.ndarray
+        for w, expected in zip(read, arrays):
+            assert w.dtype == expected.dtype and not w.flags.writeable
+            np.testing.assert_array_equal(w, expected)
+    assert network_store.architecture_report(store).splitlines() == [
+        '3 networks, 2 distinct architectures', 'architecture 1: 2 families, input length 20', 'architecture 0: 1 families, input length 10']
+
+
+@pytest.mark.parametrize('change', ['add', 'remove', 'retrain'])
+def test_stale_when_the_networks_change(tmp_path: Path, packed: Dict[str, List[np.ndarray]], monkeypatch, change: str):
+    monkeypatch.setattr(network_store, '_store_dir', None)
+    assert not network_store.is_stale(tmp_path) and network_store.get_store(tmp_path) is not None
+    mtime: int = os.stat(str(tmp_path)).st_mtime_ns
+    if change == 'add':
+        (tmp_path / 'DDD.json').write_text('{}')
+        (tmp_path / 'DDD_weights.h5').write_bytes(b'weights')
+    elif change == 'remove':
+        os.remove(str(tmp_path / 'BBB_weights.h5'))
+    else:
+        (tmp_path / 'BBB_weights.h5').write_bytes(b'retrained')
+    # even within the directory's mtime resolution
+    os.utime(str(tmp_path), ns=(mtime, mtime))
+    assert network_store.is_stale(tmp_path)
+    monkeypatch.setattr(network_store, '_store_dir', None)
+    assert network_store.get_store(tmp_path) is None
+
+
+def test_files_are_only_checked_when_the_directory_changed(tmp_path: Path, packed: Dict[str, List[np.ndarray]], monkeypatch):
+    index_file: Path = tmp_path / network_store.store_dirname / network_store.index_filename
+    assert json.loads(index_file.read_text())['directory'] == network_store.racy
+    os.utime(str(tmp_path), ns=(0, 0))
+    monkeypatch.setattr(network_store, '_store_dir', None)
+    assert network_store.get_store(tmp_path) is not None
+    # the files are unchanged, so the directory's mtime is recorded
+    assert json.loads(index_file.read_text())['directory'] == '0'
+    monkeypatch.setattr(network_store, 'source_signature', None)
+    assert not network_store.is_stale(tmp_path)
+    monkeypatch.setattr(network_store, '_store_dir', None)
+    assert network_store.get_store(tmp_path) is not None
+    monkeypatch.undo()
+    # retrained, then the directory touched
+    (tmp_path / 'BBB_weights.h5').write_bytes(b'retrained')
+    os.utime(str(tmp_path), ns=(0, 1))
+    assert network_store.is_stale(tmp_path)
+
+
+def test_store_without_sources_is_stale(tmp_path: Path, packed: Dict[str, List[np.ndarray]]):
+    # written by an earlier version
+    index_file: Path = tmp_path / network_store.store_dirname / network_store.index_filename
+    index: dict = json.loads(index_file.read_text())
+    del index['sources']
+    index_file.write_text(json.dumps(index))
+    assert network_store.is_stale(tmp_path)
+
+
+def test_unknown_version_is_not_opened(tmp_path: Path, packed: Dict[str, List[np.ndarray]], monkeypatch):
+    index_file: Path = tmp_path / network_store.store_dirname / network_store.index_filename
+    index_file.write_text(index_file.read_text().replace('"version": ' + str(network_store.store_version), '"version": 0'))
+    with pytest.raises(ValueError):
+        open_store(tmp_path)
+    monkeypatch.setattr(network_store, '_store_dir', None)
+    assert network_store.get_store(tmp_path) is None
+
+
+class FakeModel:
+    """ Reads its weights from an .npz file saved as <family>_weights.h5 """
+    input_shape = (None, 21 * 10)
+
+    def load_weights(self, fname: str):
+        with np.load(fname) as weights:
+            self.weights = [weights[key] for key in sorted(weights.files)]
+
+    def get_weights(self) -> List[np.ndarray]:
+        return self.weights
+
+
+def test_rebuild_keeps_the_blob_of_the_previous_index(tmp_path: Path, monkeypatch):
+    keras = stand_in(monkeypatch, 'keras')
+    keras.Model = object
+    keras.models = stand_in(monkeypatch, 'keras.models')
+    keras.models.model_from_json = lambda model_json: FakeModel()
+    (tmp_path / 'AAA.json').write_text(model_json('a', 8))
+    with open(tmp_path / 'AAA_weights.h5', 'wb') as outf:
+        np.savez(outf, w0=np.arange(6, dtype=np.float32))
+    first: NetworkStore = network_store.build_store(tmp_path, False)
+    old_index: dict = json.loads((tmp_path / network_store.store_dirname / network_store.index_filename).read_text())
+    with open(tmp_path / 'AAA_weights.h5', 'wb') as outf:
+        np.savez(outf, w0=np.arange(6, dtype=np.float32) + 10)
+    second: NetworkStore = network_store.build_store(tmp_path, False)
+    assert second.weights_file != first.weights_file == old_index['weights']
+    np.testing.assert_array_equal(second.weights('AAA')[0], np.arange(6) + 10)
+    # a process that read the previous index finds no blob under the name it holds, rather than the new one
+    assert not (tmp_path / network_store.store_dirname / old_index['weights']).exists()
+    np.testing.assert_array_equal(first.weights('AAA')[0], np.arange(6))
+    assert sorted(os.listdir(str(tmp_path / network_store.store_dirname))) == [network_store.index_filename, second.weights_file]
@@ -0,0 +1,118 @@
+""" ResultWriter: every output format and mode """
+import json
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+import pytest
+
+from CLI.CompareLSOutput import CompareLSOutput
+from CLI.CompareLSPairsOutput import CompareLSPairsOutput
+from CLI.SearchLSOutput import SearchLSOutput
+from CLI.SearchSQOutput import SearchSQOutput
+from CLI.output_results import ResultWriter, output_result
+
+
+def results() -> List[SearchLSOutput]:
+    return [SearchLSOutput('ls1', 'euclidean', 'AAA', '0.5'),
+            SearchLSOutput('ls2', 'euclidean', 'BBB', '1.5', [('BBB', '1.5'), ('CCC', '2.0')]),
+            SearchLSOutput('ls3', 'euclidean', 'none', 'inf', [])]
+
+
+def write_all(fname: Optional[Path], form: str, mode: str, items: list, **kwargs):
+    writer: ResultWriter
+    with ResultWriter(str(fname) if fname is not None else '', form, mode, **kwargs) as writer:
+        for res in items:
+            writer.write(res)
+
+
+def test_csv(tmp_path: Path):
+    write_all(tmp_path / 'out.csv', 'csv', 'w', results())
+    assert (tmp_path / 'out.csv').read_text().splitlines() == ['ls1,euclidean,AAA,0.5', 'ls2,euclidean,BBB,1.5', 'ls2,euclidean,CCC,2.0']
+
+
+def test_jsonl(tmp_path: Path):
+    write_all(tmp_path / 'out.jsonl', 'jsonl', 'w', results())
+    records: List[dict] = [json.loads(line) for line in (tmp_path / 'out.jsonl').read_text().splitlines()]
+    assert [record['closest'] for record in records] == ['AAA', 'BBB', 'none']
+    assert records[1]['neighbors'] == [{'family': 'BBB', 'distance': 1.5}, {'family': 'CCC', 'distance': 2.0}]
+
+
+def test_jsonl_without_a_match_is_valid_json(tmp_path: Path):
+    write_all(tmp_path / 'out.jsonl', 'jsonl', 'w', [SearchLSOutput('ls3', 'euclidean', 'none', 'inf', []),
+                                                     SearchLSOutput('ls4', 'euclidean', 'none', 'inf')])
+    text: str = (tmp_path / 'out.jsonl').read_text()
+    assert 'Infinity' not in text
+    records: List[dict] = [json.loads(line, parse_constant=lambda constant: pytest.fail(constant)) for line in text.splitlines()]
+    assert records == [{'ls': 'ls3', 'distance_metric': 'euclidean', 'closest': 'none', 'distance': None, 'neighbors': []},
+                       {'ls': 'ls4', 'distance_metric': 'euclidean', 'closest': 'none', 'distance': None}]
+
+
+def test_jsonl_undefined_compare_distances_are_valid_json(tmp_path: Path):
+    # cosine against a zero vector is nan
+    write_all(tmp_path / 'out.jsonl', 'jsonl', 'w', [CompareLSOutput('A', 'B', 'cosine', 'nan'),
+                                                     CompareLSPairsOutput(['A', 'C'], ['B', 'D'], 'cosine', ['nan', '0.25'])])
+    text: str = (tmp_path / 'out.jsonl').read_text()
+    records: List[dict] = [json.loads(line, parse_constant=lambda constant: pytest.fail(constant)) for line in text.splitlines()]
+    assert [record['distance'] for record in records] == [None, None, 0.25]
+
+
+def test_text(tmp_path: Path):
+    write_all(tmp_path / 'out.txt', 'text', 'w', [SearchSQOutput('seq1', 'AAA', '0.9')])
+    assert (tmp_path / 'out.txt').read_text() == 'The closest protein family to seq1 is AAA with average accuracy: 0.9\n'
+
+
+def test_stdout_is_always_text(capsys):
+    write_all(None, 'csv', 'w', results()[:1])
+    assert capsys.readouterr().out == 'The closest protein family to ls1 is AAA with euclidean distance: 0.5\n'
+
+
+def test_append_and_write_modes(tmp_path: Path):
+    fname: Path = tmp_path / 'out.csv'
+    write_all(fname, 'csv', 'w', results()[:1])
+    write_all(fname, 'csv', 'a', results()[:1])
+    assert len(fname.read_text().splitlines()) == 2
+    # every buffer of a run is kept, only the earlier runs' results are replaced
+    write_all(fname, 'csv', 'w', results()[:2], buffer_size=1)
+    assert len(fname.read_text().splitlines()) == 3
+
+
+@pytest.mark.parametrize('form', ['text', 'csv', 'jsonl', 'npz'])
+def test_write_mode_with_no_results_replaces_the_file(tmp_path: Path, form: str):
+    fname: Path = tmp_path / ('out.' + form)
+    write_all(fname, form, 'w', results()[:2])
+    assert fname.exists()
+    write_all(fname, form, 'w', [])
+    assert not fname.exists() or fname.read_text() == ''
+
+
+def test_npz_columns(tmp_path: Path):
+    fname: Path = tmp_path / 'out.npz'
+    write_all(fname, 'npz', 'w', results(), buffer_size=1)
+    write_all(fname, 'npz', 'a', results()[:1])
+    with np.load(str(fname)) as data:
+        assert data['family'].tolist() == ['AAA', 'BBB', 'CCC', 'AAA']
+        assert data['rank'].tolist() == [1, 1, 2, 1]
+        np.testing.assert_array_equal(data['distance'], [0.5, 1.5, 2.0, 0.5])
+
+
+def test_npz_fields_must_match(tmp_path: Path):
+    fname: Path = tmp_path / 'out.npz'
+    write_all(fname, 'npz', 'w', results()[:1])
+    with pytest.raises(SystemExit):
+        write_all(fname, 'npz', 'a', [SearchSQOutput('seq1', 'AAA', '0.9')])
+
+
+def test_hdf5_appends_every_buffer(tmp_path: Path):
+    h5py = pytest.importorskip('h5py')
+    fname: Path = tmp_path / 'out.h5'
+    write_all(fname, 'hdf5', 'w', [SearchSQOutput('seq' + str(i), 'AAA', '0.9') for i in range(5)], buffer_size=2)
+    write_all(fname, 'hdf5', 'a', [SearchSQOutput('seq5', 'BBB', '0.5')])
+    with h5py.File(str(fname), 'r') as h5:
+        data: np.ndarray = h5['results'][:]
+    assert len(data) == 6 and data['accuracy'][-1] == 0.5
+
+
+def test_output_result_writes_one_result(tmp_path: Path):
+    output_result(SearchSQOutput('seq1', 'AAA', '0.9'), str(tmp_path / 'out.csv'), 'csv', 'a')
+    output_result(SearchSQOutput('seq2', 'BBB', '0.8'), str(tmp_path / 'out.csv'), 'csv', 'a')
+    assert (tmp_path / 'out.csv').read_text() == 'seq1,AAA,0.9\nseq2,BBB,0.8\n'
@@ -0,0 +1,35 @@
+""" Reconstruction accuracy on letter indices, as aa_acc computes it on one hot arrays """
+import numpy as np
+import pytest
+
+from CLI.utils.metrics import reconstruction_acc
+
+
+def accuracy_by_sequence(x: np.ndarray, reconstructed: np.ndarray, ignore_gaps: bool) -> np.ndarray:
+    acc: np.ndarray = np.zeros(len(x))
+    i: int
+    for i in range(len(x)):
+        letters: np.ndarray = x[i] > 0 if ignore_gaps else np.ones(x.shape[1], dtype=bool)
+        acc[i] = np.mean(x[i][letters] == reconstructed[i].argmax(axis=-1)[letters]) if letters.any() else np.nan
+    return acc
+
+
+@pytest.mark.parametrize('ignore_gaps', [False, True])
+def test_matches_a_sequence_by_sequence_count(ignore_gaps: bool):
+    rng: np.random.RandomState = np.random.RandomState(0)
+    x: np.ndarray = rng.randint(0, 21, (30, 40))
+    # gaps only
+    x[0] = 0
+    reconstructed: np.ndarray = rng.rand(30, 40, 21)
+    # and one perfectly reconstructed sequence
+    reconstructed[1] = np.eye(21)[x[1]]
+    with np.errstate(invalid='ignore'):
+        acc: np.ndarray = reconstruction_acc(x, reconstructed, ignore_gaps)
+        np.testing.assert_allclose(acc, accuracy_by_sequence(x, reconstructed, ignore_gaps))
+    assert acc[1] == 1
+    assert np.isnan(acc[0]) == ignore_gaps
+
+
+def test_keeps_leading_dimensions():
+    x: np.ndarray = np.zeros((2, 3, 5), dtype=np.uint8)
+    assert reconstruction_acc(x, np.zeros((2, 3, 5, 21))).shape == (2, 3)
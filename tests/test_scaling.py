@@ -0,0 +1,16 @@
+""" The scaling benchmark only compares runs of the same workload """
+from typing import List
+
+from benchmarks import scaling
+
+
+def test_output_settings_may_differ():
+    settings: dict = {'sizes': [1000], 'queries': 100, 'out': 'a.json', 'baseline': None, 'tolerance': 0.2}
+    baseline: dict = dict(settings, out='b.json', baseline='c.json', tolerance=0.5)
+    assert scaling.changed_settings(settings, baseline) == []
+
+
+def test_workload_settings_must_match():
+    settings: dict = {'sizes': [1000], 'queries': 100, 'p_norm': 3, 'seed': 0}
+    changed: List[str] = scaling.changed_settings(settings, {'sizes': [1000, 10000], 'queries': 100, 'p_norm': 3})
+    assert changed == ['seed: null in the baseline, 0 now', 'sizes: [1000, 10000] in the baseline, [1000] now']
@@ -0,0 +1,114 @@
+""" Batched searches of the latent space store give the same families as scoring each query on its own """
+from typing import List, Optional, Tuple
+import numpy as np
+import pytest
+
+from CLI import SearchLS, ls_store
+from CLI.LSVector import LSVector
+from CLI.SearchLS import closest_families, near_families
+from CLI.SearchLSOutput import SearchLSOutput
+from CLI.get_metric import Metric, metric_registry
+
+NAMES: List[str] = ['FAM' + format(i, '04d') for i in range(400)]
+
+
+@pytest.fixture
+def vectors(monkeypatch) -> np.ndarray:
+    rng: np.random.RandomState = np.random.RandomState(0)
+    data: np.ndarray = rng.standard_normal((len(NAMES), 30))
+    # values of 0 and 1 for the boolean metrics, and families duplicated so that some are tied
+    data[:, ::3] = rng.randint(0, 2, (len(NAMES), 10))
+    data[300:305] = data[40]
+    data[350] = data[7]
+    monkeypatch.setattr(ls_store, '_store', ls_store.LSStore(NAMES, data))
+    return data
+
+
+def queries(vectors: np.ndarray) -> np.ndarray:
+    rng: np.random.RandomState = np.random.RandomState(1)
+    data: np.ndarray = vectors[rng.choice(len(vectors), 12)] + rng.standard_normal((12, 30)) * 0.3
+    # a family itself, one of the duplicated ones, and one that can't be compared
+    data[0] = vectors[40]
+    data[1] = vectors[7]
+    data[2, 5] = np.nan
+    return data
+
+
+def scan(query: np.ndarray, vectors: np.ndarray, metric: Metric, p_norm: int,
+         k: Optional[int], radius: Optional[float]) -> List[Tuple[str, str]]:
+    """ Score every family on its own with the scalar distance and sort them, ties in store order """
+    dists: List[float] = [metric(query, row, p_norm) for row in vectors]
+    ranked: List[Tuple[float, int]] = sorted((d, j) for j, d in enumerate(dists) if not np.isnan(d) and d < np.inf)
+    if radius is not None:
+        ranked = [(d, j) for d, j in ranked if d <= radius]
+    return [(NAMES[j], str(d)) for d, j in ranked[:k]]
+
+
+@pytest.mark.parametrize('kernel_min_families', [0, 10 ** 9])
+@pytest.mark.parametrize('k,radius', [(None, None), (1, None), (7, None), (7, 'median'), (None, 'median')])
+@pytest.mark.parametrize('name', list(metric_registry))
+def test_batched_search_matches_a_scan(vectors: np.ndarray, monkeypatch, name: str, k: Optional[int], radius: Optional[str],
+                                       kernel_min_families: int):
+    # the NumPy kernels or cdist, several chunks of queries
+    monkeypatch.setattr(SearchLS, 'kernel_min_families', kernel_min_families)
+    monkeypatch.setattr(SearchLS, 'chunk_size', 4)
+    metric: Metric = metric_registry[name]
+    data: np.ndarray = queries(vectors)
+    distance: Optional[float] = None
+    if radius is not None:
+        # about half of the families
+        distance = float(np.nanmedian(metric.exact_distances(data[3:4], vectors)))
+    results: List[SearchLSOutput] = closest_families([LSVector('q' + str(i), q) for i, q in enumerate(data)], metric, 2,
+                                                     k, distance)
+    i: int
+    for i, result in enumerate(results):
+        expected: List[Tuple[str, str]] = scan(data[i], vectors, metric, 2, k or (1 if distance is None else None), distance)
+        assert (result.closest, result.distance) == (expected[0] if expected else ('none', 'inf'))
+        assert result.neighbors == (None if k is None and distance is None else expected)
+
+
+@pytest.mark.parametrize('kernel_min_families', [0, 10 ** 9])
+@pytest.mark.parametrize('name', ['euclidean', 'cosine', 'jaccard'])
+def test_ties_in_store_order(vectors: np.ndarray, monkeypatch, name: str, kernel_min_families: int):
+    monkeypatch.setattr(SearchLS, 'kernel_min_families', kernel_min_families)
+    # FAM0040 and its five copies are all at distance 0, and k cuts through them
+    result: SearchLSOutput = closest_families([LSVector('q', vectors[300])], metric_registry[name], 2, 4)[0]
+    assert [family for family, _ in result.neighbors] == ['FAM0040', 'FAM0300', 'FAM0301', 'FAM0302']
+    assert result.closest == 'FAM0040' and len({dist for _, dist in result.neighbors}) == 1
+
+
+@pytest.mark.parametrize('k', [None, 3])
+def test_radius_without_families(vectors: np.ndarray, k: Optional[int]):
+    results: List[SearchLSOutput] = closest_families([LSVector('q', vectors[10] + 100), LSVector('r', vectors[10])],
+                                                     metric_registry['euclidean'], 2, k, 1e-6)
+    assert (results[0].closest, results[0].distance, results[0].neighbors) == ('none', 'inf', [])
+    assert results[1].closest == 'FAM0010' and results[1].neighbors == [('FAM0010', '0.0')]
+
+
+@pytest.mark.parametrize('p_norm', [1, 2, 3, 4])
+def test_minkowski_p(vectors: np.ndarray, p_norm: int):
+    metric: Metric = metric_registry['minkowski']
+    data: np.ndarray = queries(vectors)[3:]
+    results: List[SearchLSOutput] = closest_families([LSVector('q' + str(i), q) for i, q in enumerate(data)], metric, p_norm, 5)
+    i: int
+    for i, result in enumerate(results):
+        assert result.neighbors == scan(data[i], vectors, metric, p_norm, 5, None)
+    # another p ranks the families differently
+    other: List[SearchLSOutput] = closest_families([LSVector('q' + str(i), q) for i, q in enumerate(data)], metric,
+                                                   1 if p_norm > 1 else 2, 5)
+    assert [r.neighbors for r in results] != [r.neighbors for r in other]
+
+
+def test_near_families_keeps_every_possible_neighbor():
+    rng: np.random.RandomState = np.random.RandomState(2)
+    exact: np.ndarray = rng.rand(6, 50)
+    slack: np.ndarray = np.full((6, 1), 0.05)
+    approximate: np.ndarray = exact + rng.uniform(-0.05, 0.05, exact.shape)
+    candidates: List[np.ndarray] = near_families(approximate.copy(), 4, None, slack)
+    i: int
+    for i, found in enumerate(candidates):
+        assert set(np.argsort(exact[i])[:4]) <= set(found) and len(found) < 50
+    within: List[np.ndarray] = near_families(approximate.copy(), None, 0.2, slack)
+    for i, found in enumerate(within):
+        assert set(np.flatnonzero(exact[i] <= 0.2)) <= set(found)
+        assert (approximate[i, found] - 0.05 <= 0.2).all()
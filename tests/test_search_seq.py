@@ -0,0 +1,29 @@
+""" search seq --fasta reads the records of every file in batches """
+import argparse
+from pathlib import Path
+from typing import List
+import pytest
+
+from CLI import search_seq
+from CLI.search_seq import sequence_batches
+
+
+def test_records_in_batches(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(search_seq, 'fasta_batch', 3)
+    (tmp_path / 'a.fasta').write_text('>a1 first\nacd\nef\n>a2\nGH\n')
+    (tmp_path / 'b.fasta').write_text('>b1\nKL\n>b2\nMN\n>b3\nPQ\n>b4\nRS\n')
+    args: argparse.Namespace = argparse.Namespace(fasta=True, sequence=[str(tmp_path / 'a.fasta'), str(tmp_path / 'b.fasta')])
+    batches: List[tuple] = list(sequence_batches(args))
+    # batches span files, and the sequences are upper case
+    assert batches == [(['a1 first', 'a2', 'b1'], ['ACDEF', 'GH', 'KL']), (['b2', 'b3', 'b4'], ['MN', 'PQ', 'RS'])]
+
+
+def test_files_without_fasta():
+    args: argparse.Namespace = argparse.Namespace(fasta=False, sequence=['a.txt', 'b.txt'])
+    assert list(sequence_batches(args)) == [(['a.txt', 'b.txt'], None)]
+
+
+def test_missing_file_exits(tmp_path: Path):
+    args: argparse.Namespace = argparse.Namespace(fasta=True, sequence=[str(tmp_path / 'missing.fasta')])
+    with pytest.raises(SystemExit):
+        list(sequence_batches(args))
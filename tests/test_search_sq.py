@@ -0,0 +1,122 @@
+""" search seq scores the sequences family-major, in batches, like scoring each sequence against each family on its own """
+import types
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+import pytest
+
+from CLI import ls_store
+from CLI.get_metric import metric_registry
+from CLI.utils.data_loaders import indices_to_one_hot, to_indices
+from CLI.utils.metrics import reconstruction_acc
+from conftest import FakeNetwork
+
+FAMILIES: List[Tuple[str, int]] = [('F' + str(i), size) for i, size in enumerate([12, 30, 8, 30, 20, 16, 30, 10, 25])]
+
+
+@pytest.fixture
+def networks(search_sq: types.ModuleType, monkeypatch) -> Dict[str, FakeNetwork]:
+    fakes: Dict[str, FakeNetwork] = {name: FakeNetwork(i) for i, (name, _) in enumerate(FAMILIES)}
+    monkeypatch.setattr(search_sq, 'check_files', lambda: None)
+    monkeypatch.setattr(search_sq, 'find_networks', lambda slen: [(name, size) for name, size in FAMILIES if size >= slen])
+    monkeypatch.setattr(search_sq, 'load_network', fakes.__getitem__)
+    monkeypatch.setattr(search_sq, 'no_pbar', True)
+    return fakes
+
+
+def sequences(n: int) -> List[str]:
+    rng: np.random.RandomState = np.random.RandomState(1)
+    letters: str = 'ACDEFGHIKLMNPQRSTVWY-'
+    return [''.join(rng.choice(list(letters), rng.randint(4, 26))) for _ in range(n)]
+
+
+def one_at_a_time(lseqs: List[str], networks: Dict[str, FakeNetwork], ignore_gaps: bool) -> List[Tuple[str, str]]:
+    """ The family and accuracy of every sequence, scored against every family in turn, one network call each """
+    results: List[Tuple[str, str]] = []
+    lseq: str
+    for lseq in lseqs:
+        best: Tuple[str, float] = ('none', 0.0)
+        name: str
+        size: int
+        for name, size in FAMILIES:
+            if len(lseq) > size:
+                continue
+            msa_seq: np.ndarray = to_indices(lseq.center(size, '-'))[None]
+            x: np.ndarray = indices_to_one_hot(msa_seq, dtype=np.float32).reshape((1, -1))
+            acc: float = float(reconstruction_acc(msa_seq, np.asarray(networks[name].predict_on_batch(x)).reshape((1, size, 21)),
+                                                  ignore_gaps)[0])
+            # only a strictly better family replaces an earlier one
+            if acc > best[1]:
+                best = (name, acc)
+        results.append((best[0], str(best[1]) if best[0] != 'none' else '0'))
+    return results
+
+
+@pytest.mark.parametrize('ignore_gaps', [False, True])
+def test_batches_match_one_sequence_at_a_time(search_sq: types.ModuleType, networks: Dict[str, FakeNetwork], ignore_gaps: bool):
+    lseqs: List[str] = sequences(600)
+    expected: List[Tuple[str, str]] = one_at_a_time(lseqs, networks, ignore_gaps)
+    for fake in networks.values():
+        fake.calls.clear()
+    results: list = search_sq.search_sequences(['s' + str(i) for i in range(len(lseqs))], ignore_gaps, lseqs=lseqs)
+    assert [(result.closest, result.accuracy) for result in results] == expected
+    assert [result.seq for result in results] == ['s' + str(i) for i in range(len(lseqs))]
+    # one call per batch of the sequences that fit in the family, at most batch_size each
+    name: str
+    size: int
+    for name, size in FAMILIES:
+        fits: int = sum(len(lseq) <= size for lseq in lseqs)
+        assert networks[name].calls == [min(search_sq.batch_size, fits - start) for start in range(0, fits, search_sq.batch_size)]
+    assert networks['F1'].calls == [256, 256, 88]
+
+
+class FakeEncoder:
+    """ Projects a one-hot sequence of up to 20 letters onto a fixed random basis of 30 dimensions """
+    input_shape: Tuple[None, int] = (None, 20 * 21)
+    basis: np.ndarray
+
+    def __init__(self):
+        self.basis = np.random.RandomState(5).standard_normal((20 * 21, 30))
+
+    def predict_on_batch(self, x: np.ndarray) -> List[np.ndarray]:
+        # the mean and the log variance of a variational encoder
+        return [x @ self.basis, np.zeros((len(x), 30))]
+
+
+@pytest.fixture
+def encoder(search_sq: types.ModuleType, tmp_path: Path, monkeypatch) -> Path:
+    (tmp_path / 'enc.json').write_text('{}')
+    (tmp_path / 'enc_weights.h5').write_bytes(b'weights')
+    monkeypatch.setattr(search_sq, 'load_model_files', lambda prefix: FakeEncoder())
+    # families F0 to F8 and one without a network, around the latent spaces of a few sequences
+    rng: np.random.RandomState = np.random.RandomState(6)
+    latents: np.ndarray = FakeEncoder().predict_on_batch(
+        indices_to_one_hot(np.stack([to_indices(lseq[:20].center(20, '-')) for lseq in sequences(10)]), dtype=np.float32).reshape((10, -1)))[0]
+    names: List[str] = [name for name, _ in FAMILIES] + ['NONET']
+    monkeypatch.setattr(ls_store, '_store', ls_store.LSStore(names, latents + rng.standard_normal(latents.shape)))
+    return tmp_path / 'enc'
+
+
+@pytest.mark.parametrize('k', [1, 3, 6])
+def test_shortlist_keeps_the_winner(search_sq: types.ModuleType, networks: Dict[str, FakeNetwork], encoder: Path, k: int):
+    lseqs: List[str] = sequences(200)
+    seqs: List[str] = ['s' + str(i) for i in range(len(lseqs))]
+    full: list = search_sq.search_sequences(seqs, lseqs=lseqs)
+    short: list = search_sq.search_sequences(seqs, shortlist=k, encoder=encoder, lseqs=lseqs)
+    allowed: np.ndarray = search_sq.shortlist_families([(order, name, size) for order, (name, size) in enumerate(FAMILIES)],
+                                                       [to_indices(lseq) for lseq in lseqs], k, metric_registry['euclidean'], 2, encoder)
+    kept: int = 0
+    i: int
+    for i, (full_result, short_result) in enumerate(zip(full, short)):
+        if len(lseqs[i]) > 20:
+            # too long for the encoder, so scored against every family
+            assert allowed[:, i].all()
+        if allowed[[name for name, _ in FAMILIES].index(full_result.closest), i]:
+            assert (short_result.closest, short_result.accuracy) == (full_result.closest, full_result.accuracy)
+            kept += 1
+        else:
+            # only families on the shortlist are scored
+            assert short_result.closest == 'none' or allowed[[name for name, _ in FAMILIES].index(short_result.closest), i]
+            assert float(short_result.accuracy) <= float(full_result.accuracy)
+    # the shortlist misses the winner of some sequences and keeps it for others
+    assert 0 < kept < len(lseqs)
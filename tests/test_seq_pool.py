@@ -0,0 +1,74 @@
+""" search seq -j: one pool per run, and pieces of work that carry their own sequences """
+import argparse
+import multiprocessing.pool
+import types
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+import pytest
+
+from CLI import search_seq, seq_pool
+from conftest import FakeNetwork
+
+FAMILIES: List[Tuple[str, int]] = [('F' + str(i), size) for i, size in enumerate([12, 30, 8, 30, 20, 16, 30, 10, 25])]
+
+
+@pytest.fixture
+def networks(search_sq: types.ModuleType, monkeypatch) -> types.ModuleType:
+    fakes: Dict[str, FakeNetwork] = {name: FakeNetwork(i) for i, (name, _) in enumerate(FAMILIES)}
+    monkeypatch.setattr(search_sq, 'check_files', lambda: None)
+    monkeypatch.setattr(search_sq, 'find_networks', lambda slen: [(name, size) for name, size in FAMILIES if size >= slen])
+    monkeypatch.setattr(search_sq, 'load_network', fakes.__getitem__)
+    # every k-mer ranking puts the families in reverse order
+    monkeypatch.setattr(search_sq, 'prefilter_rankings', lambda families, lseqs, index_file, top:
+                        [np.arange(len(families))[::-1][:top] for _ in lseqs])
+    monkeypatch.setattr(search_sq, 'no_pbar', True)
+    return search_sq
+
+
+def sequences(n: int) -> List[str]:
+    rng: np.random.RandomState = np.random.RandomState(1)
+    letters: str = 'ACDEFGHIKLMNPQRSTVWY-'
+    return [''.join(rng.choice(list(letters), rng.randint(4, 26))) for _ in range(n)]
+
+
+def test_pool_scores_match_one_process(networks: types.ModuleType):
+    encoded: List[np.ndarray] = [networks.to_indices(seq) for seq in sequences(40)]
+    families: List[Tuple[int, str, int]] = [(order, name, size) for order, (name, size) in enumerate(FAMILIES)]
+    allowed: np.ndarray = np.random.RandomState(2).rand(len(families), len(encoded)) < 0.5
+    pool: multiprocessing.pool.ThreadPool
+    with multiprocessing.pool.ThreadPool(2) as pool:
+        mask: np.ndarray
+        for mask in [None, allowed]:
+            expected: Tuple[np.ndarray, np.ndarray] = networks.score_families(families, encoded, False, mask)
+            # a piece per family, each sent only the sequences it may score
+            acc, order = seq_pool.pool_scores(pool, 3, families, encoded, False, mask)
+            np.testing.assert_array_equal(acc, expected[0])
+            np.testing.assert_array_equal(order, expected[1])
+
+
+def test_one_pool_per_run(networks: types.ModuleType, tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(search_seq, 'fasta_batch', 4)
+    (tmp_path / 'seqs.fasta').write_text(''.join('>s' + str(i) + '\n' + seq + '\n' for i, seq in enumerate(sequences(10))))
+    opened: List[multiprocessing.pool.ThreadPool] = []
+
+    def open_pool(jobs: int) -> multiprocessing.pool.ThreadPool:
+        opened.append(multiprocessing.pool.ThreadPool(jobs))
+        return opened[-1]
+
+    monkeypatch.setattr(seq_pool, 'open_pool', open_pool)
+    outputs: List[str] = []
+    jobs: int
+    for jobs in [1, 2]:
+        output: Path = tmp_path / ('out' + str(jobs) + '.csv')
+        # three batches, each searched again by --recall
+        search_seq.run_searches(argparse.Namespace(
+            sequence=[str(tmp_path / 'seqs.fasta')], fasta=True, jobs=jobs, ignore_gaps=False, model_cache=None, model_cache_mb=None,
+            shortlist=None, prefilter_top=None, stop_at=0.9, encoder=None, kmer_index=None, recall=True, distance_metric='euclidean',
+            p_norm=2, output_file=str(output), output_format='csv', output_mode='w', cache_stats=False))
+        outputs.append(output.read_text())
+    assert len(opened) == 1
+    # terminated at the end of the run
+    with pytest.raises(ValueError):
+        opened[0].apply(len, ([],))
+    assert outputs[0] == outputs[1] and len(outputs[0].splitlines()) == 10
@@ -0,0 +1,207 @@
+""" The search server: requests forwarded by the client over a Unix domain socket, and the caches kept between them """
+import os
+import socket
+import sys
+import threading
+import types
+from pathlib import Path
+from typing import Iterator, List
+import numpy as np
+import pytest
+
+from CLI import client, load_files, ls_store, network_store
+from CLI.serve import SearchServer
+from test_network_store import write_store
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="needs Unix domain sockets")
+
+
+def echo(argv: List[str]):
+    # a command that shows where and with what it ran
+    print(os.getcwd() + ' ' + ' '.join(argv))
+    sys.stderr.write('to stderr\n')
+    if argv and argv[0] == 'env':
+        print(' '.join(os.environ.get(name, '-') for name in client.forwarded_env))
+    if argv and argv[0] == 'fail':
+        exit("failed")
+    if argv and argv[0] == 'crash':
+        raise RuntimeError('crashed')
+
+
+@pytest.fixture
+def server(tmp_path: Path, monkeypatch) -> Iterator[SearchServer]:
+    monkeypatch.setenv(client.socket_env, str(tmp_path / 'serve.sock'))
+    monkeypatch.delenv(client.no_server_env, raising=False)
+    search_server: SearchServer = SearchServer(str(tmp_path / 'serve.sock'))
+    search_server.entry_points = {'compare': echo, 'search': echo}
+    thread: threading.Thread = threading.Thread(target=search_server.serve_forever)
+    thread.start()
+    yield search_server
+    search_server.shutdown()
+    thread.join()
+    search_server.server_close()
+
+
+@pytest.fixture
+def printed(monkeypatch) -> List[dict]:
+    # the server runs in this process, so while a command runs sys.stdout is the server's, not the client's
+    messages: List[dict] = []
+    monkeypatch.setattr(client, 'write_output', messages.append)
+    return messages
+
+
+def joined(messages: List[dict], name: str) -> str:
+    text: str = ''.join(message.get(name, '') for message in messages)
+    messages.clear()
+    return text
+
+
+def test_round_trip(server: SearchServer, printed: List[dict], tmp_path: Path, monkeypatch):
+    (tmp_path / 'work').mkdir()
+    monkeypatch.chdir(tmp_path / 'work')
+    assert client.forward('compare', ['A', 'B']) == 0
+    assert printed == [{'stdout': str(tmp_path / 'work') + ' A B\n'}, {'stderr': 'to stderr\n'}]
+    printed.clear()
+    assert client.forward('search', ['fail']) == 1
+    assert joined(printed, 'stderr') == 'to stderr\nfailed\n'
+    assert client.forward('search', ['crash']) == 1
+    assert 'RuntimeError: crashed' in joined(printed, 'stderr')
+    # the server's own directory and arguments are restored
+    assert os.getcwd() == str(tmp_path / 'work') and sys.argv[0] != 'search'
+    stats: dict = client.send_request(client.connect(), {'command': 'stats'})
+    assert 'compare: 1 requests' in stats['stdout'] and 'search: 2 requests' in stats['stdout']
+    assert client.send_request(client.connect(), {'command': 'nothing'})['status'] == 2
+
+
+def test_not_forwarded_without_a_server(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv(client.socket_env, str(tmp_path / 'serve.sock'))
+    assert client.connect() is None and client.forward('compare', []) is None
+    # left behind by a server that is no longer running
+    (tmp_path / 'serve.sock').write_text('')
+    assert client.connect() is None
+
+
+def test_not_forwarded_when_disabled(server: SearchServer, monkeypatch):
+    monkeypatch.setenv(client.no_server_env, '1')
+    assert client.forward('compare', []) is None
+
+
+def test_data_caches_are_dropped_when_the_files_change(tmp_path: Path, monkeypatch):
+    (tmp_path / 'Latent_spaces').mkdir()
+    monkeypatch.setattr(load_files, 'lspath', tmp_path / 'Latent_spaces')
+    monkeypatch.setattr(ls_store, '_store', 'loaded')
+    search_server: SearchServer = SearchServer(str(tmp_path / 'serve.sock'))
+    search_server.entry_points = {'compare': echo, 'search': echo}
+    messages: List[dict] = []
+    try:
+        search_server.run({'command': 'compare', 'argv': [], 'cwd': str(tmp_path)}, messages.append)
+        assert ls_store._store == 'loaded'
+        # a latent space added
+        os.utime(str(tmp_path / 'Latent_spaces'), ns=(0, 0))
+        search_server.run({'command': 'compare', 'argv': [], 'cwd': str(tmp_path)}, messages.append)
+        assert ls_store._store is None
+    finally:
+        search_server.server_close()
+
+
+def networks(directory: Path, names: List[str], packed: bool):
+    (directory / 'Trained_networks').mkdir(parents=True)
+    name: str
+    for name in names:
+        (directory / 'Trained_networks' / (name + '.json')).write_text('{}')
+        (directory / 'Trained_networks' / (name + '_weights.h5')).write_bytes(b'weights')
+    if packed:
+        write_store(directory / 'Trained_networks', {name: [np.zeros(3)] for name in names})
+
+
+def test_networks_are_dropped_in_another_directory(search_sq: types.ModuleType, tmp_path: Path, monkeypatch):
+    networks(tmp_path / 'a', ['AAA'], packed=True)
+    networks(tmp_path / 'b', ['BBB', 'CCC'], packed=False)
+    monkeypatch.setattr(network_store, '_store_dir', None)
+    monkeypatch.setattr(search_sq.model_cache, 'models', {})
+
+    def names(argv: List[str]):
+        print(' '.join(sorted(search_sq.network_names())) + ' ' + search_sq.family_architecture(argv[0])[1])
+        search_sq.model_cache.models[argv[0]] = ([], 0)
+
+    search_server: SearchServer = SearchServer(str(tmp_path / 'serve.sock'))
+    search_server.entry_points = {'compare': names, 'search': names}
+    try:
+        outputs: List[str] = []
+        directory: str
+        family: str
+        for directory, family in [('a', 'AAA'), ('b', 'BBB'), ('a', 'AAA'), ('a', 'AAA')]:
+            messages: List[dict] = []
+            search_server.run({'command': 'search', 'argv': [family], 'cwd': str(tmp_path / directory)}, messages.append)
+            outputs.append(''.join(message['stdout'] for message in messages))
+            assert list(search_sq.model_cache.models) == [family]
+        assert outputs == ['AAA {1}\n', 'BBB CCC {}\n', 'AAA {1}\n', 'AAA {1}\n']
+        # the store is reused by requests from the same directory
+        assert network_store._store is not None
+    finally:
+        search_server.server_close()
+
+
+def test_output_is_streamed(server: SearchServer, tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    received: List[dict] = []
+    first_line: threading.Event = threading.Event()
+
+    def lines(argv: List[str]):
+        print('first')
+        # the client has the first line before the command ends
+        assert first_line.wait(10)
+        sys.stdout.write('second ')
+        sys.stdout.write('line\nthird')
+
+    def output(message: dict):
+        received.append(message)
+        first_line.set()
+
+    server.entry_points['search'] = lines
+    response: dict = client.send_request(client.connect(), {'command': 'search', 'argv': [], 'cwd': str(tmp_path)}, output)
+    assert response['status'] == 0 and 'stdout' not in response
+    # complete lines as they are written, the rest when the command ends
+    assert received == [{'stdout': 'first\n'}, {'stdout': 'second line\n'}, {'stdout': 'third'}]
+
+
+def test_environment_is_forwarded(server: SearchServer, printed: List[dict], tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(client.forwarded_env[0], 'file:///archive.zip')
+    monkeypatch.delenv(client.forwarded_env[1], raising=False)
+    assert client.forward('search', ['env']) == 0
+    assert joined(printed, 'stdout').splitlines()[-1] == 'file:///archive.zip -'
+
+
+def test_environment_is_set_per_request(tmp_path: Path, monkeypatch):
+    # set in the server, but not by the client
+    monkeypatch.setenv(client.forwarded_env[1], 'server')
+    monkeypatch.delenv(client.forwarded_env[0], raising=False)
+    search_server: SearchServer = SearchServer(str(tmp_path / 'serve.sock'))
+    search_server.entry_points = {'compare': echo, 'search': echo}
+    messages: List[dict] = []
+    try:
+        search_server.run({'command': 'search', 'argv': ['env'], 'cwd': str(tmp_path), 'env': {client.forwarded_env[0]: 'url'}},
+                          messages.append)
+    finally:
+        search_server.server_close()
+    assert ''.join(message.get('stdout', '') for message in messages).splitlines()[-1] == 'url -'
+    # restored once the request is done
+    assert os.environ[client.forwarded_env[1]] == 'server' and client.forwarded_env[0] not in os.environ
+
+
+def test_forwarded_env_names():
+    from CLI import network_archive
+    assert client.forwarded_env == [network_archive.url_env, network_archive.sha256_env]
+
+
+def test_progress_bars_are_off_for_served_sequence_searches(search_sq: types.ModuleType, tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(search_sq, 'no_pbar', False)
+    shown: List[bool] = []
+    search_server: SearchServer = SearchServer(str(tmp_path / 'serve.sock'))
+    search_server.entry_points = {'compare': echo, 'search': lambda argv: shown.append(not search_sq.no_pbar)}
+    try:
+        search_server.run({'command': 'search', 'argv': ['seq', 'a.txt'], 'cwd': str(tmp_path)}, lambda message: None)
+    finally:
+        search_server.server_close()
+    assert shown == [False]